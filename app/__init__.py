@@ -17,12 +17,27 @@ logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
 # 设置模块日志
 logger = logging.getLogger(__name__)
 
-# 定义数据库文件常量
-USER_DB_FILE = "data/user.db" # 用户信息数据库
-SIGN_DB_FILE = "data/sign.db" # 签到日志数据库
-LOG_DB_FILE = "data/log.db"
-SET_DB_FILE = "data/set.db"
-CRON_DB_FILE = "data/cron.db"
+# 分库模式下各业务的数据库文件
+SPLIT_DB_FILES = {
+    "user": "data/user.db",  # 用户信息数据库
+    "sign": "data/sign.db",  # 签到日志数据库
+    "log": "data/log.db",
+    "set": "data/set.db",
+    "cron": "data/cron.db",
+}
+
+# 定义数据库文件常量（single模式下全部指向同一个文件）
+from config import settings as _settings
+
+SINGLE_DB_MODE = _settings.DB_MODE.lower() == "single"
+if SINGLE_DB_MODE:
+    USER_DB_FILE = SIGN_DB_FILE = LOG_DB_FILE = SET_DB_FILE = CRON_DB_FILE = _settings.DB_FILE
+else:
+    USER_DB_FILE = SPLIT_DB_FILES["user"]
+    SIGN_DB_FILE = SPLIT_DB_FILES["sign"]
+    LOG_DB_FILE = SPLIT_DB_FILES["log"]
+    SET_DB_FILE = SPLIT_DB_FILES["set"]
+    CRON_DB_FILE = SPLIT_DB_FILES["cron"]
 
 # 确保data目录存在
 data_dir = "data"
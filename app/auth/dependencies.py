@@ -1,45 +1,157 @@
-import sqlite3
 import time
 from functools import wraps
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 
-from fastapi import Request
+from fastapi import HTTPException, Request
 from fastapi.responses import RedirectResponse
+from pydantic import BaseModel
 
 from app import USER_DB_FILE, logger
+from app.auth.sessions import SESSION_FIELDS, SESSION_LOOKUP_SQL
+from app.auth.tokens import load_revoked_tokens, looks_like_token, revocations_loaded, verify_token
+from app.utils.activity import ADMIN_TIMEOUT, activity_tracker
+from app.utils.cache import TTLCache
+from app.utils.db import fetch_one, run_in_db
+from config import settings
 
-# 管理员超时时间（秒）
-ADMIN_TIMEOUT = 3600  # 60分钟
+# open_id -> 用户信息（无效的open_id缓存为None），登录、登出时主动失效
+_session_cache = TTLCache(maxsize=settings.SESSION_CACHE_SIZE, default_ttl=settings.SESSION_CACHE_TTL)
 
-def is_valid_open_id(open_id: str) -> Tuple[bool, Dict]:
+def invalidate_session(open_id: str):
+    """使单个open_id的会话缓存失效（登出、登录生成新open_id时调用）"""
+    if open_id:
+        _session_cache.delete(open_id)
+
+def invalidate_user_sessions(user_id: str):
+    """使某个用户的所有会话缓存失效（重新登录更新了用户信息、删除用户时调用）"""
+    # 上游返回的UserID是整数，数据库TEXT列读出的是字符串，统一按字符串比较
+    user_id = str(user_id)
+    _session_cache.delete_where_value(lambda user_info: user_info is not None and str(user_info.get("user_id")) == user_id)
+
+async def is_valid_open_id(open_id: str) -> Tuple[bool, Dict]:
     """
-    检查open_id是否在数据库中有效，并返回用户信息
+    检查open_id是否为有效的登录会话（sessions表主键查询），并返回用户信息
+    结果会缓存一段时间，其中用户信息的 last_activity 可能不是最新值
+    Cookie中是签名令牌（SESSION_MODE=token）时签名和吊销列表在内存中校验，缓存未命中时才查询用户是否已删除
     返回: (是否有效, 用户信息)
     """
+    if not open_id:
+        return False, {}
+
+    if looks_like_token(open_id):
+        try:
+            if not revocations_loaded():
+                await run_in_db(load_revoked_tokens)
+            user_info = verify_token(open_id)
+            if not user_info:
+                return False, {}
+
+            # 签名有效时，缓存未命中才确认一次用户未被删除
+            cached = _session_cache.get(open_id, ...)
+            if cached is ...:
+                row = await fetch_one(USER_DB_FILE, "SELECT 1 FROM users WHERE user_id = ? AND deleted = 0", (user_info["user_id"],))
+                cached = user_info if row else None
+                ttl = min(settings.SESSION_CACHE_TTL, user_info["expires_at"] - time.time()) if row else settings.SESSION_NEGATIVE_TTL
+                _session_cache.set(open_id, cached, ttl)
+        except Exception as e:
+            logger.error(f"验证会话令牌时出错: {str(e)}")
+            return False, {}
+        if cached is None:
+            return False, {}
+        activity_tracker.touch(user_info["user_id"])
+        return True, user_info
+
+    cached = _session_cache.get(open_id, ...)
+    if cached is not ...:
+        if cached is None:
+            return False, {}
+        activity_tracker.touch(cached["user_id"])
+        return True, dict(cached)
+
     try:
-        conn = sqlite3.connect(USER_DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE open_id = ?", (open_id,))
-        result = cursor.fetchone()
-        conn.close()
+        now = time.time()
+        result = await fetch_one(USER_DB_FILE, SESSION_LOOKUP_SQL, (open_id, int(now)))
         
         if result:
             # 返回用户信息字典
-            user_info = dict(zip(
-                ["id", "username", "user_id", "department_name", 
-                 "department_id", "position", "open_id", "first_login_time", "last_activity"],
-                result
-            ))
-            return True, user_info
+            user_info = dict(zip(SESSION_FIELDS, result))
+            # 缓存时间不超过会话的剩余有效期
+            _session_cache.set(open_id, user_info, min(settings.SESSION_CACHE_TTL, user_info["expires_at"] - now))
+            activity_tracker.touch(user_info["user_id"])
+            return True, dict(user_info)
+
+        _session_cache.set(open_id, None, settings.SESSION_NEGATIVE_TTL)
         return False, {}
     except Exception as e:
         logger.error(f"验证open_id时出错: {str(e)}")
         return False, {}
 
+class CurrentUser(BaseModel):
+    """当前请求的登录用户"""
+    user_id: str
+    username: Optional[str] = None
+    department_id: Optional[str] = None
+    department_name: Optional[str] = None
+    position: Optional[str] = None
+    role: str = "user"
+    open_id: Optional[str] = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @classmethod
+    def from_user_info(cls, user_info: Dict) -> "CurrentUser":
+        """由 is_valid_open_id 返回的用户信息构造（数据库中的ID可能是整数）"""
+        fields = {
+            key: str(user_info[key]) if user_info.get(key) is not None else None
+            for key in ("user_id", "username", "department_id", "department_name", "position", "open_id")
+        }
+        fields["role"] = user_info.get("role") or ("admin" if fields["user_id"] == "admin" else "user")
+        return cls(**fields)
+
+async def resolve_current_user(request: Request) -> Optional[CurrentUser]:
+    """
+    解析当前请求的登录用户，结果保存在 request.state.current_user 中
+    同一请求内多次调用只校验一次Cookie，未登录或会话无效时返回None
+    """
+    if hasattr(request.state, "current_user"):
+        return request.state.current_user
+
+    current_user = None
+    open_id = request.cookies.get("open_id")
+    if open_id:
+        is_valid, user_info = await is_valid_open_id(open_id)
+        if is_valid and user_info.get("user_id"):
+            current_user = CurrentUser.from_user_info(user_info)
+
+    request.state.current_user = current_user
+    return current_user
+
+async def get_optional_user(request: Request) -> Optional[CurrentUser]:
+    """
+    依赖项：当前登录用户，未登录时为None（由路由自行返回登录页）
+    用法: user: Optional[CurrentUser] = Depends(get_optional_user)
+    """
+    return await resolve_current_user(request)
+
+async def get_current_user(request: Request) -> CurrentUser:
+    """
+    依赖项：当前登录用户，未登录或会话无效时返回401
+    用法: user: CurrentUser = Depends(get_current_user)
+    """
+    if not request.cookies.get("open_id"):
+        raise HTTPException(status_code=401, detail="未登录，请先登录")
+
+    current_user = await resolve_current_user(request)
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="登录已过期，请重新登录")
+    return current_user
+
 def admin_required(func):
     """
     管理员权限验证装饰器
-    验证用户是否为管理员以及最后活跃时间是否在5分钟内
+    验证用户是否为管理员以及最后活跃时间是否在超时时间内
     """
     @wraps(func)
     async def wrapper(request: Request, *args, **kwargs):
@@ -51,41 +163,16 @@ def admin_required(func):
             return RedirectResponse(url="/", status_code=303)
         
         try:
-            # 连接数据库
-            conn = sqlite3.connect(USER_DB_FILE)
-            cursor = conn.cursor()
-            
-            # 查询管理员信息
-            cursor.execute(
-                "SELECT last_activity FROM users WHERE open_id = ? AND user_id = 'admin'", 
-                (open_id,)
-            )
-            admin = cursor.fetchone()
-            
-            # 检查是否管理员
-            if not admin:
-                conn.close()
-                # 不是管理员，重定向到首页并清除cookie
-                response = RedirectResponse(url="/", status_code=303)
-                response.delete_cookie(key="open_id", path="/")
-                return response
-            
-            # 检查活跃时间是否在5分钟内
-            current_time = int(time.time())
-            if current_time - admin[0] > ADMIN_TIMEOUT:
-                conn.close()
-                # 超时，重定向到首页并清除cookie
+            # 活跃时间和超时判断都在内存中完成，只有首次出现的open_id需要查库
+            is_admin = activity_tracker.check_admin(open_id)
+            if is_admin is None:
+                is_admin = await run_in_db(activity_tracker.load_admin, open_id)
+
+            if not is_admin:
+                # 不是管理员或已超时，重定向到首页并清除cookie
                 response = RedirectResponse(url="/", status_code=303)
                 response.delete_cookie(key="open_id", path="/")
                 return response
-                
-            # 更新管理员最后活跃时间
-            cursor.execute(
-                "UPDATE users SET last_activity = ? WHERE open_id = ?",
-                (current_time, open_id)
-            )
-            conn.commit()
-            conn.close()
             
             # 执行原函数
             return await func(request, *args, **kwargs)
@@ -124,7 +211,7 @@ def admin_required(func):
 #         # 更新用户最后活跃时间
 #         try:
 #             current_time = int(time.time())
-#             conn = sqlite3.connect(USER_DB_FILE)
+#             conn = connect(USER_DB_FILE)
 #             cursor = conn.cursor()
 #             cursor.execute(
 #                 "UPDATE users SET last_activity = ? WHERE open_id = ?",
@@ -1,5 +1,3 @@
-import httpx
-import sqlite3
 import time
 from fastapi import APIRouter, Response, Request
 from fastapi.responses import RedirectResponse, JSONResponse
@@ -7,10 +5,20 @@ from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
 from app import logger, USER_DB_FILE as DB_FILE, SET_DB_FILE
+from app.utils.db import connect, fetch_one, run_in_db
+from app.auth.dependencies import invalidate_session, invalidate_user_sessions
+from app.auth.sessions import create_session, delete_session
+from app.auth.tokens import issue_token, looks_like_token, revoke_token, token_mode
 from app.auth.utils import random_open_id, get_mobile_user_agent
-from app.utils.host import build_api_url
+from app.utils.activity import activity_tracker
+from app.utils.cache import TTLCache
+from app.utils.concurrency import SingleFlight
+from app.utils.ratelimit import RateLimitExceeded, check_login_rate, get_client_ip, login_slot, record_login_failure
+from app.utils.upstream import upstream_request
 from app.utils.log import log_login, log_operation, LogType
+from app.utils.resilience import READ_RETRY
 from app.routes.admin.privilege import DEPARTMENTS
+from app.routes.admin.utils import invalidate_admin_stats
 
 from config import settings
 
@@ -20,6 +28,12 @@ router = APIRouter(tags=["认证"])
 # 设置模板
 templates = Jinja2Templates(directory="app/static/templates")
 
+# 部门通讯录缓存（特殊打卡登录校验用户），键为部门ID
+_roster_cache = TTLCache(maxsize=256, default_ttl=settings.ROSTER_CACHE_TTL)
+
+# 合并同一部门同时发起的通讯录请求
+_roster_flight = SingleFlight()
+
 
 class UserLogin(BaseModel):
     """用户登录请求体模型"""
@@ -37,11 +51,7 @@ async def handle_admin_login(request: Request, password: str):
     """
     try:
         # 从数据库获取管理员密码
-        conn = sqlite3.connect(SET_DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT setting_value FROM system_settings WHERE setting_key = 'admin_password'")
-        result = cursor.fetchone()
-        conn.close()
+        result = await fetch_one(SET_DB_FILE, "SELECT setting_value FROM system_settings WHERE setting_key = 'admin_password'")
         
         if not result:
             return JSONResponse(
@@ -69,30 +79,7 @@ async def handle_admin_login(request: Request, password: str):
         current_time = int(time.time())
 
         # 保存管理员会话到数据库
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # 检查管理员用户是否存在
-        cursor.execute("SELECT * FROM users WHERE user_id = 'admin'")
-        admin_user = cursor.fetchone()
-        
-        if admin_user:
-            # 更新管理员openid和活跃时间
-            cursor.execute(
-                "UPDATE users SET open_id = ?, last_activity = ? WHERE user_id = 'admin'",
-                (generated_open_id, current_time)
-            )
-        else:
-            # 创建管理员用户
-            cursor.execute(
-                """INSERT INTO users 
-                   (username, user_id, department_name, department_id, position, open_id, first_login_time, last_activity) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                ("管理员", "admin", "系统管理", "0", "管理员", generated_open_id, current_time, current_time)
-            )
-        
-        conn.commit()
-        conn.close()
+        await run_in_db(_save_admin_session, generated_open_id, current_time)
         
         # 记录登录日志
         try:
@@ -127,6 +114,45 @@ async def handle_admin_login(request: Request, password: str):
         )
     
 
+def _save_admin_session(open_id: str, current_time: int):
+    """
+    保存管理员会话，管理员用户不存在时创建（同步，在数据库线程池中执行）
+    """
+    conn = connect(DB_FILE)
+    try:
+        cursor = conn.cursor()
+        
+        # 检查管理员用户是否存在
+        cursor.execute("SELECT * FROM users WHERE user_id = 'admin'")
+        admin_user = cursor.fetchone()
+        
+        if admin_user:
+            # 更新管理员openid和活跃时间
+            cursor.execute(
+                "UPDATE users SET open_id = ?, last_activity = ? WHERE user_id = 'admin'",
+                (open_id, current_time)
+            )
+        else:
+            # 创建管理员用户
+            cursor.execute(
+                """INSERT INTO users 
+                   (username, user_id, department_name, department_id, position, open_id, first_login_time, last_activity) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                ("管理员", "admin", "系统管理", "0", "管理员", open_id, current_time, current_time)
+            )
+        
+        # 管理员只保留本次登录的会话
+        create_session(cursor, open_id, "admin", current_time, exclusive=True)
+        conn.commit()
+    finally:
+        conn.close()
+    
+    # 管理员的旧会话已被删除
+    invalidate_user_sessions("admin")
+    invalidate_session(open_id)
+    activity_tracker.reset_admin(open_id, current_time)
+
+
 async def handle_special_login(request: Request, phone: str, password: str):
     """
     处理特殊打卡用户登录
@@ -138,11 +164,7 @@ async def handle_special_login(request: Request, phone: str, password: str):
     """
     try:
         # 从数据库中获取特殊打卡登录密码
-        conn = sqlite3.connect(SET_DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT setting_value FROM system_settings WHERE setting_key = 'fuck_password'")
-        result = cursor.fetchone()
-        conn.close()
+        result = await fetch_one(SET_DB_FILE, "SELECT setting_value FROM system_settings WHERE setting_key = 'fuck_password'")
 
         if not result:
             return JSONResponse(
@@ -173,27 +195,25 @@ async def handle_special_login(request: Request, phone: str, password: str):
         position = "未知职位"
 
         # 验证用户信息
-        async with httpx.AsyncClient() as client:
-            api_url = build_api_url("/Apps/getUserInfoList")
-            api_request_data = {
-                "unitcode": settings.UNIT_CODE,
-                "depid": dep_id,
-            }
-            api_response = await client.post(api_url, headers=headers, json=api_request_data)
-            result = next((item for item in api_response.json() if item["userid"] == int(user_id)), None)
-
-            if not result:
-                return JSONResponse(
-                    status_code=401,
-                    content={"success": False, "message": "用户不存在"}
-                )
-            
-            if result.get("username", user_name) != user_name:
-                return JSONResponse(
-                    status_code=401,
-                    content={"success": False, "message": "当前部门不存在该用户"}
-                )
-            user_name = result.get("username", user_name)
+        roster = await get_department_roster(dep_id, headers)
+        result = next((item for item in roster if item["userid"] == int(user_id)), None)
+        if not result:
+            # 缓存中没有可能是新加入的用户，重新获取一次
+            roster = await get_department_roster(dep_id, headers, refresh=True)
+            result = next((item for item in roster if item["userid"] == int(user_id)), None)
+
+        if not result:
+            return JSONResponse(
+                status_code=401,
+                content={"success": False, "message": "用户不存在"}
+            )
+        
+        if result.get("username", user_name) != user_name:
+            return JSONResponse(
+                status_code=401,
+                content={"success": False, "message": "当前部门不存在该用户"}
+            )
+        user_name = result.get("username", user_name)
             
         department_name = DEPARTMENTS.get(dep_id, "未知部门")
 
@@ -202,6 +222,7 @@ async def handle_special_login(request: Request, phone: str, password: str):
 
         # 更新数据库
         await database_operations(user_id, user_name, department_name, dep_id, position, generated_open_id)
+        session_value = session_cookie_value(user_id, user_name, dep_id, department_name, position, generated_open_id)
         
         # 记录登录日志
         await log_login(user_id, user_name, request.client.host, True)
@@ -216,7 +237,7 @@ async def handle_special_login(request: Request, phone: str, password: str):
         # 在重定向响应上设置cookie
         redirect_response.set_cookie(
             key="open_id", 
-            value=generated_open_id, 
+            value=session_value, 
             httponly=True, 
             path="/"
         )
@@ -289,6 +310,7 @@ async def handle_user_login(request: Request, phone: str, password: str):
 
         # 更新数据库
         await database_operations(user_id, username, department_name, department_id, position, generated_open_id)
+        session_value = session_cookie_value(user_id, username, department_id, department_name, position, generated_open_id)
 
         # 记录登录日志
         await log_login(user_id, username, request.client.host, True)
@@ -303,7 +325,7 @@ async def handle_user_login(request: Request, phone: str, password: str):
         # 在重定向响应上设置cookie
         redirect_response.set_cookie(
             key="open_id", 
-            value=generated_open_id, 
+            value=session_value, 
             httponly=True, 
             path="/"
         )
@@ -338,16 +360,34 @@ async def login(request: Request, user_login: UserLogin):
     login_phone = user_login.phone
     login_password = user_login.password
 
-    # 检查是否是管理员登录尝试
-    if login_phone == "admin":
-        return await handle_admin_login(request, login_password)
-    
-    # 检查是否是特殊打卡登录尝试
-    if "@" in login_phone or "/" in login_phone:
-        return await handle_special_login(request, login_phone, login_password)
-    
-    # 普通用户登录
-    return await handle_user_login(request, login_phone, login_password)
+    try:
+        # 按IP和账号限制登录尝试频率
+        check_login_rate(get_client_ip(request), login_phone)
+
+        # 检查是否是管理员登录尝试
+        if login_phone == "admin":
+            response = await handle_admin_login(request, login_password)
+        else:
+            # 普通用户和特殊打卡用户登录需要请求考勤API，限制同时进行的数量
+            async with login_slot():
+                # 检查是否是特殊打卡登录尝试
+                if "@" in login_phone or "/" in login_phone:
+                    response = await handle_special_login(request, login_phone, login_password)
+                else:
+                    # 普通用户登录
+                    response = await handle_user_login(request, login_phone, login_password)
+
+        # 账号或密码错误计入该账号的失败次数（所有IP合计）
+        if response.status_code == 401:
+            record_login_failure(login_phone)
+        return response
+    except RateLimitExceeded as e:
+        logger.warning(f"登录被限流: {login_phone}，{e.message}")
+        return JSONResponse(
+            status_code=429,
+            content={"success": False, "message": e.message},
+            headers={"Retry-After": str(e.retry_after)}
+        )
 
 
 @router.post("/logout")
@@ -362,27 +402,24 @@ async def logout(request: Request, response: Response):
     # 获取openid
     open_id = request.cookies.get("open_id")
     
-    if open_id:
+    if open_id and looks_like_token(open_id):
+        try:
+            # 签名令牌：加入吊销列表
+            claims = await run_in_db(revoke_token, open_id)
+            if claims:
+                await log_operation(claims.get("name"), LogType.LOGIN, "用户登出", request.client.host, True)
+        except Exception as e:
+            logger.error(f"退出登录时发生错误: {str(e)}")
+    elif open_id:
         try:
-            # 尝试获取用户信息
-            conn = sqlite3.connect(DB_FILE)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE open_id = ?", (open_id,))
-            user = cursor.fetchone()
+            # 只删除当前设备的会话，其他设备上的登录不受影响
+            username = await run_in_db(delete_session, open_id)
+            invalidate_session(open_id)
+            activity_tracker.forget(open_id)
             
-            if user:
-                username = user['username']
-                user_id = user['user_id']
-                
+            if username:
                 # 记录登出日志
                 await log_operation(username, LogType.LOGIN, "用户登出", request.client.host, True)
-                
-                # 将用户的open_id标记为空，而不是删除用户记录
-                cursor.execute("UPDATE users SET open_id = NULL WHERE open_id = ?", (open_id,))
-                conn.commit()
-            
-            conn.close()
             
         except Exception as e:
             logger.error(f"退出登录时发生错误: {str(e)}")
@@ -397,6 +434,33 @@ async def logout(request: Request, response: Response):
     return redirect_response
 
 
+async def get_department_roster(dep_id: str, headers: dict, refresh: bool = False) -> list:
+    """
+    获取部门通讯录，结果缓存 ROSTER_CACHE_TTL 秒
+    
+    :param dep_id: 部门ID
+    :param headers: 请求头
+    :param refresh: 是否忽略缓存重新获取
+    :return: 部门用户列表
+    """
+    roster = None if refresh else _roster_cache.get(dep_id)
+    if roster is not None:
+        return roster
+
+    async def fetch():
+        api_request_data = {
+            "unitcode": settings.UNIT_CODE,
+            "depid": dep_id,
+        }
+        api_response = await upstream_request("POST", "/Apps/getUserInfoList", retry=READ_RETRY, headers=headers, json=api_request_data)
+        return api_response.json()
+
+    roster = await _roster_flight.do(dep_id, fetch)
+    if isinstance(roster, list):
+        _roster_cache.set(dep_id, roster)
+    return roster
+
+
 async def wx_login(headers: dict, data: dict):
     """
     微信登录API请求
@@ -406,15 +470,13 @@ async def wx_login(headers: dict, data: dict):
     :return: 微信登录成功后的Cookie或None
     """
     try:
-        async with httpx.AsyncClient() as client:
-            api_url = build_api_url("/Apps/wxLogin")
-            api_response = await client.post(api_url, headers=headers, json=data)
-            api_data = api_response.json()
-            
-            if api_data.get("success", False):
-                return api_response.headers.get("Set-Cookie", {})
-            else:
-                return None
+        api_response = await upstream_request("POST", "/Apps/wxLogin", headers=headers, json=data)
+        api_data = api_response.json()
+        
+        if api_data.get("success", False):
+            return api_response.headers.get("Set-Cookie", {})
+        else:
+            return None
     except Exception as e:
         logger.error(f"微信登录API请求异常: {str(e)}")
         return None
@@ -428,25 +490,34 @@ async def get_user_info(headers: dict):
     :return: 用户信息字典或None
     """
     try:
-        async with httpx.AsyncClient() as client:
-            api_url = build_api_url("/Apps/AppIndex")
-            params = {'UnitCode': settings.UNIT_CODE}
-            api_response = await client.get(api_url, headers=headers, params=params)
-            api_data = api_response.json()
-            
-            if api_data.get("success", False):
-                api_data = api_data.get("data", {})
-                fields = ["UserID", "UserName", "DepID", "Position", "DepName"]
-                user_info = {field: api_data.get(field, "") for field in fields}
-                return user_info
-            else:
-                logger.error(f"API请求成功但返回失败状态: {api_data.get('message', '未知错误')}")
-                return None
+        params = {'UnitCode': settings.UNIT_CODE}
+        api_response = await upstream_request("GET", "/Apps/AppIndex", retry=READ_RETRY, headers=headers, params=params)
+        api_data = api_response.json()
+        
+        if api_data.get("success", False):
+            api_data = api_data.get("data", {})
+            fields = ["UserID", "UserName", "DepID", "Position", "DepName"]
+            user_info = {field: api_data.get(field, "") for field in fields}
+            return user_info
+        else:
+            logger.error(f"API请求成功但返回失败状态: {api_data.get('message', '未知错误')}")
+            return None
     except Exception as e:
         logger.error(f"获取用户信息时发生异常: {str(e)}")
         return None
     
 
+def session_cookie_value(user_id: str, username: str, department_id: str, department_name: str, position: str, generated_open_id: str) -> str:
+    """
+    登录成功后写入open_id Cookie的值
+    
+    SESSION_MODE=token 时为携带用户信息的签名令牌，否则为生成的open_id
+    """
+    if token_mode():
+        return issue_token(user_id, username, department_id, department_name, position)
+    return generated_open_id
+
+
 async def database_operations(user_id: str, username: str, department_name: str, department_id: str, position: str, generated_open_id: str):
     """
     数据库用户信息操作
@@ -458,50 +529,71 @@ async def database_operations(user_id: str, username: str, department_name: str,
     :param position: 职位
     :param generated_open_id: 生成的OpenID
     """
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    current_time = int(time.time())
-    
-    # 先使用user_id查找用户
-    cursor.execute("SELECT id, open_id, deleted FROM users WHERE user_id = ? AND deleted = 0", (user_id,))
-    user = cursor.fetchone()
-    
-    if user:
-        # 用户存在，更新信息
-        cursor.execute(
-            """UPDATE users SET 
-               username = ?, department_name = ?, department_id = ?, 
-               position = ?, open_id = ?, last_activity = ? 
-               WHERE user_id = ? AND deleted = 0""",
-            (username, department_name, department_id, position, 
-             generated_open_id, current_time, user_id)
-        )
-    else:
-        # 查找被标记为删除的同一用户
-        cursor.execute("SELECT id FROM users WHERE user_id = ? AND deleted = 1", (user_id,))
-        deleted_user = cursor.fetchone()
-        
-        if deleted_user:
-            # 恢复已删除的用户
+    await run_in_db(_save_user, user_id, username, department_name, department_id, position, generated_open_id)
+
+
+def _save_user(user_id: str, username: str, department_name: str, department_id: str, position: str, generated_open_id: str):
+    """
+    新增、更新或恢复用户记录（同步，在数据库线程池中执行）
+    """
+    conn = connect(DB_FILE)
+    try:
+        cursor = conn.cursor()
+
+        current_time = int(time.time())
+
+        # 先使用user_id查找用户
+        cursor.execute("SELECT id, open_id, deleted FROM users WHERE user_id = ? AND deleted = 0", (user_id,))
+        user = cursor.fetchone()
+
+        if user:
+            # 用户存在，更新信息
             cursor.execute(
                 """UPDATE users SET 
                    username = ?, department_name = ?, department_id = ?, 
-                   position = ?, open_id = ?, last_activity = ?, deleted = 0
-                   WHERE user_id = ? AND deleted = 1""",
+                   position = ?, open_id = ?, last_activity = ? 
+                   WHERE user_id = ? AND deleted = 0""",
                 (username, department_name, department_id, position, 
                  generated_open_id, current_time, user_id)
             )
         else:
-            # 创建新用户
-            cursor.execute(
-                """INSERT INTO users 
-                   (username, user_id, department_name, department_id, position, 
-                    open_id, first_login_time, last_activity, deleted) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (username, user_id, department_name, department_id, position,
-                 generated_open_id, current_time, current_time, 0)
-            )
+            # 查找被标记为删除的同一用户
+            cursor.execute("SELECT id FROM users WHERE user_id = ? AND deleted = 1", (user_id,))
+            deleted_user = cursor.fetchone()
+
+            if deleted_user:
+                # 恢复已删除的用户
+                cursor.execute(
+                    """UPDATE users SET 
+                       username = ?, department_name = ?, department_id = ?, 
+                       position = ?, open_id = ?, last_activity = ?, deleted = 0
+                       WHERE user_id = ? AND deleted = 1""",
+                    (username, department_name, department_id, position, 
+                     generated_open_id, current_time, user_id)
+                )
+            else:
+                # 创建新用户
+                cursor.execute(
+                    """INSERT INTO users 
+                       (username, user_id, department_name, department_id, position, 
+                        open_id, first_login_time, last_activity, deleted) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (username, user_id, department_name, department_id, position,
+                     generated_open_id, current_time, current_time, 0)
+                )
+
+        # 新增登录会话，其他设备上的会话仍然有效（令牌模式下会话保存在Cookie中，不写sessions表）
+        if not token_mode():
+            create_session(cursor, generated_open_id, str(user_id), current_time)
+
+        conn.commit()
+    finally:
+        conn.close()
+    
+    # 用户信息可能已更新，缓存中该用户的会话随之失效
+    invalidate_user_sessions(str(user_id))
+    invalidate_session(generated_open_id)
     
-    conn.commit()
-    conn.close()
+    # 新增或恢复了用户，用户总数发生变化
+    if not user:
+        invalidate_admin_stats()
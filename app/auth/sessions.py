@@ -0,0 +1,90 @@
+"""
+登录会话存储
+
+每次登录在 sessions 表中新增一行（token 即Cookie中的open_id），同一用户可以在多台设备上同时登录，
+每个用户最多保留 SESSION_MAX_PER_USER 个会话，超出时删除最早的。管理员只保留最近一次登录的会话。
+校验时按主键查询一次并关联 users 表；会话在 SESSION_TTL 秒后过期，过期记录由定时任务定期清除。
+
+users.open_id 仍记录最近一次登录的open_id（管理后台按它显示管理员名称），但不再作为会话校验依据。
+"""
+import time
+from typing import Optional
+
+from app import USER_DB_FILE, logger
+from app.utils.db import connect
+from config import settings
+
+# 按会话token查询用户信息，列顺序与 SESSION_FIELDS 对应
+SESSION_LOOKUP_SQL = """
+    SELECT u.username, u.user_id, u.department_name, u.department_id, u.position,
+           s.token, u.first_login_time, u.last_activity, s.expires_at
+    FROM sessions s
+    JOIN users u ON u.user_id = s.user_id AND u.deleted = 0
+    WHERE s.token = ? AND s.expires_at > ?
+"""
+SESSION_FIELDS = ["username", "user_id", "department_name", "department_id", "position",
+                  "open_id", "first_login_time", "last_activity", "expires_at"]
+
+
+def create_session(cursor, token: str, user_id: str, now: int, exclusive: bool = False):
+    """
+    新增登录会话（在调用方的事务中执行，由调用方提交）
+
+    :param exclusive: 是否删除该用户的其他会话（管理员只允许一个会话）
+    """
+    if exclusive:
+        cursor.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+    cursor.execute(
+        "INSERT OR REPLACE INTO sessions (token, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
+        (token, user_id, now, now + int(settings.SESSION_TTL))
+    )
+    if not exclusive:
+        # 超出数量上限时删除最早的会话
+        cursor.execute(
+            """DELETE FROM sessions WHERE user_id = ? AND token NOT IN (
+                   SELECT token FROM sessions WHERE user_id = ? ORDER BY created_at DESC LIMIT ?
+               )""",
+            (user_id, user_id, max(int(settings.SESSION_MAX_PER_USER), 1))
+        )
+
+
+def delete_session(token: str) -> Optional[str]:
+    """
+    删除登录会话（同步，在数据库线程池中执行）
+
+    :return: 会话所属用户的用户名，会话不存在时返回None
+    """
+    conn = connect(USER_DB_FILE)
+    try:
+        row = conn.execute(
+            "SELECT u.username FROM sessions s JOIN users u ON u.user_id = s.user_id WHERE s.token = ?",
+            (token,)
+        ).fetchone()
+        conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+        conn.commit()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def sweep_expired_sessions() -> int:
+    """
+    清除过期的登录会话和令牌吊销记录（同步，由定时任务在线程中执行）
+
+    :return: 清除的会话数
+    """
+    now = int(time.time())
+    conn = connect(USER_DB_FILE)
+    try:
+        removed = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+        conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (now,))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"清除过期会话失败: {str(e)}")
+        return 0
+    finally:
+        conn.close()
+
+    if removed:
+        logger.info(f"已清除 {removed} 个过期会话")
+    return removed
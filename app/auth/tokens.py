@@ -0,0 +1,172 @@
+"""
+签名会话令牌
+
+SESSION_MODE=token 时，普通用户登录后 open_id Cookie 中保存的不再是随机open_id，而是用 COOKIE_SECRET
+签名的令牌，其中携带用户ID、用户名、部门、角色和过期时间:
+    base64url(JSON载荷).base64url(HMAC-SHA256签名)
+校验只需在内存中重新计算签名，只有登录和登出（吊销）时才写库；
+is_valid_open_id 在会话缓存未命中时确认一次用户未被删除，删除用户后令牌最多 SESSION_CACHE_TTL 秒内失效。
+
+登出时令牌ID（jti）写入 revoked_tokens 表并加入内存吊销列表，直到令牌过期后清除。
+吊销列表在应用启动时从数据库加载（load_revoked_tokens）。
+管理员始终使用数据库会话，不会签发令牌。
+
+COOKIE_SECRET 未设置时每次启动随机生成，重启后所有令牌失效，使用令牌模式时应在环境变量中固定。
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+from app import USER_DB_FILE
+from app.utils.db import connect
+from config import settings
+
+# jti -> 过期时间戳
+_revoked: Dict[str, float] = {}
+_revoked_loaded = False
+_revoked_lock = threading.Lock()
+
+
+def token_mode() -> bool:
+    """是否启用签名令牌会话"""
+    return settings.SESSION_MODE == "token"
+
+
+def looks_like_token(value: str) -> bool:
+    """随机open_id中不含"."，据此区分令牌和数据库会话"""
+    return bool(value) and "." in value
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(settings.COOKIE_SECRET.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def issue_token(user_id: str, username: str, department_id: str, department_name: str = "", position: str = "") -> str:
+    """
+    签发会话令牌
+
+    :return: 可直接写入Cookie的令牌字符串
+    """
+    now = int(time.time())
+    claims = {
+        "uid": str(user_id),
+        "name": username,
+        "did": str(department_id),
+        "dn": department_name,
+        "pos": position,
+        "role": "user",
+        "iat": now,
+        "exp": now + int(settings.SESSION_TOKEN_TTL),
+        "jti": secrets.token_urlsafe(12),
+    }
+    payload = _b64encode(json.dumps(claims, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """
+    校验签名和有效期，返回令牌载荷（不检查吊销列表）
+
+    :return: 载荷字典，签名错误、格式错误或已过期时返回None
+    """
+    try:
+        payload, signature = token.split(".", 1)
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+
+    if not isinstance(claims, dict) or claims.get("exp", 0) <= time.time():
+        return None
+    return claims
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """
+    校验令牌并返回与数据库会话相同结构的用户信息（纯内存操作，吊销列表需已加载）
+
+    :return: 用户信息字典，无效、过期或已吊销时返回None
+    """
+    claims = decode_token(token)
+    if claims is None or claims.get("role") != "user":
+        return None
+
+    if claims.get("jti") in _revoked:
+        return None
+
+    return {
+        "user_id": claims.get("uid"),
+        "username": claims.get("name"),
+        "department_id": claims.get("did"),
+        "department_name": claims.get("dn"),
+        "position": claims.get("pos"),
+        "role": claims.get("role"),
+        "open_id": token,
+        "last_activity": claims.get("iat"),
+        "expires_at": claims.get("exp"),
+    }
+
+
+def revoke_token(token: str) -> Optional[dict]:
+    """
+    吊销令牌（同步，在数据库线程池中执行）
+
+    :return: 被吊销令牌的载荷，令牌本身无效时返回None
+    """
+    claims = decode_token(token)
+    if claims is None or not claims.get("jti"):
+        return None
+
+    now = time.time()
+    conn = connect(USER_DB_FILE)
+    try:
+        # 顺带清除已自然过期的记录
+        conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "INSERT OR REPLACE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)",
+            (claims["jti"], claims["exp"])
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    with _revoked_lock:
+        _revoked[claims["jti"]] = claims["exp"]
+        for jti in [jti for jti, expires_at in _revoked.items() if expires_at <= now]:
+            del _revoked[jti]
+    return claims
+
+
+def revocations_loaded() -> bool:
+    """吊销列表是否已加载"""
+    return _revoked_loaded
+
+
+def load_revoked_tokens():
+    """从数据库加载尚未过期的吊销记录（同步，在数据库线程池中执行，应用启动时调用）"""
+    global _revoked_loaded
+    with _revoked_lock:
+        if _revoked_loaded:
+            return
+        conn = connect(USER_DB_FILE)
+        try:
+            rows = conn.execute("SELECT jti, expires_at FROM revoked_tokens WHERE expires_at > ?", (time.time(),)).fetchall()
+        finally:
+            conn.close()
+        _revoked.update(rows)
+        _revoked_loaded = True
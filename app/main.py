@@ -1,5 +1,4 @@
 import logging
-import os
 import time
 
 import uvicorn
@@ -11,11 +10,15 @@ from starlette.middleware.base import BaseHTTPMiddleware
 
 from app import logger
 from app.auth import routes as auth_routes
+from app.auth.tokens import load_revoked_tokens
 from app.routes import crontab
 from app.routes import index, sign, statistics
 from app.routes.admin import router as admin_router
 from app.routes.setup import router as setup_router
-from app.utils.db_init import initialize_database
+from app.utils.activity import activity_tracker
+from app.utils.db import close_all_connections, run_in_db
+from app.utils.log import log_writer
+from app.utils.upstream import init_upstream_client, close_upstream_client
 from config import Settings, settings
 
 # 引入获取版本的函数，但尚未执行
@@ -106,12 +109,19 @@ app.include_router(setup_router, tags=["系统初始化"])  # 初始化路由
 @app.on_event("startup")
 async def startup_db_client():
     try:
-        # 确保data目录存在
-        data_dir = "data"
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-        # 初始化所有数据库
-        initialize_database()
+        # 数据库已在导入app包时完成初始化和迁移
+        
+        # 创建上游考勤API的共享连接池
+        await init_upstream_client()
+        
+        # 启动后台日志写入线程
+        log_writer.start()
+        
+        # 启动后台活跃时间写入线程
+        activity_tracker.start()
+        
+        # 加载会话令牌吊销列表，之后校验令牌不再访问数据库
+        await run_in_db(load_revoked_tokens)
         
         # 只在项目启动时获取版本号一次，并全局更新
         app_version = await get_latest_github_tag()
@@ -125,6 +135,19 @@ async def startup_db_client():
     except Exception as e:
         logger.error(f"数据库初始化或版本号更新失败: {str(e)}")
 
+# 关闭共享连接池
+@app.on_event("shutdown")
+async def shutdown_upstream_client():
+    await close_upstream_client()
+
+
+@app.on_event("shutdown")
+async def shutdown_database_pool():
+    # 先写完队列中的日志和活跃时间，再关闭数据库连接
+    log_writer.stop()
+    activity_tracker.stop()
+    close_all_connections()
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
  
\ No newline at end of file
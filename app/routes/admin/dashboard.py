@@ -1,11 +1,12 @@
 import datetime
-import sqlite3
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
 from app import USER_DB_FILE, logger
+from app.utils.db import fetch_all
 from app.auth.dependencies import admin_required
 from app.routes.admin.utils import get_admin_stats, get_admin_name, templates
+from app.utils.metrics import upstream_metrics
 
 # 创建路由器
 router = APIRouter()
@@ -33,6 +34,7 @@ async def admin_dashboard(request: Request):
             "request": request,
             "user_info": {"username": admin_name, "user_id": "admin"},
             "stats": stats,
+            "upstream_metrics": upstream_metrics(),
             "page_title": "管理员仪表盘",
             "current_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
@@ -49,7 +51,8 @@ async def get_stats_data(request: Request):
         stats = await get_admin_stats()
         return JSONResponse({
             "success": True,
-            "stats": stats
+            "stats": stats,
+            "upstream": upstream_metrics()
         })
     except Exception as e:
         logger.error(f"获取统计数据失败: {str(e)}")
@@ -93,15 +96,11 @@ async def get_users_api(request: Request):
     获取用户列表API
     """
     try:
-        # 连接数据库
-        conn = sqlite3.connect(USER_DB_FILE)
-        cursor = conn.cursor()
-        
         # 查询所有普通用户
-        cursor.execute(
+        users = await fetch_all(
+            USER_DB_FILE,
             "SELECT id, username, user_id, department_name, department_id, position, first_login_time, last_activity FROM users WHERE user_id != 'admin'"
         )
-        users = cursor.fetchall()
         
         # 格式化用户数据
         formatted_users = []
@@ -120,9 +119,6 @@ async def get_users_api(request: Request):
                 "last_activity": last_activity
             })
         
-        # 关闭连接
-        conn.close()
-        
         return JSONResponse({
             "success": True,
             "users": formatted_users
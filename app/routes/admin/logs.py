@@ -1,16 +1,94 @@
 import datetime
-import sqlite3
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
 from app import LOG_DB_FILE, SIGN_DB_FILE, logger
+from app.utils.cache import TTLCache
+from app.utils.db import connect, run_in_db
+from app.utils.db_init import FTS_TABLES
 from app.auth.dependencies import admin_required
 from app.routes.admin.utils import get_admin_stats, get_admin_name, templates
 from app.utils.log import LogType
+from config import settings
 
 # 创建路由器
 router = APIRouter()
 
+# 按（表, 筛选条件）缓存总记录数，翻页时不再重复 COUNT(*)
+_count_cache = TTLCache(maxsize=256, default_ttl=settings.LOG_COUNT_CACHE_TTL)
+
+def _parse_cursor(cursor: str):
+    """解析翻页游标 "时间戳:id"，格式错误返回None"""
+    try:
+        time_value, row_id = cursor.rsplit(":", 1)
+        return float(time_value), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _text_condition(table: str, columns: list, term: str):
+    """
+    构造文本模糊搜索条件
+
+    已建立全文索引且关键词不少于3个字时使用FTS5（trigram至少需要3个字符），
+    否则退回 LIKE '%...%'，例如两个字的姓名。
+
+    :return: (以 " AND ..." 开头的条件, 参数列表)
+    """
+    term = term.strip()
+    if table in FTS_TABLES and len(term) >= 3:
+        phrase = '"' + term.replace('"', '""') + '"'
+        column_filter = "{" + " ".join(columns) + "}"
+        return f" AND id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)", [f"{column_filter}: {phrase}"]
+
+    like = " OR ".join(f"{column} LIKE ?" for column in columns)
+    return f" AND ({like})", [f"%{term}%"] * len(columns)
+
+def _query_logs(db_file: str, table: str, time_column: str, conditions: str, params: list, page: int, limit: int, cursor: str = None):
+    """
+    分页查询日志（同步，在数据库线程池中执行）
+
+    按（时间, id）倒序排列。传入上一页返回的游标时从游标位置继续读取（键集分页），
+    耗时与页码无关；没有游标（如直接跳转到某一页）时退回 OFFSET 分页。
+
+    :param conditions: 以 " AND ..." 拼接的筛选条件
+    :return: (总记录数, 日志行, 列名, 下一页游标)
+    """
+    conn = connect(db_file)
+    try:
+        # 获取总记录数（短时间内的新日志不计入，翻页时保持稳定）
+        count_key = (table, conditions, tuple(params))
+        total_count = _count_cache.get(count_key)
+        if total_count is None:
+            total_count = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE 1=1{conditions}", params).fetchone()[0]
+            _count_cache.set(count_key, total_count)
+
+        query = f"SELECT * FROM {table} WHERE 1=1{conditions}"
+        query_params = list(params)
+        position = _parse_cursor(cursor) if cursor else None
+        if position:
+            query += f" AND {time_column} <= ? AND ({time_column} < ? OR id < ?)"
+            query_params.extend([position[0], position[0], position[1]])
+            offset = 0
+        else:
+            offset = (page - 1) * limit
+
+        # 多取一行判断是否还有下一页
+        query += f" ORDER BY {time_column} DESC, id DESC LIMIT ? OFFSET ?"
+        query_params.extend([limit + 1, offset])
+        result = conn.execute(query, query_params)
+        logs = result.fetchall()
+        column_names = [description[0] for description in result.description]
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        last = dict(zip(column_names, logs[-1]))
+        next_cursor = f"{last[time_column]!r}:{last['id']}"
+
+    return total_count, logs, column_names, next_cursor
+
 @router.get("/logs")
 @admin_required
 async def admin_logs_page(request: Request):
@@ -42,27 +120,31 @@ async def admin_logs_page(request: Request):
 
 @router.get("/sign-logs-api")
 @admin_required
-async def get_sign_logs_api(request: Request, page: int = 1, limit: int = 50, username: str = None, date_from: str = None, date_to: str = None, sign_type: str = None, status: str = None):
+async def get_sign_logs_api(request: Request, page: int = 1, limit: int = 50, username: str = None, date_from: str = None, date_to: str = None, sign_type: str = None, status: str = None, keyword: str = None, cursor: str = None):
     """
     获取签到日志API
+
+    username 按用户名、keyword 按备注模糊搜索
     """
     try:
-        # 连接数据库
-        conn = sqlite3.connect(SIGN_DB_FILE)
-        cursor = conn.cursor()
-        
         # 构建查询条件
-        query = "SELECT * FROM sign_logs WHERE 1=1"
+        conditions = ""
         params = []
         
         if username and username.strip():
-            query += " AND username LIKE ?"
-            params.append(f"%{username}%")
+            condition, condition_params = _text_condition("sign_logs", ["username"], username)
+            conditions += condition
+            params.extend(condition_params)
+        
+        if keyword and keyword.strip():
+            condition, condition_params = _text_condition("sign_logs", ["remark"], keyword)
+            conditions += condition
+            params.extend(condition_params)
         
         if date_from:
             try:
                 from_timestamp = datetime.datetime.strptime(date_from, "%Y-%m-%d").timestamp()
-                query += " AND sign_time >= ?"
+                conditions += " AND sign_time >= ?"
                 params.append(from_timestamp)
             except ValueError:
                 pass
@@ -73,35 +155,23 @@ async def get_sign_logs_api(request: Request, page: int = 1, limit: int = 50, us
                 to_date = datetime.datetime.strptime(date_to, "%Y-%m-%d")
                 to_date = to_date.replace(hour=23, minute=59, second=59)
                 to_timestamp = to_date.timestamp()
-                query += " AND sign_time <= ?"
+                conditions += " AND sign_time <= ?"
                 params.append(to_timestamp)
             except ValueError:
                 pass
         
         if sign_type and sign_type != "all":
-            query += " AND sign_type = ?"
+            conditions += " AND sign_type = ?"
             params.append(sign_type)
             
         if status and status != "all":
-            query += " AND status = ?"
+            conditions += " AND status = ?"
             params.append(status)
         
-        # 获取总记录数
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
-        
-        # 添加排序和分页
-        query += " ORDER BY sign_time DESC LIMIT ? OFFSET ?"
-        offset = (page - 1) * limit
-        params.extend([limit, offset])
-        
-        # 执行查询
-        cursor.execute(query, params)
-        logs = cursor.fetchall()
-        
-        # 获取列名
-        column_names = [description[0] for description in cursor.description]
+        # 总数使用缓存，分页优先使用游标
+        total_count, logs, column_names, next_cursor = await run_in_db(
+            _query_logs, SIGN_DB_FILE, "sign_logs", "sign_time", conditions, params, page, limit, cursor
+        )
         
         # 格式化日志数据
         formatted_logs = []
@@ -116,16 +186,14 @@ async def get_sign_logs_api(request: Request, page: int = 1, limit: int = 50, us
             
             formatted_logs.append(log_dict)
         
-        # 关闭连接
-        conn.close()
-        
         return JSONResponse({
             "success": True,
             "logs": formatted_logs,
             "total": total_count,
             "page": page,
             "limit": limit,
-            "pages": (total_count + limit - 1) // limit
+            "pages": (total_count + limit - 1) // limit,
+            "next_cursor": next_cursor
         })
     except Exception as e:
         logger.error(f"获取签到日志失败: {str(e)}")
@@ -136,27 +204,31 @@ async def get_sign_logs_api(request: Request, page: int = 1, limit: int = 50, us
 
 @router.get("/operation-logs-api")
 @admin_required
-async def get_operation_logs_api(request: Request, page: int = 1, limit: int = 50, username: str = None, date_from: str = None, date_to: str = None, operation_type: str = None, status: str = None):
+async def get_operation_logs_api(request: Request, page: int = 1, limit: int = 50, username: str = None, date_from: str = None, date_to: str = None, operation_type: str = None, status: str = None, keyword: str = None, cursor: str = None):
     """
     获取操作日志API
+
+    username 按用户名、keyword 按操作详情和备注模糊搜索
     """
     try:
-        # 连接数据库
-        conn = sqlite3.connect(LOG_DB_FILE)
-        cursor = conn.cursor()
-        
         # 构建查询条件
-        query = "SELECT * FROM operation_logs WHERE 1=1"
+        conditions = ""
         params = []
         
         if username and username.strip():
-            query += " AND username LIKE ?"
-            params.append(f"%{username}%")
+            condition, condition_params = _text_condition("operation_logs", ["username"], username)
+            conditions += condition
+            params.extend(condition_params)
+        
+        if keyword and keyword.strip():
+            condition, condition_params = _text_condition("operation_logs", ["operation_detail", "remarks"], keyword)
+            conditions += condition
+            params.extend(condition_params)
         
         if date_from:
             try:
                 from_timestamp = datetime.datetime.strptime(date_from, "%Y-%m-%d").timestamp()
-                query += " AND operation_time >= ?"
+                conditions += " AND operation_time >= ?"
                 params.append(from_timestamp)
             except ValueError:
                 pass
@@ -167,35 +239,23 @@ async def get_operation_logs_api(request: Request, page: int = 1, limit: int = 5
                 to_date = datetime.datetime.strptime(date_to, "%Y-%m-%d")
                 to_date = to_date.replace(hour=23, minute=59, second=59)
                 to_timestamp = to_date.timestamp()
-                query += " AND operation_time <= ?"
+                conditions += " AND operation_time <= ?"
                 params.append(to_timestamp)
             except ValueError:
                 pass
         
         if operation_type and operation_type != "all":
-            query += " AND operation_type = ?"
+            conditions += " AND operation_type = ?"
             params.append(operation_type)
             
         if status and status != "all":
-            query += " AND status = ?"
+            conditions += " AND status = ?"
             params.append(status)
         
-        # 获取总记录数
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
-        
-        # 添加排序和分页
-        query += " ORDER BY operation_time DESC LIMIT ? OFFSET ?"
-        offset = (page - 1) * limit
-        params.extend([limit, offset])
-        
-        # 执行查询
-        cursor.execute(query, params)
-        logs = cursor.fetchall()
-        
-        # 获取列名
-        column_names = [description[0] for description in cursor.description]
+        # 总数使用缓存，分页优先使用游标
+        total_count, logs, column_names, next_cursor = await run_in_db(
+            _query_logs, LOG_DB_FILE, "operation_logs", "operation_time", conditions, params, page, limit, cursor
+        )
         
         # 格式化日志数据
         formatted_logs = []
@@ -210,16 +270,14 @@ async def get_operation_logs_api(request: Request, page: int = 1, limit: int = 5
             
             formatted_logs.append(log_dict)
         
-        # 关闭连接
-        conn.close()
-        
         return JSONResponse({
             "success": True,
             "logs": formatted_logs,
             "total": total_count,
             "page": page,
             "limit": limit,
-            "pages": (total_count + limit - 1) // limit
+            "pages": (total_count + limit - 1) // limit,
+            "next_cursor": next_cursor
         })
     except Exception as e:
         logger.error(f"获取操作日志失败: {str(e)}")
@@ -230,31 +288,29 @@ async def get_operation_logs_api(request: Request, page: int = 1, limit: int = 5
 
 @router.get("/login-logs-api")
 @admin_required
-async def get_login_logs_api(request: Request, page: int = 1, limit: int = 50, username: str = None, user_id: str = None, date_from: str = None, date_to: str = None, status: str = None):
+async def get_login_logs_api(request: Request, page: int = 1, limit: int = 50, username: str = None, user_id: str = None, date_from: str = None, date_to: str = None, status: str = None, cursor: str = None):
     """
     获取登录日志API
     """
     try:
-        # 连接数据库
-        conn = sqlite3.connect(LOG_DB_FILE)
-        cursor = conn.cursor()
-        
         # 构建查询条件
-        query = "SELECT * FROM login_logs WHERE 1=1"
+        conditions = ""
         params = []
         
         if username and username.strip():
-            query += " AND username LIKE ?"
-            params.append(f"%{username}%")
+            condition, condition_params = _text_condition("login_logs", ["username"], username)
+            conditions += condition
+            params.extend(condition_params)
             
         if user_id and user_id.strip():
-            query += " AND user_id LIKE ?"
-            params.append(f"%{user_id}%")
+            condition, condition_params = _text_condition("login_logs", ["user_id"], user_id)
+            conditions += condition
+            params.extend(condition_params)
         
         if date_from:
             try:
                 from_timestamp = datetime.datetime.strptime(date_from, "%Y-%m-%d").timestamp()
-                query += " AND login_time >= ?"
+                conditions += " AND login_time >= ?"
                 params.append(from_timestamp)
             except ValueError:
                 pass
@@ -265,31 +321,19 @@ async def get_login_logs_api(request: Request, page: int = 1, limit: int = 50, u
                 to_date = datetime.datetime.strptime(date_to, "%Y-%m-%d")
                 to_date = to_date.replace(hour=23, minute=59, second=59)
                 to_timestamp = to_date.timestamp()
-                query += " AND login_time <= ?"
+                conditions += " AND login_time <= ?"
                 params.append(to_timestamp)
             except ValueError:
                 pass
             
         if status and status != "all":
-            query += " AND status = ?"
+            conditions += " AND status = ?"
             params.append(status)
         
-        # 获取总记录数
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
-        
-        # 添加排序和分页
-        query += " ORDER BY login_time DESC LIMIT ? OFFSET ?"
-        offset = (page - 1) * limit
-        params.extend([limit, offset])
-        
-        # 执行查询
-        cursor.execute(query, params)
-        logs = cursor.fetchall()
-        
-        # 获取列名
-        column_names = [description[0] for description in cursor.description]
+        # 总数使用缓存，分页优先使用游标
+        total_count, logs, column_names, next_cursor = await run_in_db(
+            _query_logs, LOG_DB_FILE, "login_logs", "login_time", conditions, params, page, limit, cursor
+        )
         
         # 格式化日志数据
         formatted_logs = []
@@ -304,16 +348,14 @@ async def get_login_logs_api(request: Request, page: int = 1, limit: int = 50, u
             
             formatted_logs.append(log_dict)
         
-        # 关闭连接
-        conn.close()
-        
         return JSONResponse({
             "success": True,
             "logs": formatted_logs,
             "total": total_count,
             "page": page,
             "limit": limit,
-            "pages": (total_count + limit - 1) // limit
+            "pages": (total_count + limit - 1) // limit,
+            "next_cursor": next_cursor
         })
     except Exception as e:
         logger.error(f"获取登录日志失败: {str(e)}")
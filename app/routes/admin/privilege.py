@@ -1,6 +1,5 @@
 import calendar
 import datetime
-import httpx
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -12,8 +11,11 @@ from app.auth.utils import get_mobile_user_agent
 from app.routes.admin.utils import get_admin_stats, get_admin_name, templates
 from app.routes.index import get_attendance_info, show_sign_button
 from app.routes.sign import check_sign_time
-from app.routes.statistics import GetYueTjList, get_Attendance_Statistics
-from app.utils.host import build_api_url
+from app.routes.statistics import DEFAULT_STATISTICS, GetYueTjList, get_Attendance_Statistics, invalidate_yue_tj_cache
+from app.utils.concurrency import fan_out
+from app.utils.resilience import READ_RETRY
+from app.utils.upstream import upstream_request
+from app.utils.workday import is_workday
 from app.utils.log import LogType, log_operation, log_sign_activity
 from config import settings
 
@@ -86,14 +88,29 @@ async def admin_embed_user(request: Request):
                 "message": "用户ID不能为空"
             }, status_code=400)
         
-        # 从真实服务器获取用户信息
-        api_url = build_api_url('/Apps/getUserInfo')
-        headers = {'User-Agent': get_mobile_user_agent(request.headers.get('User-Agent'))}
-        data = {"userid": user_id, "unitcode": settings.UNIT_CODE}
+        now = datetime.datetime.now()
+        ua = get_mobile_user_agent(request.headers.get('User-Agent'))
+        headers = {'User-Agent': ua}
+        
+        async def load_server_user():
+            # 从真实服务器获取用户信息
+            data = {"userid": user_id, "unitcode": settings.UNIT_CODE}
+            response = await upstream_request("POST", '/Apps/getUserInfo', retry=READ_RETRY, headers=headers, json=data, timeout=10.0)
+            return response.json()
+        
+        async def load_attendance():
+            # 非工作日不需要请求打卡数据
+            if not await is_workday(now.date(), headers, user_id):
+                return False, []
+            return True, await get_attendance_info(ua, user_id)
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(api_url, headers=headers, json=data)
-            server_data = response.json()
+        # 用户信息与考勤信息互不依赖，并发获取
+        results = await fan_out(
+            server_data=(load_server_user(), {}),
+            attendance=(load_attendance(), (True, {}))
+        )
+        server_data = results["server_data"]
+        today_is_workday, attendance_data = results["attendance"]
         
         # 创建用户信息
         user_info = {
@@ -104,23 +121,13 @@ async def admin_embed_user(request: Request):
             "position": server_data.get("zw", "")
         }
         
-        # 获取考勤信息
-        now = datetime.datetime.now()
-        headers = {'User-Agent': get_mobile_user_agent(request.headers.get('User-Agent'))}
-        
-        # 获取月度考勤数据
-        yue_tj_list = await GetYueTjList(headers, user_id, str(now.year), str(now.month).zfill(2))
-        is_workday = yue_tj_list[now.day - 1].get("workday") == 1
-        
         # 处理考勤数据
-        if not is_workday:
+        if not today_is_workday:
             # 非工作日
-            attendance_data = []
             show_sign_btn = {"show": False, "message": "今天是休息日，无需打卡"}
         else:
-            # 工作日，获取考勤数据
-            attendance_data = await get_attendance_info(headers, user_id)
-            show_sign_btn = show_sign_button(attendance_data)
+            # 工作日，显示签到按钮
+            show_sign_btn = show_sign_button(attendance_data or {})
         
         # 返回用户查看界面，使用index.html模板
         return templates.TemplateResponse(
@@ -129,7 +136,7 @@ async def admin_embed_user(request: Request):
                 "request": request,
                 "user_info": user_info,
                 "attendance_data": attendance_data,
-                "is_workday": is_workday,
+                "is_workday": today_is_workday,
                 "show_sign_button": show_sign_btn,
                 "current_month": now.month,
                 "current_time": now.strftime("%Y-%m-%d %H:%M:%S"),
@@ -198,12 +205,10 @@ async def post_department_users(request: Request):
             }, status_code=404)
             
         # 向真实服务器发送请求获取部门用户列表
-        api_url = build_api_url('/Apps/getUserInfoList')
         headers = {'User-Agent': get_mobile_user_agent(request.headers.get('User-Agent'))}
         data = {"depid": department_id, "unitcode": settings.UNIT_CODE}
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(api_url, headers=headers, json=data)
-            users = [{key: item[key] for key in {'userid', 'username'} if key in item} for item in response.json()]
+        response = await upstream_request("POST", '/Apps/getUserInfoList', retry=READ_RETRY, headers=headers, json=data, timeout=10.0)
+        users = [{key: item[key] for key in {'userid', 'username'} if key in item} for item in response.json()]
         
         return JSONResponse({
             "success": True,
@@ -279,11 +284,10 @@ async def post_user_embed(request: Request):
         now = datetime.datetime.now()
         headers = {'User-Agent': get_mobile_user_agent(request.headers.get('User-Agent'))}
         
-        # 获取月度考勤数据
-        yue_tj_list = await GetYueTjList(headers, user_id, str(now.year), str(now.month).zfill(2))
-        is_workday = yue_tj_list[now.day - 1].get("isholiday")  == 0
+        # 判断今天是否工作日
+        today_is_workday = await is_workday(now.date(), headers, user_id)
         # 处理考勤数据
-        if not is_workday:
+        if not today_is_workday:
             # 非工作日
             attendance_data = []
             show_sign_btn = {"show": False, "message": "今天是休息日，无需打卡"}
@@ -297,7 +301,7 @@ async def post_user_embed(request: Request):
             "success": True,
             "user_info": data,
             "attendance_data": attendance_data,
-            "is_workday": is_workday,
+            "is_workday": today_is_workday,
             "show_sign_button": show_sign_btn,
             "current_month": now.month,
             "current_time": now.strftime("%Y-%m-%d %H:%M:%S")
@@ -341,17 +345,19 @@ async def post_user_embed_sign(request: Request):
 
         dep_id = data.get("departmentId")
 
-        api_url = build_api_url("/AttendanceCard/SaveAttCheckinout")
         headers = {"User-Agent": get_mobile_user_agent(request.headers.get("User-Agent", ""))}
         data = {"model": {"Aid": 0, "UnitCode": settings.UNIT_CODE, "userID": user_id, "userDepID": dep_id, "Mid": 134, "Num_RunID": 14, "lng": "", "lat": "", "realaddress": "", "iSDelete": 0, "administratorChangesRemark": settings.REAL_ADDRESS}, "AttType": 1}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(api_url, json=data, headers=headers)
-            result = response.json()
+        response = await upstream_request("POST", "/AttendanceCard/SaveAttCheckinout", json=data, headers=headers)
+        result = response.json()
             
         # 记录打卡结果到日志数据库
         success = result.get("success", False)
         result_message = result.get("message", "未知结果")
+        
+        # 打卡成功后当月考勤明细已变化，清除缓存
+        if success:
+            invalidate_yue_tj_cache(user_id)
     
         await log_sign_activity(
             username, 
@@ -446,15 +452,17 @@ async def post_user_embed_metrics(request: Request):
         month_str = str(month_int).zfill(2)
         year_str = str(year_int)
     
-        # 获取统计数据
-        stats = await get_Attendance_Statistics(headers, user_id, year_str, month_str)
-        daily_records = await GetYueTjList(headers, user_id, year_str, month_str)
+        # 并发获取统计数据和每日明细
+        results = await fan_out(
+            statistics=(get_Attendance_Statistics(headers, user_id, year_str, month_str), DEFAULT_STATISTICS),
+            details=(GetYueTjList(headers, user_id, year_str, month_str), [])
+        )
     
         # 构建返回的数据结构 - 返回原始数据，让前端处理
         result = {
             "success": True,
-            "statistics": stats,
-            "details": daily_records,
+            "statistics": results["statistics"],
+            "details": results["details"],
             "year": year_int,
             "month": month_int,
             "days": days_in_month
@@ -5,7 +5,8 @@ import sqlite3
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
-from app import CRON_DB_FILE, USER_DB_FILE, logger
+from app import CRON_DB_FILE, logger
+from app.utils.db import execute, fetch_one, run_in_db, unified_connection
 from app.auth.dependencies import admin_required
 from app.routes.admin.utils import get_admin_stats, get_admin_name, templates
 
@@ -46,42 +47,14 @@ async def get_schedules_api(request: Request):
     获取定时任务列表API
     """
     try:
-        # 连接cron.db数据库
-        conn = sqlite3.connect(CRON_DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 查询所有定时任务
-        cursor.execute(
-            """
-            SELECT s.id, s.user_id, s.username, s.morning, s.afternoon, 
-                   s.schedule_index, s.created_at, s.morning_time, s.afternoon_time,
-                   s.morning_selecte, s.afternoon_selecte
-            FROM schedules s
-            ORDER BY s.created_at DESC
-            """
-        )
-        
-        schedules = cursor.fetchall()
+        # 定时任务和用户信息在一次JOIN查询中取出
+        schedules = await run_in_db(_load_schedules)
         
         # 格式化定时任务数据
         formatted_schedules = []
         for schedule in schedules:
-            index = schedule['schedule_index']
-            
-            # 查询用户详细信息
-            user_conn = sqlite3.connect(USER_DB_FILE)
-            user_conn.row_factory = sqlite3.Row
-            user_cursor = user_conn.cursor()
-            user_cursor.execute(
-                "SELECT department_name, position FROM users WHERE user_id = ?", 
-                (schedule['user_id'],)
-            )
-            user_info = user_cursor.fetchone()
-            user_conn.close()
-            
-            department = user_info['department_name'] if user_info else "未知"
-            position = user_info['position'] if user_info else "未知"
+            department = schedule['department_name'] or "未知"
+            position = schedule['position'] or "未知"
             
             # 解析选择状态数组
             morning_selections = []
@@ -135,9 +108,6 @@ async def get_schedules_api(request: Request):
                 "created_at": schedule['created_at']
             })
         
-        # 关闭连接
-        conn.close()
-        
         return JSONResponse({
             "success": True,
             "schedules": formatted_schedules,
@@ -150,6 +120,27 @@ async def get_schedules_api(request: Request):
             "message": f"获取定时任务列表失败: {str(e)}"
         }, status_code=500)
 
+def _load_schedules():
+    """
+    查询所有定时任务及对应用户的部门、职位（同步，在数据库线程池中执行）
+    """
+    conn = unified_connection()
+    try:
+        conn.row_factory = sqlite3.Row
+        return conn.execute(
+            """
+            SELECT s.id, s.user_id, s.username, s.morning, s.afternoon, 
+                   s.schedule_index, s.created_at, s.morning_time, s.afternoon_time,
+                   s.morning_selecte, s.afternoon_selecte,
+                   u.department_name, u.position
+            FROM schedules s
+            LEFT JOIN users u ON u.user_id = s.user_id
+            ORDER BY s.created_at DESC
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+
 @router.delete("/schedules/{schedule_id}")
 @admin_required
 async def delete_schedule_api(request: Request, schedule_id: int):
@@ -157,14 +148,8 @@ async def delete_schedule_api(request: Request, schedule_id: int):
     删除定时任务API
     """
     try:
-        # 连接cron.db数据库
-        conn = sqlite3.connect(CRON_DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
         # 获取定时任务信息
-        cursor.execute("SELECT user_id FROM schedules WHERE id = ?", (schedule_id,))
-        schedule = cursor.fetchone()
+        schedule = await fetch_one(CRON_DB_FILE, "SELECT user_id FROM schedules WHERE id = ?", (schedule_id,))
         
         if not schedule:
             return JSONResponse({
@@ -172,18 +157,14 @@ async def delete_schedule_api(request: Request, schedule_id: int):
                 "message": "定时任务不存在"
             }, status_code=404)
         
-        user_id = schedule['user_id']
+        user_id = schedule[0]
         
         # 删除定时任务
-        cursor.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
-        conn.commit()
+        await execute(CRON_DB_FILE, "DELETE FROM schedules WHERE id = ?", (schedule_id,))
         
         # 删除APScheduler中的任务
         from app.routes.crontab import remove_schedule_jobs
-        remove_schedule_jobs(user_id)
-        
-        # 关闭连接
-        conn.close()
+        await run_in_db(remove_schedule_jobs, user_id)
         
         return JSONResponse({
             "success": True,
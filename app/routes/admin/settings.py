@@ -1,14 +1,14 @@
 import datetime
 import os
-import sqlite3
 import subprocess
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
 from app import SET_DB_FILE, logger
+from app.utils.db import connect, fetch_all, run_in_db
 from app.auth.dependencies import admin_required
 from app.routes.admin.system import trigger_restart_after_setup
-from app.routes.admin.utils import get_admin_stats, get_admin_name, templates
+from app.routes.admin.utils import get_admin_stats, get_admin_name, invalidate_admin_stats, templates
 from config import Settings, settings
 
 # 创建路由器
@@ -49,13 +49,8 @@ async def get_settings_api(request: Request):
     获取系统设置API
     """
     try:
-        # 连接数据库
-        conn = sqlite3.connect(SET_DB_FILE)
-        cursor = conn.cursor()
-        
         # 获取所有设置
-        cursor.execute("SELECT setting_key, setting_value, description FROM system_settings")
-        settings_data = cursor.fetchall()
+        settings_data = await fetch_all(SET_DB_FILE, "SELECT setting_key, setting_value, description FROM system_settings")
         
         # 格式化设置数据
         formatted_settings = {}
@@ -65,8 +60,6 @@ async def get_settings_api(request: Request):
                 "description": setting[2]
             }
         
-        conn.close()
-        
         return JSONResponse({
             "success": True,
             "settings": formatted_settings
@@ -97,48 +90,28 @@ async def update_settings(request: Request):
         data = await request.json()
         logger.info(f"收到设置更新请求: {data}")
         
-        # 连接数据库
-        conn = sqlite3.connect(SET_DB_FILE)
-        cursor = conn.cursor()
-
-        # 当前时间戳
-        current_time = datetime.datetime.now().timestamp()
-
         # 允许更新的字段
         allowed_fields = ["api_host", "admin_password", "fuck_password", "system_name", "unit_code", "real_address"]
-        updated = False
+        updates = {}
 
         for key in data:
             if key in allowed_fields and data[key]:
                 # 密码字段验证长度
                 if key.endswith("_password") and len(data[key]) < 6:
                     logger.warning(f"密码长度不足: {key}")
-                    conn.close()
                     return JSONResponse({
                         "success": False,
                         "message": f"{key}长度不能少于6个字符"
                     })
 
                 logger.info(f"更新或插入设置: {key}")
-                
-                # 尝试更新
-                cursor.execute(
-                    "UPDATE system_settings SET setting_value = ?, updated_at = ? WHERE setting_key = ?",
-                    (data[key], current_time, key)
-                )
-                
-                # 如果没有行被更新，则插入
-                if cursor.rowcount == 0:
-                    cursor.execute(
-                        "INSERT INTO system_settings (setting_key, setting_value, updated_at) VALUES (?, ?, ?)",
-                        (key, data[key], current_time)
-                    )
+                updates[key] = data[key]
 
-                updated = True
+        updated = bool(updates)
+        if updated:
+            await run_in_db(_save_settings, updates, datetime.datetime.now().timestamp())
+            invalidate_admin_stats()
 
-        conn.commit()
-        conn.close()
-        
         if not updated:
             logger.warning("没有有效设置字段被更新")
             return JSONResponse({
@@ -197,6 +170,28 @@ async def update_settings(request: Request):
             "message": f"更新设置失败: {str(e)}"
         }, status_code=500)
 
+def _save_settings(updates: dict, current_time: float):
+    """在一个事务中更新或插入设置（同步，在数据库线程池中执行）"""
+    conn = connect(SET_DB_FILE)
+    try:
+        cursor = conn.cursor()
+        for key, value in updates.items():
+            # 尝试更新
+            cursor.execute(
+                "UPDATE system_settings SET setting_value = ?, updated_at = ? WHERE setting_key = ?",
+                (value, current_time, key)
+            )
+
+            # 如果没有行被更新，则插入
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    "INSERT INTO system_settings (setting_key, setting_value, updated_at) VALUES (?, ?, ?)",
+                    (key, value, current_time)
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
 @router.post("/sign/settings")
 @admin_required
 async def post_sign_settings(request: Request):
@@ -204,19 +199,13 @@ async def post_sign_settings(request: Request):
     获取签到设置API (POST方法)
     """
     try:
-        # 连接设置数据库
-        conn = sqlite3.connect(SET_DB_FILE)
-        cursor = conn.cursor()
-        
         # 查询签到设置
-        cursor.execute("SELECT setting_key, setting_value FROM system_settings WHERE setting_key LIKE 'sign_%'")
+        rows = await fetch_all(SET_DB_FILE, "SELECT setting_key, setting_value FROM system_settings WHERE setting_key LIKE 'sign_%'")
         
         settings = {}
-        for row in cursor.fetchall():
+        for row in rows:
             settings[row[0]] = row[1]
         
-        conn.close()
-        
         # 如果没有配置，使用默认值
         if not settings:
             settings = {
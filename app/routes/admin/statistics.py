@@ -1,9 +1,13 @@
 import datetime
 
 from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
 
+from app import logger
 from app.auth.dependencies import admin_required
 from app.routes.admin.utils import get_admin_stats, get_admin_name, templates
+from app.utils.db import run_in_db
+from app.utils.retention import query_login_stats, query_operation_stats, query_sign_stats
 
 # 创建路由器
 router = APIRouter()
@@ -34,4 +38,61 @@ async def admin_statistics_page(request: Request):
             "page_title": "考勤统计",
             "current_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-    ) 
\ No newline at end of file
+    )
+
+@router.get("/sign-stats-api")
+@admin_required
+async def get_sign_stats_api(request: Request, username: str = None, date_from: str = None, date_to: str = None, sign_type: str = None, status: str = None):
+    """
+    签到统计API（包含已归档的历史数据）
+    """
+    try:
+        stats = await run_in_db(query_sign_stats, username, date_from, date_to, sign_type, status)
+        return JSONResponse({
+            "success": True,
+            "stats": stats
+        })
+    except Exception as e:
+        logger.error(f"获取签到统计失败: {str(e)}")
+        return JSONResponse({
+            "success": False,
+            "message": f"获取签到统计失败: {str(e)}"
+        }, status_code=500)
+
+@router.get("/operation-stats-api")
+@admin_required
+async def get_operation_stats_api(request: Request, date_from: str = None, date_to: str = None, operation_type: str = None, status: str = None):
+    """
+    操作日志统计API（包含已归档的历史数据）
+    """
+    try:
+        stats = await run_in_db(query_operation_stats, date_from, date_to, operation_type, status)
+        return JSONResponse({
+            "success": True,
+            "stats": stats
+        })
+    except Exception as e:
+        logger.error(f"获取操作日志统计失败: {str(e)}")
+        return JSONResponse({
+            "success": False,
+            "message": f"获取操作日志统计失败: {str(e)}"
+        }, status_code=500)
+
+@router.get("/login-stats-api")
+@admin_required
+async def get_login_stats_api(request: Request, date_from: str = None, date_to: str = None, status: str = None):
+    """
+    登录日志统计API（包含已归档的历史数据）
+    """
+    try:
+        stats = await run_in_db(query_login_stats, date_from, date_to, status)
+        return JSONResponse({
+            "success": True,
+            "stats": stats
+        })
+    except Exception as e:
+        logger.error(f"获取登录日志统计失败: {str(e)}")
+        return JSONResponse({
+            "success": False,
+            "message": f"获取登录日志统计失败: {str(e)}"
+        }, status_code=500)
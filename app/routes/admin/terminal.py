@@ -7,13 +7,14 @@ import fcntl
 import termios
 import asyncio
 import uuid
-import sqlite3
 import time
 import subprocess
 from typing import Dict, Any
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request
 from starlette.websockets import WebSocketState
 from app import USER_DB_FILE, logger
+from app.utils.activity import activity_tracker
+from app.utils.db import fetch_one, run_in_db
 from app.auth.dependencies import admin_required
 from fastapi.templating import Jinja2Templates
 
@@ -41,11 +42,7 @@ async def get_terminal_page(request: Request):
     user_info = {"username": "管理员"}
     if open_id:
         try:
-            conn = sqlite3.connect(USER_DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute("SELECT username FROM users WHERE open_id = ?", (open_id,))
-            result = cursor.fetchone()
-            conn.close()
+            result = await fetch_one(USER_DB_FILE, "SELECT username FROM users WHERE open_id = ?", (open_id,))
             if result:
                 user_info["username"] = result[0]
         except Exception as e:
@@ -80,33 +77,19 @@ async def terminal_websocket(websocket: WebSocket):
         return
         
     try:
-        # 连接数据库验证管理员身份
-        conn = sqlite3.connect(USER_DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT last_activity FROM users WHERE open_id = ? AND user_id = 'admin'", 
-            (open_id,)
-        )
-        admin = cursor.fetchone()
+        # 验证管理员身份并刷新活跃时间（内存中完成，首次出现的open_id才查库）
+        is_admin = activity_tracker.check_admin(open_id)
+        if is_admin is None:
+            is_admin = await run_in_db(activity_tracker.load_admin, open_id)
         
         # 检查是否管理员
-        if not admin:
+        if not is_admin:
             await websocket.send_json({
                 "type": "error",
                 "message": "非管理员用户无法访问终端"
             })
             await websocket.close(code=1008)
-            conn.close()
             return
-            
-        # 更新管理员最后活跃时间
-        current_time = int(time.time())
-        cursor.execute(
-            "UPDATE users SET last_activity = ? WHERE open_id = ?",
-            (current_time, open_id)
-        )
-        conn.commit()
-        conn.close()
     except Exception as e:
         logger.error(f"终端WebSocket认证失败: {str(e)}")
         await websocket.send_json({
@@ -2,23 +2,26 @@ import ast
 import asyncio
 import datetime
 import random
-import httpx
 import sqlite3
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import APIRouter, Request, Cookie
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 from typing import Optional, List
 
 from app import logger, CRON_DB_FILE, USER_DB_FILE
-from app.auth.dependencies import is_valid_open_id
+from app.utils.db import connect, execute, fetch_one, run_in_db
+from app.auth.dependencies import CurrentUser, get_optional_user
+from app.auth.sessions import sweep_expired_sessions
 from app.auth.utils import get_mobile_user_agent
 from app.routes.index import get_attendance_info, show_sign_button
-from app.routes.statistics import GetYueTjList
-from app.utils.host import build_api_url
+from app.routes.statistics import invalidate_yue_tj_cache
+from app.utils.upstream import upstream_request, close_upstream_client
+from app.utils.workday import is_workday
 from app.utils.log import log_sign_activity, log_operation, LogType
+from app.utils.retention import run_log_retention
 from config import settings
 
 # 创建路由器
@@ -53,16 +56,19 @@ scheduler = BackgroundScheduler(jobstores=jobstores)
 MORNING_TIMES = settings.MORNING_TIMES
 AFTERNOON_TIMES = settings.AFTERNOON_TIMES
 
+# 自动打卡前的随机等待时间范围（秒），压测时设为 (0, 0)
+SIGN_DELAY_RANGE = (10, 40)
+
 # 连接数据库
 def get_db_connection():
-    conn = sqlite3.connect(CRON_DB_FILE)
+    conn = connect(CRON_DB_FILE)
     conn.row_factory = sqlite3.Row
     return conn
 
 
 def get_user_info(user_id: str):
     try:
-        conn = sqlite3.connect(USER_DB_FILE)
+        conn = connect(USER_DB_FILE)
         conn.row_factory = sqlite3.Row  # 这样可以通过列名访问结果
         cursor = conn.cursor()
         
@@ -119,9 +125,7 @@ async def auto_sign(user_id: str):
         
         now = datetime.datetime.now()
         headers = {"User-Agent": get_mobile_user_agent()}
-        yue_tj_list = await GetYueTjList(headers, user_id, str(now.year), str(now.month).zfill(2))
-        is_workday = yue_tj_list[now.day - 1].get("isholiday") == 0
-        if not is_workday:
+        if not await is_workday(now.date(), headers, user_id):
             return logger.info("今天是休息日，无需打卡")
         
         attendance_data = await get_attendance_info(headers.get("User-Agent"), user_id)
@@ -129,7 +133,6 @@ async def auto_sign(user_id: str):
         if not show_sign_btn["show"]:
             return logger.warning(show_sign_btn["message"])
         
-        url = build_api_url("/AttendanceCard/SaveAttCheckinout")
         data = {
             "model": {
                 "Aid": 0,
@@ -147,13 +150,18 @@ async def auto_sign(user_id: str):
             "AttType": 1
         }
 
-        # 异步随机等待10到40秒
-        await asyncio.sleep(random.randint(10, 40))
+        # 异步随机等待，默认10到40秒
+        delay = random.randint(*SIGN_DELAY_RANGE)
+        if delay:
+            await asyncio.sleep(delay)
 
         # 实际环境中解除注释，返回真实API响应
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
-            result = response.json()
+        response = await upstream_request("POST", "/AttendanceCard/SaveAttCheckinout", json=data, headers=headers)
+        result = response.json()
+        
+        # 打卡成功后当月考勤明细已变化，清除缓存
+        if result.get('success', False):
+            invalidate_yue_tj_cache(user_id)
             
         # 记录打卡日志
         await log_sign_activity(
@@ -222,6 +230,8 @@ def sync_auto_sign(user_id: str):
     except Exception as e:
         logger.error(f"运行自动打卡函数失败: {str(e)}")
     finally:
+        # 释放该事件循环持有的上游连接池
+        loop.run_until_complete(close_upstream_client())
         loop.close()
 
 # 检查用户是否已有定时任务
@@ -321,6 +331,26 @@ def start_scheduler():
                 schedule['afternoon'] == 1
             )
         
+        # 每天归档过期日志
+        hour, minute = map(int, settings.LOG_RETENTION_TIME.split(':'))
+        scheduler.add_job(
+            run_log_retention,
+            'cron',
+            hour=hour,
+            minute=minute,
+            id="maintenance_log_retention",
+            replace_existing=True
+        )
+        
+        # 定期清除过期的登录会话
+        scheduler.add_job(
+            sweep_expired_sessions,
+            'interval',
+            minutes=settings.SESSION_SWEEP_MINUTES,
+            id="maintenance_session_sweep",
+            replace_existing=True
+        )
+        
         # 启动调度器
         if not scheduler.running:
             scheduler.start()
@@ -332,26 +362,20 @@ def start_scheduler():
 
 # 获取用户的定时设置
 @router.get("/tasks")
-async def get_schedule(request: Request, open_id: Optional[str] = Cookie(None)):
+async def get_schedule(request: Request, user: Optional[CurrentUser] = Depends(get_optional_user)):
     
     # 检查系统是否已完成设置配置
     if not settings.IS_INITIALIZED:
         return RedirectResponse(url="/setup")
     
-    # 如果没有cookie，直接返回登录页面
-    if not open_id:
-        return templates.TemplateResponse("login.html", {"request": request})
-    
-    # 验证用户身份
-    is_valid, user_info = is_valid_open_id(open_id)
-    
-    if not is_valid:
+    # 未登录或会话无效，返回登录页面
+    if user is None:
         return templates.TemplateResponse("login.html", {"request": request})
 
-    schedule = get_user_schedule(user_info.get("user_id"))
+    schedule = await run_in_db(get_user_schedule, user.user_id)
     
     # 分配可用的索引（现有的或新的）
-    index = schedule['schedule_index'] if schedule else get_available_index() or 0
+    index = schedule['schedule_index'] if schedule else await run_in_db(get_available_index) or 0
     
     # 获取该索引对应的默认时间选项（这只是用于前端显示可选项）
     morning_times = MORNING_TIMES[index]
@@ -381,30 +405,21 @@ async def get_schedule(request: Request, open_id: Optional[str] = Cookie(None)):
 
 # 保存用户的定时设置
 @router.post("/tasks")
-async def save_schedule(request: Request, schedule_req: ScheduleRequest, open_id: Optional[str] = Cookie(None)):
+async def save_schedule(request: Request, schedule_req: ScheduleRequest, user: Optional[CurrentUser] = Depends(get_optional_user)):
     
     # 检查系统是否已完成设置配置
     if not settings.IS_INITIALIZED:
         return RedirectResponse(url="/setup")
     
-    # 如果没有cookie，直接返回登录页面
-    if not open_id:
-        return templates.TemplateResponse("login.html", {"request": request})
-    
-    # 验证用户身份
-    is_valid, user_info = is_valid_open_id(open_id)
-    
-    if not is_valid:
+    # 未登录或会话无效，返回登录页面
+    if user is None:
         return templates.TemplateResponse("login.html", {"request": request})
     
     # 获取用户参数
-    user_id = user_info.get("user_id")
-    username = user_info.get("username")
+    user_id = user.user_id
+    username = user.username
 
-    conn = sqlite3.connect(CRON_DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM schedules WHERE user_id = ?", (user_id,))
-    schedule = cursor.fetchone()
+    schedule = await fetch_one(CRON_DB_FILE, "SELECT schedule_index FROM schedules WHERE user_id = ?", (user_id,))
     
     # 获取用户选择状态和开启状态
     morning_selections = schedule_req.morning_times or [0, 0, 0]  # 默认全部不选
@@ -415,11 +430,10 @@ async def save_schedule(request: Request, schedule_req: ScheduleRequest, open_id
     # 确定索引（现有用户保持原索引，新用户分配新索引）
     if schedule:
         # 获取现有索引
-        cursor.execute("SELECT schedule_index FROM schedules WHERE user_id = ?", (user_id,))
-        index = cursor.fetchone()[0]
+        index = schedule[0]
     else:
         # 新用户，分配可用索引
-        index = get_available_index()
+        index = await run_in_db(get_available_index)
         if index == None:
             # 记录失败日志
             await log_operation(
@@ -463,25 +477,24 @@ async def save_schedule(request: Request, schedule_req: ScheduleRequest, open_id
     
     try:
         if schedule:
-            cursor.execute(
+            await execute(
+                CRON_DB_FILE,
                 "UPDATE schedules SET morning = ?, afternoon = ?, morning_time = ?, afternoon_time = ?, morning_selecte = ?, afternoon_selecte = ? WHERE user_id = ?",
                 (morning_status, afternoon_status, str(morning_time), str(afternoon_time), str(morning_selections), str(afternoon_selections), user_id)
             )
         else:
-            cursor.execute(
+            await execute(
+                CRON_DB_FILE,
                 "INSERT INTO schedules (user_id, username, morning, afternoon, schedule_index, morning_time, afternoon_time, morning_selecte, afternoon_selecte) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
                 (user_id, username, morning_status, afternoon_status, index, str(morning_time), str(afternoon_time), str(morning_selections), str(afternoon_selections))
             )
         
-        conn.commit()
-        conn.close()
-        
         try:
-            # 先移除现有的定时任务
-            remove_schedule_jobs(user_id)
+            # 先移除现有的定时任务（任务存储同样是SQLite，放到数据库线程池中执行）
+            await run_in_db(remove_schedule_jobs, user_id)
 
             # 如果有开启的定时，添加新的定时任务
-            add_schedule_jobs(user_id, index, morning_status == 1, afternoon_status == 1)
+            await run_in_db(add_schedule_jobs, user_id, index, morning_status == 1, afternoon_status == 1)
             
             # 记录成功日志
             await log_operation(
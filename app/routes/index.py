@@ -1,15 +1,18 @@
 import datetime
+import re
 from typing import Optional
 
-import httpx
-from fastapi import APIRouter, Request, Cookie
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 
 from app import logger
-from app.auth.dependencies import is_valid_open_id
-from app.routes.statistics import GetYueTjList
-from app.utils.host import build_api_url
+from app.auth.dependencies import CurrentUser, get_optional_user
+from app.utils.concurrency import SingleFlight
+from app.utils.jsonstream import iter_json_array
+from app.utils.resilience import READ_RETRY
+from app.utils.upstream import upstream_request, upstream_stream
+from app.utils.workday import is_workday
 from config import settings
 
 # 创建路由器
@@ -18,8 +21,14 @@ router = APIRouter()
 # 设置模板
 templates = Jinja2Templates(directory="app/static/templates")
 
+# 合并同一用户同时发起的打卡记录请求
+_single_flight = SingleFlight()
+
+# 打卡时间格式: /Date(1700000000000)/
+_CLOCK_TIME_PATTERN = re.compile(r"/Date\((-?\d+)")
+
 @router.get("/")
-async def root(request: Request, open_id: Optional[str] = Cookie(None)):
+async def root(request: Request, user: Optional[CurrentUser] = Depends(get_optional_user)):
     """
     首页路由 - 检查系统是否需要初始化，并根据用户状态显示适当内容
     """
@@ -28,18 +37,12 @@ async def root(request: Request, open_id: Optional[str] = Cookie(None)):
     if not settings.IS_INITIALIZED:
         return RedirectResponse(url="/setup")
     
-    # 如果没有cookie，直接返回登录页面
-    if not open_id:
-        return templates.TemplateResponse("login.html", {"request": request})
-    
-    # 验证用户身份
-    is_valid, user_info = is_valid_open_id(open_id)
-    
-    if not is_valid:
+    # 未登录或会话无效，返回登录页面
+    if user is None:
         return templates.TemplateResponse("login.html", {"request": request})
     
     # 检查是否是管理员用户
-    if user_info.get("user_id") == "admin":
+    if user.is_admin:
         # 管理员特殊处理
         return RedirectResponse(url="/admin/dashboard")
     
@@ -47,15 +50,14 @@ async def root(request: Request, open_id: Optional[str] = Cookie(None)):
     try:
         now = datetime.datetime.now()
         headers = {'User-Agent': request.headers.get('User-Agent')}    
-        yue_tj_list = await GetYueTjList(headers, user_info.get("user_id"), str(now.year), str(now.month).zfill(2))
-        is_workday = yue_tj_list[now.day - 1].get("isholiday") == 0
-        if not is_workday:
+        today_is_workday = await is_workday(now.date(), headers, user.user_id)
+        if not today_is_workday:
             # 非工作日，不需要打卡，就不需要进行请求打卡数据了
             attendance_data = []
             show_sign_btn = {"show": False, "message": "今天是休息日，无需打卡"}
         else:
             # 工作日，需要打卡，需要进行请求打卡数据，显示签到按钮
-            attendance_data = await get_attendance_info(request.headers.get('User-Agent'), user_info.get("user_id"))
+            attendance_data = await get_attendance_info(request.headers.get('User-Agent'), user.user_id)
             show_sign_btn = show_sign_button(attendance_data)
 
         # 登录成功，返回index.html
@@ -63,9 +65,9 @@ async def root(request: Request, open_id: Optional[str] = Cookie(None)):
             "index.html", 
             {
                 "request": request, 
-                "user_info": user_info,
+                "user_info": user,
                 "attendance_data": attendance_data,
-                "is_workday": is_workday,
+                "is_workday": today_is_workday,
                 "show_sign_button": show_sign_btn,
                 "current_month": datetime.datetime.now().month,
                 "current_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -77,7 +79,7 @@ async def root(request: Request, open_id: Optional[str] = Cookie(None)):
             "index.html", 
             {
                 "request": request,
-                "user_info": user_info,
+                "user_info": user,
                 "error_message": f"获取考勤数据失败: {str(e)}",
                 "current_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "show_sign_button": {"show": False, "message": "获取数据失败"}
@@ -86,14 +88,18 @@ async def root(request: Request, open_id: Optional[str] = Cookie(None)):
     
 
 async def get_attendance_info(ua: str, user_id: int):
-    """获取考勤信息"""
+    """获取考勤信息，同一用户的并发请求共享一次上游调用"""
+    return await _single_flight.do(("GetAttCheckinoutList", str(user_id)), _fetch_attendance_info, ua, user_id)
+
+
+async def _fetch_attendance_info(ua: str, user_id: int):
+    """请求并整理今天的打卡记录"""
 
     def _format_record(_record):
         if not _record:
             return None
 
-        _timestamp = int(_record['clockTime'].replace('/Date(', '').replace(')/', ''))
-        clock_time = datetime.datetime.fromtimestamp(_timestamp / 1000)
+        clock_time = datetime.datetime.fromtimestamp(_clock_timestamp(_record) / 1000)
 
         return {
             "type": "上班" if _record['clockType'] == 1 else "下班",
@@ -103,47 +109,74 @@ async def get_attendance_info(ua: str, user_id: int):
         }
     
     try:
-        # 构建API URL
-        api_url = build_api_url('/AttendanceCard/GetAttCheckinoutList')
         headers = {'User-Agent': ua}
         params = {"AttType": "1", "UnitCode": settings.UNIT_CODE, "userid": user_id, "Mid": "134"}
 
-        # 使用httpx发送GET请求
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(api_url, headers=headers, json=params)
-            
-        # 检查响应状态
-        if response.status_code == 200:
+        # 流式读取打卡记录，拿到今天的数据后即停止，不解析全部历史记录
+        async with upstream_stream(
+            "POST", '/AttendanceCard/GetAttCheckinoutList', retry=READ_RETRY, headers=headers, json=params, timeout=10.0
+        ) as response:
+            # 检查响应状态
+            if response.status_code != 200:
+                return None
+
             now = datetime.datetime.now()
             today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            today_records = await _collect_today_records(response.aiter_text(), today)
 
-            # 过滤出天的记录
-            today_records = []
-            for record in response.json():
-                timestamp = int(record['clockTime'].replace('/Date(', '').replace(')/', ''))
-                record_date = datetime.datetime.fromtimestamp(timestamp / 1000)  # 转换
-                if record_date.date() == today.date():
-                    today_records.append(record)
-            # 分离上班下班记录
-            clock_in = next((record for record in today_records if record['clockType'] == 1), None)
-            clock_out = next((record for record in today_records if record['clockType'] == 2), None)
-
-            # 检查是否要显示补卡提醒
-            current_time = now.hour * 60 + now.minute
-            work_end_time = 17 * 60  # 17:00
-            need_reminder = current_time >= work_end_time and not clock_in
-
-            return {
-                "needReminder": need_reminder,
-                "clockInRecord": _format_record(clock_in),
-                "clockOutRecord": _format_record(clock_out)
-            }
+        # 分离上班下班记录
+        clock_in = next((record for record in today_records if record['clockType'] == 1), None)
+        clock_out = next((record for record in today_records if record['clockType'] == 2), None)
+
+        # 检查是否要显示补卡提醒
+        current_time = now.hour * 60 + now.minute
+        work_end_time = 17 * 60  # 17:00
+        need_reminder = current_time >= work_end_time and not clock_in
+
+        return {
+            "needReminder": need_reminder,
+            "clockInRecord": _format_record(clock_in),
+            "clockOutRecord": _format_record(clock_out)
+        }
             
     except Exception as e:
         # 处理异常，返回空字典
         logger.error(f"获取考勤信息异常: {str(e)}")
         return {}
-    
+
+
+def _clock_timestamp(record: dict) -> int:
+    """提取打卡时间 /Date(1700000000000)/ 中的毫秒时间戳"""
+    return int(_CLOCK_TIME_PATTERN.match(record['clockTime']).group(1))
+
+
+async def _collect_today_records(chunks, today: datetime.datetime) -> list:
+    """
+    从打卡记录流中筛选今天的记录
+
+    接口按打卡时间倒序返回，遇到早于今天的记录即可停止读取；
+    若前两条记录呈正序，则说明顺序不可依赖，退化为读取全部记录。
+    """
+    day_start = int(today.timestamp() * 1000)
+    day_end = int((today + datetime.timedelta(days=1)).timestamp() * 1000)
+
+    today_records = []
+    previous = None
+    descending = None
+    async for record in iter_json_array(chunks):
+        timestamp = _clock_timestamp(record)
+
+        if descending is None and previous is not None:
+            descending = timestamp <= previous
+        previous = timestamp
+
+        if day_start <= timestamp < day_end:
+            today_records.append(record)
+        elif timestamp < day_start and descending:
+            # 倒序时后面都是更早的记录
+            break
+
+    return today_records
 
 
 async def check_is_workday(ua: str, user_id: int):
@@ -152,27 +185,27 @@ async def check_is_workday(ua: str, user_id: int):
         # 构建API URL
         now = datetime.datetime.now()
 
-        api_url = build_api_url('/AttendanceCard/GetYueTjList')
         params = {"AttType": "1", "UnitCode": settings.UNIT_CODE, "userid": user_id, "Mid": "134"}
         params = {**params, "year": f"{now.year}年", "month": f"{str(now.month).zfill(2)}月"}
 
-        # 使用httpx发送GET请求
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(api_url, headers={"User-Agent": ua})
+        # 通过共享连接池发送请求
+        response = await upstream_request(
+            "GET", '/AttendanceCard/GetYueTjList', retry=READ_RETRY, headers={"User-Agent": ua}, timeout=10.0
+        )
+        
+        # 检查响应状态
+        if response.status_code == 200:
+            data = response.json()
             
-            # 检查响应状态
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data.get("code") == 200:
-                    work_day = data["data"]["workday"]
-                    return work_day == 1
-                else:
-                    # 如果接口返回非200，默认为工作日
-                    return True
+            if data.get("code") == 200:
+                work_day = data["data"]["workday"]
+                return work_day == 1
             else:
-                # 如果请求失败，默认为工作日
+                # 如果接口返回非200，默认为工作日
                 return True
+        else:
+            # 如果请求失败，默认为工作日
+            return True
     except Exception as e:
         # 处理异常，默认为工作日
         logger.error(f"检查工作日异常: {str(e)}")
@@ -1,12 +1,12 @@
 import datetime
 import os
-import sqlite3
 
 from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from app import SET_DB_FILE
+from app.utils.db import connect
 from app.routes.admin.system import trigger_restart_after_setup
 from config import settings
 
@@ -62,7 +62,7 @@ async def process_setup(request: Request):
         os.makedirs("data", exist_ok=True)
         
         # 连接数据库
-        conn = sqlite3.connect(SET_DB_FILE)
+        conn = connect(SET_DB_FILE)
         cursor = conn.cursor()
         
         # 更新设置
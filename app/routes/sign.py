@@ -1,15 +1,14 @@
 import datetime
-import httpx
-from typing import Optional
 
-from fastapi import APIRouter, Request, Cookie, HTTPException
+from fastapi import APIRouter, Depends, Request, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-from app.auth.dependencies import is_valid_open_id
+from app.auth.dependencies import CurrentUser, get_current_user
 from app.auth.utils import get_mobile_user_agent
 from config import settings
-from app.utils.host import build_api_url
+from app.routes.statistics import invalidate_yue_tj_cache
+from app.utils.upstream import upstream_request
 from app.utils.log import log_sign_activity, log_operation, LogType
 
 router = APIRouter(tags=["打卡"])
@@ -18,26 +17,16 @@ class SignData(BaseModel):
     attendance: int = 0
 
 @router.post("/sign")
-async def sign_in(request: Request, data: SignData, open_id: Optional[str] = Cookie(None)):
+async def sign_in(request: Request, data: SignData, user: CurrentUser = Depends(get_current_user)):
     """
     用户打卡接口
     
     处理用户的打卡请求，根据当前时间确定是上班打卡还是下班打卡
     """
 
-    # 验证用户身份
-    if not open_id:
-        raise HTTPException(status_code=401, detail="未登录，请先登录")
-    
-    is_valid, user_info = is_valid_open_id(open_id)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="登录已过期，请重新登录")
-    
     # 获取用户ID
-    user_id = user_info.get("user_id", None)
-    username = user_info.get("username", "未知用户")
-    if not user_id:
-        raise HTTPException(status_code=400, detail="无法获取用户ID")
+    user_id = user.user_id
+    username = user.username or "未知用户"
     
     # 根据attendance状态决定打卡类型
     attendance = data.attendance
@@ -72,12 +61,16 @@ async def sign_in(request: Request, data: SignData, open_id: Optional[str] = Coo
             }
         )
 
-    result = await SaveAttCheckinout(request, open_id)
+    result = await SaveAttCheckinout(request, user)
     
     # 记录打卡结果到日志数据库
     success = result.get("success", False)
     result_message = result.get("message", "未知结果")
     
+    # 打卡成功后当月考勤明细已变化，清除缓存
+    if success:
+        invalidate_yue_tj_cache(user_id)
+    
     await log_sign_activity(
         username, 
         sign_type,
@@ -132,24 +125,20 @@ def check_sign_time(attendance: int):
         return False, 0, "不在打卡时间段"
     
 
-async def SaveAttCheckinout(request: Request, open_id: str):
+async def SaveAttCheckinout(request: Request, user: CurrentUser):
     """
     保存打卡记录
     """
 
-    _, user_info = is_valid_open_id(open_id)
-
-    user_id = user_info.get("user_id", None)
-    dep_id = user_info.get("department_id", None)
+    user_id = user.user_id
+    dep_id = user.department_id
 
     if not user_id or not dep_id:
         raise HTTPException(status_code=400, detail="无法获取用户ID")
 
-    api_url = build_api_url("/AttendanceCard/SaveAttCheckinout")
     headers = {"User-Agent": get_mobile_user_agent(request.headers.get("User-Agent", ""))}
     data = {"model": {"Aid": 0, "UnitCode": settings.UNIT_CODE, "userID": user_id, "userDepID": dep_id, "Mid": 134, "Num_RunID": 14, "lng": "", "lat": "", "realaddress": settings.REAL_ADDRESS, "iSDelete": 0, "administratorChangesRemark": settings.REAL_ADDRESS}, "AttType": 1}
     
     # 实际环境中解除注释，返回真实API响应
-    async with httpx.AsyncClient() as client:
-        response = await client.post(api_url, json=data, headers=headers)
-        return response.json()
+    response = await upstream_request("POST", "/AttendanceCard/SaveAttCheckinout", json=data, headers=headers)
+    return response.json()
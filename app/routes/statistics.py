@@ -1,20 +1,35 @@
-import asyncio
 import calendar
 import datetime
+import threading
 from typing import Optional, List, Dict, Any
 
-import httpx
-from fastapi import APIRouter, Request, Cookie, HTTPException
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-from app.auth.dependencies import is_valid_open_id
+from app import logger
+from app.auth.dependencies import CurrentUser, get_current_user
 from app.auth.utils import get_mobile_user_agent
 from config import settings
-from app.utils.host import build_api_url
+from app.utils.cache import TTLCache
+from app.utils.concurrency import SingleFlight, fan_out
+from app.utils.resilience import READ_RETRY, RetryPolicy
+from app.utils.upstream import upstream_request
 
 router = APIRouter(tags=["考勤统计"])
 
+# 月度考勤明细缓存，键为 (user_id, year, month)
+_yue_tj_cache = TTLCache(maxsize=settings.YUE_TJ_CACHE_SIZE)
+# 每个键的失效次数：请求开始时记下，写缓存前比对，失效后才返回的旧请求不会覆盖缓存
+_yue_tj_generations: Dict[tuple, int] = {}
+_yue_tj_lock = threading.Lock()
+
+# 合并同一时刻相同参数的上游请求
+_single_flight = SingleFlight()
+
+# 出勤统计获取失败时的默认值
+DEFAULT_STATISTICS = {"LeaveDays": 0, "LateNumber": 0, "ZtNumber": 0, "LackCarNumber": 0}
+
 class StatisticData(BaseModel):
     month: int
     year: Optional[int] = None
@@ -23,25 +38,15 @@ class StatisticData(BaseModel):
 async def get_monthly_statistics(
     request: Request,
     data: StatisticData, 
-    open_id: Optional[str] = Cookie(None)
+    user: CurrentUser = Depends(get_current_user)
 ):
     """
     获取用户月度考勤统计数据
     
     返回用户指定月份的考勤统计数据，包括请假、迟到、早退、缺卡次数和日历数据
     """
-    # 验证用户身份
-    if not open_id:
-        raise HTTPException(status_code=401, detail="未登录，请先登录")
-    
-    is_valid, user_info = is_valid_open_id(open_id)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="登录已过期，请重新登录")
-    
     # 获取用户ID
-    user_id = user_info.get("user_id", None)
-    if not user_id:
-        raise HTTPException(status_code=400, detail="无法获取用户ID")
+    user_id = user.user_id
     
     # 固定请求头
     headers = {"User-Agent": get_mobile_user_agent(request.headers.get("User-Agent", ""))}
@@ -57,15 +62,17 @@ async def get_monthly_statistics(
     month_str = str(month_int).zfill(2)
     year_str = str(year_int)
     
-    # 获取统计数据
-    stats = await get_Attendance_Statistics(headers, user_id, year_str, month_str)
-    daily_records = await GetYueTjList(headers, user_id, year_str, month_str)
+    # 并发获取统计数据和每日明细
+    results = await fan_out(
+        statistics=(get_Attendance_Statistics(headers, user_id, year_str, month_str), DEFAULT_STATISTICS),
+        details=(GetYueTjList(headers, user_id, year_str, month_str), [])
+    )
     
     # 构建返回的数据结构 - 返回原始数据，让前端处理
     result = {
         "success": True,
-        "statistics": stats,
-        "details": daily_records,
+        "statistics": results["statistics"],
+        "details": results["details"],
         "year": year_int,
         "month": month_int,
         "days": days_in_month
@@ -195,44 +202,74 @@ async def get_Attendance_Statistics(headers: dict, user_id: int, year: str, mont
             }
     """
     
-    api_url = build_api_url("/AttendanceCard/get_Attendance_Statistics")
+    return await _single_flight.do(
+        ("get_Attendance_Statistics", str(user_id), int(year), int(month)),
+        _fetch_attendance_statistics, headers, user_id, year, month
+    )
+
+
+async def _fetch_attendance_statistics(headers: dict, user_id: int, year: str, month: str) -> Dict[str, Any]:
+    """实际请求出勤统计接口，由get_Attendance_Statistics合并并发调用"""
+    
     data = {"UnitCode": settings.UNIT_CODE, "UserID": user_id, "SetClass": "1", "Mid": "134", "QueryType": "2"}
     data = {**data, "Syear": f"{year}年", "Smonth": f"{month}月"}
 
-    # 重试次数
-    max_retries = 5
-    retry_count = 0
-
-    while retry_count < max_retries:
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:  # 设置30秒超时
-                response = await client.post(api_url, headers=headers, json=data)
-                stat_dict = response.json()[0]["Attend_Stat_List"][0]
-                # 请假、迟到、早退、缺卡
-                stat_list = ["LeaveDays", "LateNumber", "ZtNumber", "LackCarNumber"]  
-                stat_data = {key: stat_dict[key] for key in stat_list}
-                return stat_data
-        except (httpx.TimeoutException, httpx.ConnectError, httpx.ReadTimeout) as e:
-            # 连接错误
-            retry_count += 1
-            if retry_count < max_retries:
-                # 等待一段时间再重试，每次重试增加等待时间
-                await asyncio.sleep(1 * retry_count)  # 第一次等待1秒，第二次2秒，依此类推
-                continue
-            break
-        except Exception as e:
-            # 其他错误
-            retry_count += 1
-            if retry_count < max_retries:
-                await asyncio.sleep(1 * retry_count)
-                continue
-            break
+    try:
+        # 网络错误和5xx由upstream_request按重试策略处理（指数退避 + 总耗时预算）
+        response = await upstream_request(
+            "POST", "/AttendanceCard/get_Attendance_Statistics", retry=READ_RETRY, headers=headers, json=data
+        )
+        stat_dict = response.json()[0]["Attend_Stat_List"][0]
+        # 请假、迟到、早退、缺卡
+        stat_list = ["LeaveDays", "LateNumber", "ZtNumber", "LackCarNumber"]  
+        stat_data = {key: stat_dict[key] for key in stat_list}
+        return stat_data
+    except Exception as e:
+        logger.error(f"获取出勤统计失败: {str(e)}")
 
     # 返回默认数据
-    return {"LeaveDays": 0, "LateNumber": 0, "ZtNumber": 0, "LackCarNumber": 0}
+    return dict(DEFAULT_STATISTICS)
     
 
-async def GetYueTjList(headers: dict, user_id: int, year: str, month: str) -> List[Dict[str, Any]]:
+def _yue_tj_cache_key(user_id, year, month) -> tuple:
+    """统一缓存键格式，兼容整数和字符串形式的参数"""
+    return str(user_id), int(year), int(month)
+
+
+def _yue_tj_cache_ttl(year, month) -> Optional[float]:
+    """
+    历史月份的考勤明细不会再变化，永久缓存；当月（及未来月份）只短期缓存
+    """
+    now = datetime.datetime.now()
+    if (int(year), int(month)) < (now.year, now.month):
+        return None
+    return settings.YUE_TJ_CURRENT_MONTH_TTL
+
+
+def invalidate_yue_tj_cache(user_id, year=None, month=None):
+    """
+    使用户的月度考勤明细缓存失效，打卡成功后调用
+
+    :param user_id: 用户ID
+    :param year: 年份，默认当前年份
+    :param month: 月份，默认当前月份
+    """
+    now = datetime.datetime.now()
+    cache_key = _yue_tj_cache_key(user_id, year or now.year, month or now.month)
+    with _yue_tj_lock:
+        _yue_tj_generations[cache_key] = _yue_tj_generations.get(cache_key, 0) + 1
+        _yue_tj_cache.delete(cache_key)
+
+
+def _copy_yue_tj_list(stat_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """缓存和合并请求的结果由多个调用方共享，返回副本避免调用方修改影响缓存"""
+    return [dict(item) for item in stat_list]
+
+
+async def GetYueTjList(
+    headers: dict, user_id: int, year: str, month: str,
+    retry: RetryPolicy = READ_RETRY, timeout: Optional[float] = None
+) -> List[Dict[str, Any]]:
     """
     获取指定用户某月的日常考勤明细列表。
 
@@ -244,6 +281,8 @@ async def GetYueTjList(headers: dict, user_id: int, year: str, month: str) -> Li
         user_id (int): 用户 ID。
         year (str): 年份（如 "2024"）。
         month (str): 月份（如 "04"）。
+        retry (RetryPolicy): 重试策略，后台查询（如工作日日历）可传入 NO_RETRY 快速失败。
+        timeout (float): 请求超时（秒），默认 UPSTREAM_TIMEOUT。
 
     返回:
         List[Dict[str, Any]]: 每日考勤明细的列表，每项包含：
@@ -257,38 +296,49 @@ async def GetYueTjList(headers: dict, user_id: int, year: str, month: str) -> Li
             - IsXwXbbuka: 下午补卡标记
     """
 
-    api_url = build_api_url("/AttendanceCard/GetYueTjList")
+    # 优先读取缓存
+    cache_key = _yue_tj_cache_key(user_id, year, month)
+    cached = _yue_tj_cache.get(cache_key)
+    if cached is not None:
+        return _copy_yue_tj_list(cached)
+
+    # 失效后的调用不再合并到失效前发起的请求上
+    generation = _yue_tj_generations.get(cache_key, 0)
+    stat_list = await _single_flight.do(
+        ("GetYueTjList",) + cache_key + (generation,),
+        _fetch_yue_tj_list, headers, user_id, year, month, retry, timeout, generation
+    )
+    return _copy_yue_tj_list(stat_list)
+
+
+async def _fetch_yue_tj_list(
+    headers: dict, user_id: int, year: str, month: str,
+    retry: RetryPolicy = READ_RETRY, timeout: Optional[float] = None, generation: int = 0
+) -> List[Dict[str, Any]]:
+    """实际请求月度考勤明细接口并写入缓存，由GetYueTjList合并并发调用"""
+
+    cache_key = _yue_tj_cache_key(user_id, year, month)
     params = {"AttType": "1", "UnitCode": settings.UNIT_CODE, "userid": user_id, "Mid": "134"}
     params = {**params, "year": f"{year}年", "month": f"{month}月"}
 
-    # 重试次数
-    max_retries = 5
-    retry_count = 0
-
-    while retry_count < max_retries:
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:  # 设置30秒超时
-                response = await client.post(api_url, headers=headers, params=params)
-                data = response.json()
-                # 日期、是否节假日、节假日、请假、上班打卡、下班打卡、上班补卡、下班补卡
-                stat_fields = {'rq', 'isholiday', 'jjr', 'IsQj', 'SWSBDKCS', 'XWXBDKCS', 'IsSwSbbuka', 'IsXwXbbuka'}
-                stat_list = [{key: item[key] for key in stat_fields if key in item} for item in data]
-                return stat_list
-        except (httpx.TimeoutException, httpx.ConnectError, httpx.ReadTimeout) as e:
-            # 连接错误
-            retry_count += 1
-            if retry_count < max_retries:
-                # 等待一段时间再重试，每次重试增加等待时间
-                await asyncio.sleep(1 * retry_count)  # 第一次等待1秒，第二次2秒，依此类推
-                continue
-            break
-        except Exception as e:
-            # 其他错误
-            retry_count += 1
-            if retry_count < max_retries:
-                await asyncio.sleep(1 * retry_count)
-                continue
-            break
+    try:
+        # 网络错误和5xx由upstream_request按重试策略处理（指数退避 + 总耗时预算）
+        response = await upstream_request(
+            "POST", "/AttendanceCard/GetYueTjList", retry=retry, headers=headers, params=params,
+            timeout=timeout or settings.UPSTREAM_TIMEOUT
+        )
+        data = response.json()
+        # 日期、是否节假日、节假日、请假、上班打卡、下班打卡、上班补卡、下班补卡
+        stat_fields = {'rq', 'isholiday', 'jjr', 'IsQj', 'SWSBDKCS', 'XWXBDKCS', 'IsSwSbbuka', 'IsXwXbbuka'}
+        stat_list = [{key: item[key] for key in stat_fields if key in item} for item in data]
+        # 空结果不缓存，避免把上游异常当作有效数据；请求期间缓存被失效（如刚打卡）也不写入
+        if stat_list:
+            with _yue_tj_lock:
+                if _yue_tj_generations.get(cache_key, 0) == generation:
+                    _yue_tj_cache.set(cache_key, stat_list, ttl=_yue_tj_cache_ttl(year, month))
+        return stat_list
+    except Exception as e:
+        logger.error(f"获取月度考勤明细失败: {str(e)}")
 
     # 返回空列表
     return []
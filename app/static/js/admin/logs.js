@@ -7,6 +7,13 @@ document.addEventListener('DOMContentLoaded', function() {
         'login-logs': 1
     };
     
+    // 各页的翻页游标（页码 -> 上一页最后一条记录的位置），没有游标的页退回按偏移量查询
+    const pageCursors = {
+        'sign-logs': {},
+        'operation-logs': {},
+        'login-logs': {}
+    };
+    
     // 初始化页面
     initTabSystem();
     initOperationLogsTab(); // 先初始化操作日志选项卡
@@ -45,6 +52,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // 重置按钮点击事件
         document.getElementById('sign-reset').addEventListener('click', function() {
             document.getElementById('sign-username').value = '';
+            document.getElementById('sign-keyword').value = '';
             document.getElementById('sign-date-from').value = '';
             document.getElementById('sign-date-to').value = '';
             document.getElementById('sign-type').value = 'all';
@@ -61,6 +69,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // 加载签到日志数据
     function loadSignLogs(page) {
         const username = document.getElementById('sign-username').value;
+        const keyword = document.getElementById('sign-keyword').value;
         const dateFrom = document.getElementById('sign-date-from').value;
         const dateTo = document.getElementById('sign-date-to').value;
         const signType = document.getElementById('sign-type').value;
@@ -76,11 +85,16 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         if (username) params.append('username', username);
+        if (keyword) params.append('keyword', keyword);
         if (dateFrom) params.append('date_from', dateFrom);
         if (dateTo) params.append('date_to', dateTo);
         if (signType !== 'all') params.append('sign_type', signType);
         if (status !== 'all') params.append('status', status);
         
+        // 按顺序翻页时使用上一页返回的游标，第1页（含重新筛选）清空游标
+        if (page === 1) pageCursors['sign-logs'] = {};
+        if (pageCursors['sign-logs'][page]) params.append('cursor', pageCursors['sign-logs'][page]);
+        
         // 显示加载状态
         const tableBody = document.querySelector('#sign-logs-table tbody');
         tableBody.innerHTML = '<tr><td colspan="7" class="text-center">加载中...</td></tr>';
@@ -90,6 +104,7 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(function(response) {
                 if (response.data.success) {
                     renderSignLogsTable(response.data);
+                    if (response.data.next_cursor) pageCursors['sign-logs'][page + 1] = response.data.next_cursor;
                     renderPagination('sign-logs', response.data);
                 } else {
                     showError(tableBody, response.data.message || '获取签到日志失败');
@@ -137,6 +152,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // 导出签到日志
     function exportSignLogs() {
         const username = document.getElementById('sign-username').value;
+        const keyword = document.getElementById('sign-keyword').value;
         const dateFrom = document.getElementById('sign-date-from').value;
         const dateTo = document.getElementById('sign-date-to').value;
         const signType = document.getElementById('sign-type').value;
@@ -148,6 +164,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         if (username) params.append('username', username);
+        if (keyword) params.append('keyword', keyword);
         if (dateFrom) params.append('date_from', dateFrom);
         if (dateTo) params.append('date_to', dateTo);
         if (signType !== 'all') params.append('sign_type', signType);
@@ -188,6 +205,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // 重置按钮点击事件
         document.getElementById('operation-reset').addEventListener('click', function() {
             document.getElementById('operation-username').value = '';
+            document.getElementById('operation-keyword').value = '';
             document.getElementById('operation-date-from').value = '';
             document.getElementById('operation-date-to').value = '';
             document.getElementById('operation-type').value = 'all';
@@ -204,6 +222,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // 加载操作日志数据
     function loadOperationLogs(page) {
         const username = document.getElementById('operation-username').value;
+        const keyword = document.getElementById('operation-keyword').value;
         const dateFrom = document.getElementById('operation-date-from').value;
         const dateTo = document.getElementById('operation-date-to').value;
         const operationType = document.getElementById('operation-type').value;
@@ -212,6 +231,16 @@ document.addEventListener('DOMContentLoaded', function() {
         // 保存当前页码
         currentPage['operation-logs'] = page;
         
+        // 筛选条件变化（回到第1页）时刷新统计卡片
+        if (page === 1) {
+            const statsParams = new URLSearchParams();
+            if (dateFrom) statsParams.append('date_from', dateFrom);
+            if (dateTo) statsParams.append('date_to', dateTo);
+            if (operationType !== 'all') statsParams.append('operation_type', operationType);
+            if (status !== 'all') statsParams.append('status', status);
+            loadLogStats('operation', statsParams);
+        }
+        
         // 构建查询参数
         const params = new URLSearchParams({
             page: page,
@@ -219,11 +248,16 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         if (username) params.append('username', username);
+        if (keyword) params.append('keyword', keyword);
         if (dateFrom) params.append('date_from', dateFrom);
         if (dateTo) params.append('date_to', dateTo);
         if (operationType !== 'all') params.append('operation_type', operationType);
         if (status !== 'all') params.append('status', status);
         
+        // 按顺序翻页时使用上一页返回的游标，第1页（含重新筛选）清空游标
+        if (page === 1) pageCursors['operation-logs'] = {};
+        if (pageCursors['operation-logs'][page]) params.append('cursor', pageCursors['operation-logs'][page]);
+        
         // 显示加载状态
         const tableBody = document.querySelector('#operation-logs-table tbody');
         tableBody.innerHTML = '<tr><td colspan="8" class="text-center">加载中...</td></tr>';
@@ -233,6 +267,7 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(function(response) {
                 if (response.data.success) {
                     renderOperationLogsTable(response.data);
+                    if (response.data.next_cursor) pageCursors['operation-logs'][page + 1] = response.data.next_cursor;
                     renderPagination('operation-logs', response.data);
                 } else {
                     showError(tableBody, response.data.message || '获取操作日志失败');
@@ -281,6 +316,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // 导出操作日志
     function exportOperationLogs() {
         const username = document.getElementById('operation-username').value;
+        const keyword = document.getElementById('operation-keyword').value;
         const dateFrom = document.getElementById('operation-date-from').value;
         const dateTo = document.getElementById('operation-date-to').value;
         const operationType = document.getElementById('operation-type').value;
@@ -292,6 +328,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         if (username) params.append('username', username);
+        if (keyword) params.append('keyword', keyword);
         if (dateFrom) params.append('date_from', dateFrom);
         if (dateTo) params.append('date_to', dateTo);
         if (operationType !== 'all') params.append('operation_type', operationType);
@@ -357,6 +394,15 @@ document.addEventListener('DOMContentLoaded', function() {
         // 保存当前页码
         currentPage['login-logs'] = page;
         
+        // 筛选条件变化（回到第1页）时刷新统计卡片
+        if (page === 1) {
+            const statsParams = new URLSearchParams();
+            if (dateFrom) statsParams.append('date_from', dateFrom);
+            if (dateTo) statsParams.append('date_to', dateTo);
+            if (status !== 'all') statsParams.append('status', status);
+            loadLogStats('login', statsParams);
+        }
+        
         // 构建查询参数
         const params = new URLSearchParams({
             page: page,
@@ -369,6 +415,10 @@ document.addEventListener('DOMContentLoaded', function() {
         if (dateTo) params.append('date_to', dateTo);
         if (status !== 'all') params.append('status', status);
         
+        // 按顺序翻页时使用上一页返回的游标，第1页（含重新筛选）清空游标
+        if (page === 1) pageCursors['login-logs'] = {};
+        if (pageCursors['login-logs'][page]) params.append('cursor', pageCursors['login-logs'][page]);
+        
         // 显示加载状态
         const tableBody = document.querySelector('#login-logs-table tbody');
         tableBody.innerHTML = '<tr><td colspan="6" class="text-center">加载中...</td></tr>';
@@ -378,6 +428,7 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(function(response) {
                 if (response.data.success) {
                     renderLoginLogsTable(response.data);
+                    if (response.data.next_cursor) pageCursors['login-logs'][page + 1] = response.data.next_cursor;
                     renderPagination('login-logs', response.data);
                 } else {
                     showError(tableBody, response.data.message || '获取登录日志失败');
@@ -545,6 +596,22 @@ document.addEventListener('DOMContentLoaded', function() {
         paginationElement.innerHTML = paginationHTML;
     }
     
+    // 加载操作/登录日志统计（服务端汇总，包含已归档的历史日志）
+    function loadLogStats(type, params) {
+        axios.get(`/admin/${type}-stats-api?${params.toString()}`)
+            .then(function(response) {
+                if (!response.data.success) return;
+                const stats = response.data.stats;
+                document.querySelectorAll(`#${type}-stats .stats-value`).forEach(function(element) {
+                    const field = element.getAttribute('data-field');
+                    element.textContent = field === 'success_rate' ? stats[field] + '%' : stats[field];
+                });
+            })
+            .catch(function(error) {
+                console.error('获取统计数据失败:', error);
+            });
+    }
+    
     // 显示错误信息
     function showError(tableBody, message) {
         tableBody.innerHTML = `<tr><td colspan="${tableBody.closest('table').querySelectorAll('th').length}" class="text-center text-danger">${message}</td></tr>`;
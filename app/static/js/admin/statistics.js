@@ -71,7 +71,7 @@ function loadSignLogs(page) {
         });
 }
 
-// 加载统计数据
+// 加载统计数据（服务端汇总，包含已归档的历史日志）
 function loadStatistics() {
     const username = document.getElementById('sign-username').value;
     const dateFrom = document.getElementById('sign-date-from').value;
@@ -79,10 +79,8 @@ function loadStatistics() {
     const signType = document.getElementById('sign-type').value;
     const status = document.getElementById('sign-status').value;
     
-    // 构建查询参数 - 使用大量数据进行统计
-    const params = new URLSearchParams({
-        limit: 5000
-    });
+    // 构建查询参数
+    const params = new URLSearchParams();
     
     if (username) params.append('username', username);
     if (dateFrom) params.append('date_from', dateFrom);
@@ -91,10 +89,10 @@ function loadStatistics() {
     if (status !== 'all') params.append('status', status);
     
     // 发送请求
-    axios.get(`/admin/sign-logs-api?${params.toString()}`)
+    axios.get(`/admin/sign-stats-api?${params.toString()}`)
         .then(function(response) {
             if (response.data.success) {
-                calculateStatistics(response.data.logs);
+                renderStatistics(response.data.stats);
             }
         })
         .catch(function(error) {
@@ -102,59 +100,12 @@ function loadStatistics() {
         });
 }
 
-// 计算统计数据
-function calculateStatistics(logs) {
-    // 获取当前日期
-    const today = new Date();
-    today.setHours(0, 0, 0, 0);
-    const todayTimestamp = today.getTime() / 1000;
-    
-    // 获取本月第一天
-    const firstDayOfMonth = new Date(today.getFullYear(), today.getMonth(), 1);
-    const firstDayTimestamp = firstDayOfMonth.getTime() / 1000;
-    
-    // 今日打卡次数
-    const todaySignCount = logs.filter(log => log.sign_time >= todayTimestamp).length;
-    
-    // 成功率
-    let successCount = 0;
-    logs.forEach(log => {
-        if (log.status === '成功') successCount++;
-    });
-    const successRate = logs.length > 0 ? (successCount / logs.length * 100).toFixed(2) : 0;
-    
-    // 本月打卡次数
-    const thisMonthSignCount = logs.filter(log => log.sign_time >= firstDayTimestamp).length;
-    
-    // 计算日均打卡次数
-    // 获取日期范围
-    let startDate = new Date();
-    let endDate = new Date();
-    
-    if (logs.length > 0) {
-        // 找到最早和最晚的打卡记录
-        let earliestTime = logs[logs.length - 1].sign_time;
-        let latestTime = logs[0].sign_time;
-        
-        startDate = new Date(earliestTime * 1000);
-        startDate.setHours(0, 0, 0, 0);
-        
-        endDate = new Date(latestTime * 1000);
-        endDate.setHours(23, 59, 59, 999);
-        
-        // 计算天数差异
-        const dayDiff = Math.ceil((endDate - startDate) / (1000 * 60 * 60 * 24));
-        const avgPerDay = dayDiff > 0 ? (logs.length / dayDiff).toFixed(2) : logs.length;
-        
-        document.getElementById('avg-per-day').querySelector('.stats-value').textContent = avgPerDay;
-    } else {
-        document.getElementById('avg-per-day').querySelector('.stats-value').textContent = '0';
-    }
-    
-    // 更新统计卡片
-    document.getElementById('today-sign-count').querySelector('.stats-value').textContent = todaySignCount;
-    document.getElementById('success-rate').querySelector('.stats-value').textContent = successRate + '%';
-    document.getElementById('this-month-sign').querySelector('.stats-value').textContent = thisMonthSignCount;
+// 更新统计卡片
+function renderStatistics(stats) {
+    document.getElementById('today-sign-count').querySelector('.stats-value').textContent = stats.today;
+    document.getElementById('success-rate').querySelector('.stats-value').textContent = stats.success_rate + '%';
+    document.getElementById('this-month-sign').querySelector('.stats-value').textContent = stats.this_month;
+    document.getElementById('avg-per-day').querySelector('.stats-value').textContent = stats.avg_per_day;
 }
 
 // 渲染签到日志表格
@@ -0,0 +1,141 @@
+"""
+用户活跃时间跟踪（延迟写入）
+
+每次请求只在内存中记录用户的最后活跃时间，由后台线程每隔 ACTIVITY_FLUSH_INTERVAL 秒
+把这段时间内变化过的用户合并成一个事务写入 users.last_activity，应用关闭时再写入一次。
+
+管理员会话的超时判断也在内存中完成：某个管理员open_id第一次出现时从数据库读取一次最后活跃时间，
+之后的请求只比较内存中的时间戳，不再每次点击都执行一次UPDATE。
+管理员重新登录或退出登录时需调用 reset_admin / forget，使旧open_id立即失效。
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+from app import USER_DB_FILE, logger
+from app.utils.db import connect
+from config import settings
+
+# 管理员超时时间（秒）
+ADMIN_TIMEOUT = 3600  # 60分钟
+
+FLUSH_SQL = "UPDATE users SET last_activity = ? WHERE user_id = ? AND (last_activity IS NULL OR last_activity < ?)"
+
+
+class ActivityTracker:
+    """内存中的最后活跃时间，定期合并写入数据库"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user_id -> 尚未写入数据库的最后活跃时间
+        self._pending: Dict[str, int] = {}
+        # 管理员open_id -> 最后活跃时间
+        self._admin_sessions: Dict[str, int] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+        self._thread.start()
+        logger.info("活跃时间写入线程已启动")
+
+    def stop(self, timeout: float = 10.0):
+        """停止写入线程并写入剩余的活跃时间"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+        logger.info("活跃时间写入线程已停止")
+
+    def touch(self, user_id: str, now: Optional[int] = None):
+        """记录用户活跃"""
+        if not user_id:
+            return
+        now = now or int(time.time())
+        with self._lock:
+            if self._pending.get(user_id, 0) < now:
+                self._pending[user_id] = now
+
+    def check_admin(self, open_id: str) -> Optional[bool]:
+        """
+        在内存中校验管理员会话，有效时刷新活跃时间
+
+        :return: True有效，False已超时，None表示该open_id尚未加载（需调用 load_admin）
+        """
+        now = int(time.time())
+        with self._lock:
+            last_activity = self._admin_sessions.get(open_id)
+            if last_activity is None:
+                return None
+            if now - last_activity > ADMIN_TIMEOUT:
+                del self._admin_sessions[open_id]
+                return False
+            self._admin_sessions[open_id] = now
+            self._pending["admin"] = now
+        return True
+
+    def load_admin(self, open_id: str) -> bool:
+        """
+        从数据库加载管理员会话并校验（同步，在数据库线程池中执行）
+
+        :return: 是否为未超时的管理员
+        """
+        conn = connect(USER_DB_FILE)
+        try:
+            row = conn.execute(
+                """SELECT u.last_activity FROM sessions s JOIN users u ON u.user_id = s.user_id
+                   WHERE s.token = ? AND s.user_id = 'admin' AND s.expires_at > ?""",
+                (open_id, int(time.time()))
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if not row:
+            return False
+        with self._lock:
+            # 内存中可能已有更新的时间，取较大值
+            self._admin_sessions[open_id] = max(int(row[0] or 0), self._admin_sessions.get(open_id, 0))
+        return bool(self.check_admin(open_id))
+
+    def reset_admin(self, open_id: str, now: int):
+        """管理员重新登录：旧open_id全部失效，只保留新的"""
+        with self._lock:
+            self._admin_sessions = {open_id: now}
+
+    def forget(self, open_id: str):
+        """退出登录：移除管理员会话"""
+        with self._lock:
+            self._admin_sessions.pop(open_id, None)
+
+    def flush(self):
+        """把待写入的活跃时间合并成一个事务写入数据库"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        conn = connect(USER_DB_FILE)
+        try:
+            conn.executemany(FLUSH_SQL, [(ts, user_id, ts) for user_id, ts in pending.items()])
+            conn.commit()
+        except Exception as e:
+            logger.error(f"写入用户活跃时间失败（{len(pending)}个用户）: {str(e)}")
+            # 放回队列，下次再写，期间更新的时间优先
+            with self._lock:
+                for user_id, ts in pending.items():
+                    if self._pending.get(user_id, 0) < ts:
+                        self._pending[user_id] = ts
+        finally:
+            conn.close()
+
+    def _run(self):
+        while not self._stop_event.wait(settings.ACTIVITY_FLUSH_INTERVAL):
+            self.flush()
+
+
+activity_tracker = ActivityTracker()
@@ -1,6 +1,6 @@
-import httpx
 from fastapi import Response
-from app.utils.host import build_api_url
+from app.utils.resilience import READ_RETRY
+from app.utils.upstream import upstream_request
 from app import logger
 from config import settings
 
@@ -9,18 +9,15 @@ async def wx_login(headers: dict, data: dict):
     """
     微信登录
     """
-    
-    api_url = build_api_url("/Apps/wxLogin")
 
     try:
-        async with httpx.AsyncClient() as client:
-            api_response = await client.post(api_url, headers=headers, json=data)
-            api_data = api_response.json()
-            if api_data.get("success", False):
-                return api_response.headers.get("Set-Cookie", {})
-            else:
-                logger.error(f"API请求成功但返回失败状态: {api_data.get('message', '未知错误')}")
-                return None
+        api_response = await upstream_request("POST", "/Apps/wxLogin", headers=headers, json=data)
+        api_data = api_response.json()
+        if api_data.get("success", False):
+            return api_response.headers.get("Set-Cookie", {})
+        else:
+            logger.error(f"API请求成功但返回失败状态: {api_data.get('message', '未知错误')}")
+            return None
     except Exception as e:
         logger.error(f"获取用户信息时发生异常: {str(e)}")
         return None
@@ -30,28 +27,26 @@ async def get_user_info(headers: dict):
     """
     获取用户信息
     """
-    
-    api_url = build_api_url("/Apps/AppIndex")
+
     params = {'UnitCode': settings.UNIT_CODE}
-    
+
     try:
-        async with httpx.AsyncClient() as client:
-            api_response = await client.get(api_url, headers=headers, params=params)
-            api_data = api_response.json()
-            if api_data.get("success", False):
-                api_data = api_data.get("data", {})
-                fields = ["UserID", "UserName", "DepID", "Position", "DepName"]
-                user_info = {}
-                for field in fields:
-                    user_info[field] = api_data.get(field, "")
-                return user_info
-            else:
-                logger.error(f"API请求成功但返回失败状态: {api_data.get('message', '未知错误')}")
-                return None
+        api_response = await upstream_request("GET", "/Apps/AppIndex", retry=READ_RETRY, headers=headers, params=params)
+        api_data = api_response.json()
+        if api_data.get("success", False):
+            api_data = api_data.get("data", {})
+            fields = ["UserID", "UserName", "DepID", "Position", "DepName"]
+            user_info = {}
+            for field in fields:
+                user_info[field] = api_data.get(field, "")
+            return user_info
+        else:
+            logger.error(f"API请求成功但返回失败状态: {api_data.get('message', '未知错误')}")
+            return None
     except Exception as e:
         logger.error(f"获取用户信息时发生异常: {str(e)}")
         return None
-    
+
 
 async def get_attendance_info(headers: dict, user_id: int) -> Response | None:
     """
@@ -67,17 +62,17 @@ async def get_attendance_info(headers: dict, user_id: int) -> Response | None:
         httpx.Response | None: 若请求成功返回响应对象，否则返回 None。
     """
 
-    api_url = build_api_url('/AttendanceCard/GetAttCheckinoutList')
     data = {"AttType": "1", "UnitCode": settings.UNIT_CODE, "userid": user_id, "Mid": "134"}
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(api_url, headers=headers, json=data)
-            if response.status_code == 200:
-                return response
-            else:
-                logger.error(f"API请求成功但返回失败状态")
-                return None
+        response = await upstream_request(
+            "POST", "/AttendanceCard/GetAttCheckinoutList", retry=READ_RETRY, headers=headers, json=data, timeout=10.0
+        )
+        if response.status_code == 200:
+            return response
+        else:
+            logger.error(f"API请求成功但返回失败状态")
+            return None
     except Exception as e:
         logger.error(f"获取用户获取考勤信息时发生异常: {str(e)}")
         return None
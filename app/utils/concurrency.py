@@ -0,0 +1,87 @@
+"""
+异步并发辅助工具
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from app import logger
+
+
+class SingleFlight:
+    """
+    合并相同的并发请求
+
+    同一时刻对同一个key的多次调用只会真正执行一次，所有等待者共享同一个结果（或异常）。
+    调用完成后立即移除，不做结果缓存。实际请求运行在独立的Task中，
+    某个等待者被取消（如客户端断开）不会影响其他等待者。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        执行或加入一个进行中的调用
+
+        :param key: 用于判断请求是否相同的键
+        :param func: 实际执行请求的协程函数
+        :return: func的返回值
+        """
+        loop = asyncio.get_running_loop()
+        # Task只能在创建它的事件循环中等待，定时任务的事件循环需要单独区分
+        call_key = (loop, key)
+
+        with self._lock:
+            task = self._calls.get(call_key)
+            if task is None:
+                task = loop.create_task(func(*args, **kwargs))
+                self._calls[call_key] = task
+                task.add_done_callback(lambda t, k=call_key: self._forget(k, t))
+
+        return await asyncio.shield(task)
+
+    def _forget(self, call_key, task: asyncio.Task):
+        """调用完成后移除记录"""
+        with self._lock:
+            if self._calls.get(call_key) is task:
+                del self._calls[call_key]
+        # 读取异常，避免没有等待者时出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        """当前进行中的调用数量"""
+        with self._lock:
+            return len(self._calls)
+
+
+async def fan_out(**branches: Tuple[Awaitable[Any], Any]) -> Dict[str, Any]:
+    """
+    并发执行多个相互独立的调用
+
+    单个分支失败只记录日志并使用该分支的默认值，不影响其他分支。
+
+    用法:
+        results = await fan_out(
+            stats=(get_Attendance_Statistics(...), {}),
+            details=(GetYueTjList(...), [])
+        )
+
+    :param branches: 分支名 -> (协程, 失败时的默认值)
+    :return: 分支名 -> 结果
+    """
+    names = list(branches)
+    outcomes = await asyncio.gather(*(branches[name][0] for name in names), return_exceptions=True)
+
+    results = {}
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            logger.error(f"并发请求分支 {name} 失败: {str(outcome)}")
+            results[name] = branches[name][1]
+        else:
+            results[name] = outcome
+    return results
@@ -0,0 +1,235 @@
+"""
+SQLite连接池
+
+五个数据库文件（user/sign/log/set/cron）各自维护一组可复用的连接，避免每次查询都重新打开文件。
+连接统一开启WAL模式：读操作不再被日志写入阻塞，写操作之间通过busy_timeout排队而不是立即报错。
+
+用法与 sqlite3.connect 相同，close() 会把连接归还到池中而不是真正关闭:
+    conn = connect(USER_DB_FILE)
+    cursor = conn.cursor()
+    ...
+    conn.close()
+
+需要跨业务表JOIN时使用 unified_connection()：single模式下就是唯一的数据库文件，
+split模式下以 user.db 为主库 ATTACH 其余文件。表名在各文件间不重复，同一条SQL在两种模式下都能执行:
+    conn = unified_connection()
+    conn.execute("SELECT ... FROM schedules s LEFT JOIN users u ON u.user_id = s.user_id")
+
+在 async 函数中不要直接执行查询（磁盘IO会卡住整个事件循环），使用专用线程池执行:
+    row = await fetch_one(USER_DB_FILE, "SELECT ... WHERE open_id = ?", (open_id,))
+    await run_in_db(some_sync_function, arg1, arg2)
+"""
+import asyncio
+import functools
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from app import logger
+from config import settings
+
+
+class PooledConnection:
+    """
+    连接池中的连接代理
+
+    除 close() 外的所有属性和方法都转发给真实的 sqlite3.Connection。
+    """
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        # 如 conn.row_factory = sqlite3.Row
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        """归还连接，重复调用无副作用"""
+        conn = object.__getattribute__(self, "_conn")
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """单个数据库文件的连接池"""
+
+    def __init__(self, db_file: str, max_idle: int, attach: Optional[Dict[str, str]] = None):
+        self.db_file = db_file
+        self.attach = attach or {}
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=max_idle)
+
+    def _open(self) -> sqlite3.Connection:
+        # 连接会在线程池、定时任务线程之间流转，但同一时刻只被一个使用者持有
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=settings.DB_BUSY_TIMEOUT / 1000,
+            check_same_thread=False,
+            cached_statements=settings.DB_STATEMENT_CACHE
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT)}")
+        conn.execute(f"PRAGMA cache_size=-{int(settings.DB_CACHE_SIZE_KB)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        for schema, db_file in self.attach.items():
+            conn.execute("ATTACH DATABASE ? AS " + schema, (db_file,))
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        try:
+            # 未提交的事务直接回滚，保证下一个使用者拿到干净的连接
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"归还数据库连接失败，已丢弃: {str(e)}")
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+# split模式下跨库连接池的键（不会与真实文件路径冲突）
+_UNIFIED_POOL = ":unified:"
+
+
+def connect(db_file: str) -> PooledConnection:
+    """
+    从连接池获取数据库连接，用完后调用 close() 归还
+
+    :param db_file: 数据库文件路径，如 USER_DB_FILE
+    """
+    pool = _pools.get(db_file)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_file)
+            if pool is None:
+                pool = ConnectionPool(db_file, settings.DB_POOL_SIZE)
+                _pools[db_file] = pool
+    return pool.acquire()
+
+
+def unified_connection() -> PooledConnection:
+    """
+    获取能访问所有业务表的连接，用完后调用 close() 归还
+
+    single模式下等同于 connect(DB_FILE)；split模式下连接 user.db 并 ATTACH 其余四个文件，
+    未加库名前缀的表名会依次在各文件中查找。
+    """
+    from app import SINGLE_DB_MODE, SPLIT_DB_FILES
+
+    if SINGLE_DB_MODE:
+        return connect(settings.DB_FILE)
+
+    pool = _pools.get(_UNIFIED_POOL)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(_UNIFIED_POOL)
+            if pool is None:
+                attach = {f"{name}_db": db_file for name, db_file in SPLIT_DB_FILES.items() if name != "user"}
+                pool = ConnectionPool(SPLIT_DB_FILES["user"], settings.DB_POOL_SIZE, attach)
+                _pools[_UNIFIED_POOL] = pool
+    return pool.acquire()
+
+
+def close_all_connections():
+    """等待进行中的数据库操作完成，然后关闭所有空闲连接（应用关闭时调用）"""
+    _executor.shutdown(wait=True)
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+# 数据库专用线程池，与默认线程池隔离，避免被其他阻塞任务占满
+_executor = ThreadPoolExecutor(max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix="sqlite")
+
+T = TypeVar("T")
+
+
+async def run_in_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    在数据库线程池中执行同步函数，不阻塞事件循环
+
+    :param func: 同步函数，内部自行 connect/close
+    :return: func的返回值（异常原样抛出）
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def _fetch(db_file: str, sql: str, params: Sequence, one: bool, row_factory):
+    conn = connect(db_file)
+    try:
+        if row_factory is not None:
+            conn.row_factory = row_factory
+        cursor = conn.execute(sql, params)
+        return cursor.fetchone() if one else cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _execute(db_file: str, sql: str, params: Sequence, many: bool) -> int:
+    conn = connect(db_file)
+    try:
+        cursor = conn.executemany(sql, params) if many else conn.execute(sql, params)
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+async def fetch_one(db_file: str, sql: str, params: Sequence = (), row_factory=None) -> Optional[Any]:
+    """异步查询单行"""
+    return await run_in_db(_fetch, db_file, sql, params, True, row_factory)
+
+
+async def fetch_all(db_file: str, sql: str, params: Sequence = (), row_factory=None) -> List[Any]:
+    """异步查询多行"""
+    return await run_in_db(_fetch, db_file, sql, params, False, row_factory)
+
+
+async def execute(db_file: str, sql: str, params: Sequence = ()) -> int:
+    """异步执行写操作并提交，返回影响行数"""
+    return await run_in_db(_execute, db_file, sql, params, False)
+
+
+async def execute_many(db_file: str, sql: str, seq_of_params: Sequence[Sequence]) -> int:
+    """异步批量执行写操作并提交，返回影响行数"""
+    return await run_in_db(_execute, db_file, sql, seq_of_params, True)
@@ -1,227 +1,489 @@
+"""
+数据库结构初始化与版本迁移
+
+各数据库（user/sign/log/set/cron）的表结构变更按版本号顺序登记在 MIGRATIONS 中，
+已执行的版本记录在 schema_migrations 表里。启动时每个库只读取一次版本号，已是最新则直接跳过，
+不再重复执行建表、建索引语句。
+
+新增表、索引或列时，在对应组件列表的末尾追加新版本，不要修改已经发布的迁移:
+    (5, "login_logs增加device列", _log_v5),
+"""
 import datetime
 import logging
 import os
 import sqlite3
+import threading
+import time
 
-from .. import SIGN_DB_FILE, LOG_DB_FILE, SET_DB_FILE, USER_DB_FILE, CRON_DB_FILE
+from .. import SIGN_DB_FILE, LOG_DB_FILE, SET_DB_FILE, USER_DB_FILE, CRON_DB_FILE, SINGLE_DB_MODE, SPLIT_DB_FILES
+from app.utils.db import connect
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+# 已建立FTS5全文索引的日志表，日志查询据此决定使用 MATCH 还是 LIKE
+FTS_TABLES = set()
+
+# 同一进程内只初始化一次（app包导入、docker-entrypoint等多处都会调用）
+_initialized = False
+_init_lock = threading.Lock()
+
 def initialize_database():
-    """初始化所有数据库：创建data目录和相关表"""
-    # 确保data目录存在
-    data_dir = "data"
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-    
-    # 初始化用户数据库
-    initialize_user_db()
-    
-    # 初始化签到日志数据库
-    initialize_sign_db()
-    
-    # 初始化日志数据库
-    initialize_log_db()
-    
-    # 初始化设置数据库
-    initialize_settings_db()
-    
-    # 初始化定时任务数据库
-    initialize_cron_db()
-    
+    """初始化所有数据库：创建data目录，执行未完成的迁移"""
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return True
+
+        # 确保data目录存在
+        data_dir = "data"
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+
+        for component, (db_file, migrations) in MIGRATIONS.items():
+            _migrate(component, db_file, migrations)
+
+        # single模式下迁移原有的分库数据
+        if SINGLE_DB_MODE:
+            consolidate_databases()
+
+        _detect_fts_tables()
+        _initialized = True
     return True
 
-def initialize_user_db():
-    """初始化用户数据库"""
-    # 数据库文件路径
+def _current_version(conn, component):
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations WHERE component = ?", (component,)).fetchone()
+    return row[0] or 0
+
+def _migrate(component, db_file, migrations):
+    """
+    执行一个数据库的未完成迁移
 
+    所有待执行的版本在同一个写事务中完成，失败时整体回滚；
+    多个进程同时启动时，后拿到写锁的进程会发现版本已是最新而跳过。
+
+    :return: 迁移后的版本号，失败返回None
+    """
+    latest = migrations[-1][0]
+    conn = connect(db_file)
     try:
-        # 连接数据库
-        conn = sqlite3.connect(USER_DB_FILE)
-        cursor = conn.cursor()
-        
-        # 创建users表（如果不存在）
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            user_id TEXT,
-            department_name TEXT,
-            department_id TEXT,
-            position TEXT,
-            open_id TEXT,
-            first_login_time INTEGER DEFAULT 0,
-            last_activity INTEGER DEFAULT 0,
-            deleted INTEGER DEFAULT 0
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            component TEXT NOT NULL,        -- 数据库组件：user/sign/log/set/cron
+            version INTEGER NOT NULL,
+            name TEXT,
+            applied_at REAL,
+            PRIMARY KEY (component, version)
         )
         ''')
-        
-        # 创建索引以提高查询性能
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON users (user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_open_id ON users (open_id)')
-        
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        logger.error(f"用户数据库初始化失败: {str(e)}")
-        return False
+        if _current_version(conn, component) >= latest:
+            return latest
 
-def initialize_sign_db():
-    """初始化签到日志数据库"""
-    
-    try:
-        # 连接数据库
-        conn = sqlite3.connect(SIGN_DB_FILE)
+        conn.execute("BEGIN IMMEDIATE")
+        current = _current_version(conn, component)
         cursor = conn.cursor()
-        
-        # 创建sign_logs表（如果不存在）
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sign_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            sign_time REAL NOT NULL,
-            sign_type TEXT,
-            status TEXT,
-            remark TEXT,
-            ip_address TEXT DEFAULT '',
-            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # 创建索引以提高查询性能
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sign_time ON sign_logs (sign_time)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_username ON sign_logs (username)')
-        
+        for version, name, migration in migrations:
+            if version <= current:
+                continue
+            migration(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (component, version, name, applied_at) VALUES (?, ?, ?, ?)",
+                (component, version, name, time.time())
+            )
+            logger.info(f"{component} 数据库迁移到版本 {version}: {name}")
         conn.commit()
-        conn.close()
-        return True
+        return latest
     except Exception as e:
-        logger.error(f"签到日志数据库初始化失败: {str(e)}")
-        return False
+        if conn.in_transaction:
+            conn.rollback()
+        logger.error(f"{component} 数据库迁移失败: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+def _detect_fts_tables():
+    """检查哪些日志表已建立全文索引（SQLite不支持FTS5时迁移会跳过建索引）"""
+    for table, db_file in (("sign_logs", SIGN_DB_FILE), ("operation_logs", LOG_DB_FILE), ("login_logs", LOG_DB_FILE)):
+        conn = connect(db_file)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table}_fts",)).fetchone():
+                FTS_TABLES.add(table)
+        finally:
+            conn.close()
+
+# ===== 用户数据库 =====
+
+def _user_v1(cursor):
+    """创建users表"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        user_id TEXT,
+        department_name TEXT,
+        department_id TEXT,
+        position TEXT,
+        open_id TEXT,
+        first_login_time INTEGER DEFAULT 0,
+        last_activity INTEGER DEFAULT 0,
+        deleted INTEGER DEFAULT 0
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON users (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_open_id ON users (open_id)')
+
+def _user_v2(cursor):
+    """已吊销的会话令牌（SESSION_MODE=token）"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revoked_tokens (
+        jti TEXT PRIMARY KEY,           -- 令牌ID
+        expires_at REAL NOT NULL        -- 令牌过期时间，过期后记录可删除
+    )
+    ''')
+
+def _user_v3(cursor):
+    """登录会话表（支持多设备登录），迁移users中现有的open_id"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        token TEXT PRIMARY KEY,         -- Cookie中的open_id
+        user_id TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)')
+
+    _backfill_sessions(cursor)
+
+def _backfill_sessions(cursor):
+    """把users中现有的open_id写入sessions表，已登录的用户不需要重新登录，有效期从迁移时开始计算"""
+    now = int(time.time())
+    cursor.execute(
+        """INSERT OR IGNORE INTO sessions (token, user_id, created_at, expires_at)
+           SELECT open_id, user_id, COALESCE(NULLIF(last_activity, 0), ?), ?
+           FROM users WHERE open_id IS NOT NULL AND open_id != '' AND deleted = 0""",
+        (now, now + int(settings.SESSION_TTL))
+    )
+
+# ===== 签到日志数据库 =====
+
+def _sign_v1(cursor):
+    """创建sign_logs表"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sign_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        sign_time REAL NOT NULL,
+        sign_type TEXT,
+        status TEXT,
+        remark TEXT,
+        ip_address TEXT DEFAULT '',
+        create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sign_time ON sign_logs (sign_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_username ON sign_logs (username)')
+
+def _sign_v2(cursor):
+    """日志查询的组合索引（索引隐含id，可直接支持按 (时间, id) 排序的游标分页）"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sign_username_time ON sign_logs (username, sign_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sign_status_type_time ON sign_logs (status, sign_type, sign_time)')
+    # 已被上面的组合索引覆盖
+    cursor.execute('DROP INDEX IF EXISTS idx_username')
+
+def _sign_v3(cursor):
+    """全文索引"""
+    _create_fts_index(cursor, 'sign_logs', ['username', 'remark'])
+
+def _sign_v4(cursor):
+    """已归档签到日志的每日汇总"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sign_daily_stats (
+        day TEXT NOT NULL,              -- 日期 YYYY-MM-DD
+        username TEXT NOT NULL,
+        sign_type TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, username, sign_type, status)
+    )
+    ''')
+
+# ===== 日志数据库 =====
+
+def _log_v1(cursor):
+    """创建login_logs、operation_logs表"""
+    # login_logs表 - 保留原有表结构
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS login_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        username TEXT,
+        login_time REAL NOT NULL,
+        ip_address TEXT,
+        status TEXT
+    )
+    ''')
+    # operation_logs表 - 记录各种操作日志
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS operation_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,        -- 用户名
+        operation_time REAL NOT NULL,  -- 操作时间戳
+        operation_type TEXT NOT NULL,  -- 操作类型：LOGIN, VIEW, EDIT, CONFIG, SIGN等
+        operation_detail TEXT,         -- 操作详情
+        ip_address TEXT,               -- 操作IP
+        status TEXT,                   -- 操作状态：成功/失败
+        remarks TEXT,                  -- 备注信息
+        create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_time ON operation_logs (operation_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_username ON operation_logs (username)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_type ON operation_logs (operation_type)')
+
+def _log_v2(cursor):
+    """日志查询的组合索引"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_username_time ON operation_logs (username, operation_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_type_status_time ON operation_logs (operation_type, status, operation_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_login_time ON login_logs (login_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_login_status_time ON login_logs (status, login_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_login_user_time ON login_logs (user_id, login_time)')
+    # 已被上面的组合索引覆盖
+    cursor.execute('DROP INDEX IF EXISTS idx_operation_username')
+    cursor.execute('DROP INDEX IF EXISTS idx_operation_type')
+
+def _log_v3(cursor):
+    """全文索引"""
+    _create_fts_index(cursor, 'operation_logs', ['username', 'operation_detail', 'remarks'])
+    _create_fts_index(cursor, 'login_logs', ['username', 'user_id'])
+
+def _log_v4(cursor):
+    """已归档操作日志、登录日志的每日汇总"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS operation_daily_stats (
+        day TEXT NOT NULL,              -- 日期 YYYY-MM-DD
+        operation_type TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, operation_type, status)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS login_daily_stats (
+        day TEXT NOT NULL,              -- 日期 YYYY-MM-DD
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, status)
+    )
+    ''')
+
+# ===== 设置数据库 =====
+
+def _set_v1(cursor):
+    """创建system_settings表并插入必要的设置项"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS system_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        setting_key TEXT UNIQUE NOT NULL,
+        setting_value TEXT,
+        description TEXT,
+        updated_at REAL,
+        is_initialized BOOLEAN DEFAULT 0
+    )
+    ''')
+    
+    # 只插入必要的设置项
+    required_settings = [
+        ('api_host', '', 'API主机地址', datetime.datetime.now().timestamp(), 0),
+        ('admin_password', '', '管理员密码', datetime.datetime.now().timestamp(), 0),
+        ('fuck_password', '', 'FuckDaka密码', datetime.datetime.now().timestamp(), 0)
+    ]
+    cursor.executemany('''
+    INSERT OR IGNORE INTO system_settings (setting_key, setting_value, description, updated_at, is_initialized)
+    VALUES (?, ?, ?, ?, ?)
+    ''', required_settings)
+
+def _set_v2(cursor):
+    """创建workday_calendar表 - 缓存单位的工作日/节假日安排"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS workday_calendar (
+        unit_code TEXT NOT NULL,
+        day TEXT NOT NULL,              -- 日期 YYYY-MM-DD
+        is_workday INTEGER NOT NULL,    -- 1 工作日 / 0 休息日
+        holiday_name TEXT,              -- 节假日名称
+        updated_at REAL,                -- 最近一次从上游解析的时间
+        PRIMARY KEY (unit_code, day)
+    )
+    ''')
+
+# ===== 定时任务数据库 =====
+
+def _cron_v1(cursor):
+    """创建schedules表"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schedules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        username TEXT NOT NULL,
+        morning BOOLEAN NOT NULL DEFAULT 0,
+        afternoon BOOLEAN NOT NULL DEFAULT 0,
+        schedule_index INTEGER NOT NULL DEFAULT 0,
+        morning_time TEXT,
+        afternoon_time TEXT,
+        morning_selecte TEXT,
+        afternoon_selecte TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # 索引名不能与users表的idx_user_id相同，否则single模式下会被 IF NOT EXISTS 跳过
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_user_id ON schedules (user_id)')
+
+def _cron_v2(cursor):
+    """删除旧版本建在schedules上的同名索引idx_user_id（已由idx_schedules_user_id替代）"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_user_id' AND tbl_name = 'schedules'")
+    if cursor.fetchone():
+        cursor.execute('DROP INDEX idx_user_id')
+
+# 组件 -> (数据库文件, [(版本号, 说明, 迁移函数)])，版本号必须递增
+MIGRATIONS = {
+    "user": (USER_DB_FILE, [
+        (1, "创建users表", _user_v1),
+        (2, "创建revoked_tokens表", _user_v2),
+        (3, "创建sessions表", _user_v3),
+    ]),
+    "sign": (SIGN_DB_FILE, [
+        (1, "创建sign_logs表", _sign_v1),
+        (2, "签到日志组合索引", _sign_v2),
+        (3, "签到日志全文索引", _sign_v3),
+        (4, "签到每日汇总表", _sign_v4),
+    ]),
+    "log": (LOG_DB_FILE, [
+        (1, "创建login_logs、operation_logs表", _log_v1),
+        (2, "操作、登录日志组合索引", _log_v2),
+        (3, "操作、登录日志全文索引", _log_v3),
+        (4, "操作、登录每日汇总表", _log_v4),
+    ]),
+    "set": (SET_DB_FILE, [
+        (1, "创建system_settings表", _set_v1),
+        (2, "创建workday_calendar表", _set_v2),
+    ]),
+    "cron": (CRON_DB_FILE, [
+        (1, "创建schedules表", _cron_v1),
+        (2, "删除schedules上的旧索引", _cron_v2),
+    ]),
+}
+
+def _create_fts_index(cursor, table, columns):
+    """
+    为日志表创建FTS5全文索引，通过触发器与原表保持同步
+
+    使用trigram分词，可以像 LIKE '%...%' 一样匹配任意子串（至少3个字符），但不需要扫描全表。
+    索引只保存词项，原文仍从原表读取。SQLite不支持FTS5或trigram时跳过，查询退回LIKE。
+    """
+    fts_table = f"{table}_fts"
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
 
-def initialize_log_db():
-    """初始化日志数据库"""
     try:
-        # 连接数据库
-        conn = sqlite3.connect(LOG_DB_FILE)
-        cursor = conn.cursor()
-        
-        # 创建login_logs表（如果不存在）- 保留原有表结构
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS login_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            username TEXT,
-            login_time REAL NOT NULL,
-            ip_address TEXT,
-            status TEXT
-        )
-        ''')
-        
-        # 创建operation_logs表 - 记录各种操作日志
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS operation_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,        -- 用户名
-            operation_time REAL NOT NULL,  -- 操作时间戳
-            operation_type TEXT NOT NULL,  -- 操作类型：LOGIN, VIEW, EDIT, CONFIG, SIGN等
-            operation_detail TEXT,         -- 操作详情
-            ip_address TEXT,               -- 操作IP
-            status TEXT,                   -- 操作状态：成功/失败
-            remarks TEXT,                  -- 备注信息
-            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts_table,))
+        exists = cursor.fetchone() is not None
+
+        cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+            {column_list}, content='{table}', content_rowid='id', tokenize='trigram'
         )
-        ''')
-        
-        # 创建索引
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_time ON operation_logs (operation_time)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_username ON operation_logs (username)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_type ON operation_logs (operation_type)')
-        
-        conn.commit()
-        conn.close()
-        return True
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+        """)
+
+        # 首次创建时为已有日志建立索引
+        if not exists:
+            cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
     except Exception as e:
-        logger.error(f"日志数据库初始化失败: {str(e)}")
-        return False
+        logger.warning(f"{table} 全文索引创建失败，搜索将使用LIKE: {str(e)}")
+
+def consolidate_databases():
+    """
+    把split模式的五个数据库文件合并到single模式的数据库中（一次性迁移）
 
-def initialize_settings_db():
-    """初始化设置数据库"""
-    # 数据库文件路径
+    表结构已由迁移创建，这里按两边共有的列复制数据并保留原有id，
+    同一个id或唯一键冲突时以原文件的数据为准（覆盖初始化时插入的空设置项）。
+    每个文件迁移成功后重命名为 *.migrated，之后启动不会重复迁移，需要回退时改回原名即可。
+    """
+    legacy_files = [db_file for db_file in SPLIT_DB_FILES.values() if os.path.exists(db_file)]
+    if not legacy_files:
+        return True
 
+    # 不使用连接池：ATTACH会一直留在连接上
+    conn = sqlite3.connect(USER_DB_FILE)
     try:
-        # 连接数据库
-        conn = sqlite3.connect(SET_DB_FILE)
-        cursor = conn.cursor()
-        
-        # 创建system_settings表（如果不存在）
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS system_settings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            setting_key TEXT UNIQUE NOT NULL,
-            setting_value TEXT,
-            description TEXT,
-            updated_at REAL,
-            is_initialized BOOLEAN DEFAULT 0
-        )
-        ''')
-        
-        # 只插入必要的设置项
-        required_settings = [
-            ('api_host', '', 'API主机地址', datetime.datetime.now().timestamp(), 0),
-            ('admin_password', '', '管理员密码', datetime.datetime.now().timestamp(), 0),
-            ('fuck_password', '', 'FuckDaka密码', datetime.datetime.now().timestamp(), 0)
-        ]
-        
-        cursor.executemany('''
-        INSERT OR IGNORE INTO system_settings (setting_key, setting_value, description, updated_at, is_initialized)
-        VALUES (?, ?, ?, ?, ?)
-        ''', required_settings)
-        
-        conn.commit()
-        conn.close()
+        for db_file in legacy_files:
+            conn.execute("ATTACH DATABASE ? AS legacy", (db_file,))
+            tables = conn.execute(
+                "SELECT name, sql FROM legacy.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+            # 全文索引由新库的触发器重新生成，跳过虚拟表及其内部表
+            virtual_tables = [name for name, sql in tables if (sql or "").upper().startswith("CREATE VIRTUAL TABLE")]
+
+            copied = 0
+            for table, _ in tables:
+                if any(table == name or table.startswith(f"{name}_") for name in virtual_tables):
+                    continue
+                main_columns = [row[1] for row in conn.execute(f'PRAGMA main.table_info("{table}")')]
+                if not main_columns:
+                    logger.warning(f"{db_file} 中的表 {table} 在新数据库中不存在，跳过")
+                    continue
+                legacy_columns = {row[1] for row in conn.execute(f'PRAGMA legacy.table_info("{table}")')}
+                columns = ", ".join(f'"{column}"' for column in main_columns if column in legacy_columns)
+                cursor = conn.execute(
+                    f'INSERT OR REPLACE INTO main."{table}" ({columns}) SELECT {columns} FROM legacy."{table}"'
+                )
+                copied += cursor.rowcount
+
+            # 迁移sessions表时新库的users还是空的，合并用户后再补写登录会话
+            if any(table == "users" for table, _ in tables):
+                _backfill_sessions(conn.cursor())
+
+            conn.commit()
+            conn.execute("DETACH DATABASE legacy")
+            _retire_legacy_file(db_file)
+            logger.info(f"已将 {db_file} 迁移到 {USER_DB_FILE}，共 {copied} 条记录")
         return True
     except Exception as e:
-        logger.error(f"设置数据库初始化失败: {str(e)}")
+        conn.rollback()
+        logger.error(f"合并数据库失败: {str(e)}")
         return False
+    finally:
+        conn.close()
 
-def initialize_cron_db():
-    """初始化定时任务数据库"""
-    # 数据库文件路径
-    
+def _retire_legacy_file(db_file):
+    """把WAL中的数据写回主文件后，将已迁移的数据库文件重命名"""
+    conn = sqlite3.connect(db_file)
     try:
-        # 连接数据库
-        conn = sqlite3.connect(CRON_DB_FILE)
-        cursor = conn.cursor()
-            
-        # 创建schedules表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS schedules (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            username TEXT NOT NULL,
-            morning BOOLEAN NOT NULL DEFAULT 0,
-            afternoon BOOLEAN NOT NULL DEFAULT 0,
-            schedule_index INTEGER NOT NULL DEFAULT 0,
-            morning_time TEXT,
-            afternoon_time TEXT,
-            morning_selecte TEXT,
-            afternoon_selecte TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # 创建索引
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON schedules (user_id)')
-        
-        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
         conn.close()
-        
-        return True
-    except Exception as e:
-        logger.error(f"定时任务数据库初始化失败: {str(e)}")
-        return False
+
+    os.replace(db_file, f"{db_file}.migrated")
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
 
 def reset_cron_db():
     """完全重置cron.db数据库（删除并重新创建）"""
@@ -244,11 +506,11 @@ def reset_cron_db():
             logger.info(f"已删除旧的数据库文件: {db_file}")
         
         # 重新初始化
-        return initialize_cron_db()
+        return _migrate("cron", CRON_DB_FILE, MIGRATIONS["cron"][1]) is not None
     except Exception as e:
         logger.error(f"重置cron数据库失败: {str(e)}")
         return False
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    initialize_database() 
\ No newline at end of file
+    initialize_database()
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+JSON数组的增量解析
+
+上游部分接口（如打卡记录）一次返回用户的全部历史数据，整体 json() 解析既费CPU又占内存。
+这里按数据块逐条解码数组元素，调用方可以在拿到需要的数据后随时停止读取。
+"""
+import json
+import re
+from typing import Any, AsyncIterator
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"\s*")
+
+
+async def iter_json_array(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """
+    从文本块流中逐个产出顶层JSON数组的元素
+
+    :param chunks: 文本块的异步迭代器，如 response.aiter_text()
+    :return: 数组元素的异步迭代器
+    :raises ValueError: 响应不是JSON数组或数据不完整
+    """
+    buffer = ""
+    pos = 0
+    started = False
+
+    async for chunk in chunks:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+        while True:
+            pos = _whitespace.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+
+            char = buffer[pos]
+            if not started:
+                if char != "[":
+                    raise ValueError("响应不是JSON数组")
+                started = True
+                pos += 1
+                continue
+            if char == "]":
+                return
+            if char == ",":
+                pos += 1
+                continue
+
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 元素还没有接收完整，等待下一个数据块
+                break
+            if end >= len(buffer) and not isinstance(item, (dict, list)):
+                # 数字等标量可能被数据块截断，等待后续数据确认
+                break
+
+            yield item
+            pos = end
+
+    raise ValueError("JSON数组数据不完整")
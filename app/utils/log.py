@@ -1,6 +1,175 @@
 import datetime
-import sqlite3
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import List, Optional, Sequence, Tuple
+
 from app import SIGN_DB_FILE, LOG_DB_FILE, logger
+from app.utils.db import connect, execute
+from config import settings
+
+# 日志写入语句
+SIGN_LOG_SQL = '''
+    INSERT INTO sign_logs 
+    (username, sign_time, sign_type, status, remark, ip_address)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+OPERATION_LOG_SQL = '''
+    INSERT INTO operation_logs 
+    (username, operation_time, operation_type, operation_detail, ip_address, status, remarks)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+LOGIN_LOG_SQL = '''
+    INSERT INTO login_logs 
+    (user_id, username, login_time, ip_address, status)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    后台批量写日志
+
+    日志记录先进入有界队列，由后台线程按数量或时间阈值合并成一个事务写入，请求不再等待日志落盘。
+    使用线程而不是协程：定时任务在各自的事件循环中运行，也需要写日志。
+    写入线程未启动（如命令行脚本）或队列已满时，调用方直接同步写入，日志不会丢失。
+    """
+
+    def __init__(self):
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._running = True
+        self._thread.start()
+        logger.info("日志写入线程已启动")
+
+    def stop(self, timeout: float = 10.0):
+        """停止写入线程，队列中剩余的日志全部写入后返回"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("日志写入线程未能在超时时间内退出，部分日志可能未写入")
+        else:
+            # 停止过程中其他线程可能仍在 _STOP 之后放入日志
+            self._flush(self._drain())
+            logger.info("日志写入线程已停止")
+
+    def _drain(self) -> List[Tuple[str, str, Sequence]]:
+        """取出队列中剩余的所有日志"""
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _STOP:
+                items.append(item)
+
+    def submit(self, db_file: str, sql: str, params: Sequence) -> bool:
+        """
+        提交一条日志
+
+        :return: 是否已进入队列，返回False时由调用方直接写入
+        """
+        if not self._running:
+            return False
+        try:
+            self._queue.put_nowait((db_file, sql, params))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        batch: List[Tuple[str, str, Sequence]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch + self._drain())
+                return
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + settings.LOG_FLUSH_INTERVAL
+                batch.append(item)
+
+            if batch and (len(batch) >= settings.LOG_BATCH_SIZE or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+
+    def _flush(self, batch: List[Tuple[str, str, Sequence]]):
+        """按数据库分组，每个数据库一个事务"""
+        grouped = defaultdict(lambda: defaultdict(list))
+        for db_file, sql, params in batch:
+            grouped[db_file][sql].append(params)
+
+        for db_file, statements in grouped.items():
+            # 整批失败（如高峰期的 database is locked）时重试一次，仍失败则逐条写入，只丢弃确实写不进去的记录
+            if self._write_batch(db_file, statements):
+                continue
+            time.sleep(settings.LOG_FLUSH_INTERVAL)
+            if self._write_batch(db_file, statements):
+                continue
+            self._write_rows(db_file, statements)
+
+    def _write_batch(self, db_file: str, statements: dict) -> bool:
+        conn = connect(db_file)
+        try:
+            for sql, rows in statements.items():
+                conn.executemany(sql, rows)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            count = sum(len(rows) for rows in statements.values())
+            logger.warning(f"批量写入日志失败（{db_file}，{count}条）: {str(e)}")
+            return False
+        finally:
+            conn.close()
+
+    def _write_rows(self, db_file: str, statements: dict):
+        lost = 0
+        conn = connect(db_file)
+        try:
+            for sql, rows in statements.items():
+                for params in rows:
+                    try:
+                        conn.execute(sql, params)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        lost += 1
+                        logger.error(f"写入日志失败（{db_file}）: {str(e)}，日志内容: {params}")
+        finally:
+            conn.close()
+        if lost:
+            logger.error(f"{db_file} 共有 {lost} 条日志未能写入")
+
+
+log_writer = LogWriter()
+
+
+async def _write_log(db_file: str, sql: str, params: Sequence):
+    """写入一条日志：优先进入后台队列，否则直接写入"""
+    if not log_writer.submit(db_file, sql, params):
+        await execute(db_file, sql, params)
 
 async def log_sign_activity(username: str, sign_type: str, 
                      status: bool = False, message: str = "", 
@@ -16,23 +185,14 @@ async def log_sign_activity(username: str, sign_type: str,
         ip_address: 客户端IP地址
     """
     try:
-        conn = sqlite3.connect(SIGN_DB_FILE)
-        cursor = conn.cursor()
-        
         sign_time = datetime.datetime.now().timestamp()
         status_text = "成功" if status else "失败"
         
-        cursor.execute(
-            '''
-            INSERT INTO sign_logs 
-            (username, sign_time, sign_type, status, remark, ip_address)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ''',
+        await _write_log(
+            SIGN_DB_FILE, SIGN_LOG_SQL,
             (username, sign_time, sign_type, status_text, message, ip_address)
         )
         
-        conn.commit()
-        conn.close()
         logger.info(f"签到日志已记录: 用户 {username} {sign_type} {status_text}")
         return True
     except Exception as e:
@@ -69,23 +229,14 @@ async def log_operation(username: str,
         remarks: 备注信息
     """
     try:
-        conn = sqlite3.connect(LOG_DB_FILE)
-        cursor = conn.cursor()
-        
         operation_time = datetime.datetime.now().timestamp()
         status_text = "成功" if status else "失败"
         
-        cursor.execute(
-            '''
-            INSERT INTO operation_logs 
-            (username, operation_time, operation_type, operation_detail, ip_address, status, remarks)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''',
+        await _write_log(
+            LOG_DB_FILE, OPERATION_LOG_SQL,
             (username, operation_time, operation_type, operation_detail, ip_address, status_text, remarks)
         )
         
-        conn.commit()
-        conn.close()
         logger.info(f"操作日志已记录: 用户 {username} - {operation_type} - {operation_detail} - {status_text}")
         return True
     except Exception as e:
@@ -107,23 +258,14 @@ async def log_login(user_id: str,
         status: 登录状态（成功/失败）
     """
     try:
-        conn = sqlite3.connect(LOG_DB_FILE)
-        cursor = conn.cursor()
-        
         login_time = datetime.datetime.now().timestamp()
         status_text = "成功" if status else "失败"
         
-        cursor.execute(
-            '''
-            INSERT INTO login_logs 
-            (user_id, username, login_time, ip_address, status)
-            VALUES (?, ?, ?, ?, ?)
-            ''',
+        await _write_log(
+            LOG_DB_FILE, LOGIN_LOG_SQL,
             (user_id, username, login_time, ip_address, status_text)
         )
         
-        conn.commit()
-        conn.close()
         logger.info(f"登录日志已记录: 用户 {username}({user_id}) {status_text}")
         return True
     except Exception as e:
@@ -0,0 +1,139 @@
+"""
+上游接口调用指标
+
+按接口路径在内存中记录每次请求的耗时直方图、超时/错误计数和重试次数，用于区分慢在本服务还是慢在考勤API。
+数据从服务启动开始累计，重启后清零。
+"""
+import threading
+from collections import deque
+from typing import Deque, Dict, List
+
+from app.utils.resilience import breaker_states
+
+# 直方图桶上限（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# 每个接口保留最近多少次耗时用于计算分位数
+RECENT_SAMPLES = 500
+
+# 请求结果
+OK = "ok"                      # 2xx/3xx
+CLIENT_ERROR = "client_error"  # 4xx
+SERVER_ERROR = "server_error"  # 5xx
+TIMEOUT = "timeout"            # 超时
+NETWORK_ERROR = "network"      # 连接失败等其他网络错误
+REJECTED = "rejected"          # 熔断中被直接拒绝
+
+
+class EndpointMetrics:
+    """单个接口的调用指标"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.outcomes: Dict[str, int] = {
+            OK: 0, CLIENT_ERROR: 0, SERVER_ERROR: 0, TIMEOUT: 0, NETWORK_ERROR: 0, REJECTED: 0
+        }
+        self.retries = 0
+        self.recent: Deque[float] = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, elapsed_ms: float, outcome: str):
+        self.outcomes[outcome] += 1
+        if outcome == REJECTED:
+            # 被熔断拒绝的请求没有实际发出，不计入耗时
+            return
+
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.recent.append(elapsed_ms)
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.recent)
+        failed = self.outcomes[SERVER_ERROR] + self.outcomes[TIMEOUT] + self.outcomes[NETWORK_ERROR]
+        return {
+            "endpoint": self.endpoint,
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0,
+            "p50_ms": _percentile(recent, 50),
+            "p95_ms": _percentile(recent, 95),
+            "p99_ms": _percentile(recent, 99),
+            "max_ms": round(self.max_ms, 1),
+            "outcomes": dict(self.outcomes),
+            "error_rate": round(failed / self.count, 4) if self.count else 0,
+            "retries": self.retries,
+            "buckets": [
+                {"le": bound, "count": count}
+                for bound, count in zip(LATENCY_BUCKETS_MS + ["+Inf"], self.buckets)
+            ],
+        }
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    """最近秩法计算分位数（输入已排序）"""
+    if not ordered:
+        return 0
+    rank = min(max(int(len(ordered) * pct / 100 + 0.5) - 1, 0), len(ordered) - 1)
+    return round(ordered[rank], 1)
+
+
+_metrics: Dict[str, EndpointMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def _get(endpoint: str) -> EndpointMetrics:
+    metrics = _metrics.get(endpoint)
+    if metrics is None:
+        metrics = EndpointMetrics(endpoint)
+        _metrics[endpoint] = metrics
+    return metrics
+
+
+def record_request(endpoint: str, elapsed: float, outcome: str):
+    """
+    记录一次上游请求
+
+    :param endpoint: 接口路径
+    :param elapsed: 耗时（秒）
+    :param outcome: 请求结果（OK/CLIENT_ERROR/SERVER_ERROR/TIMEOUT/NETWORK_ERROR/REJECTED）
+    """
+    with _metrics_lock:
+        _get(endpoint).observe(elapsed * 1000, outcome)
+
+
+def record_retry(endpoint: str):
+    """记录一次重试"""
+    with _metrics_lock:
+        _get(endpoint).retries += 1
+
+
+def outcome_for_status(status_code: int) -> str:
+    """根据HTTP状态码判断请求结果"""
+    if status_code >= 500:
+        return SERVER_ERROR
+    if status_code >= 400:
+        return CLIENT_ERROR
+    return OK
+
+
+def upstream_metrics() -> List[dict]:
+    """
+    所有上游接口的指标快照，按请求数倒序
+    """
+    with _metrics_lock:
+        snapshots = [metrics.snapshot() for metrics in _metrics.values()]
+
+    breakers = breaker_states()
+    for snapshot in snapshots:
+        snapshot["breaker"] = breakers.get(snapshot["endpoint"], {}).get("state", "closed")
+
+    return sorted(snapshots, key=lambda item: item["count"], reverse=True)
@@ -0,0 +1,207 @@
+"""
+登录限流
+
+每次登录都会请求考勤API（/Apps/wxLogin、/Apps/AppIndex 或部门通讯录），集中登录或脚本暴力尝试
+会耗尽上游配额并占满事件循环。这里提供两层保护:
+    1. 令牌桶限流，超出时返回429和Retry-After:
+       - 按客户端IP限制每分钟的登录尝试次数
+       - 按“客户端IP+账号”限制每分钟的登录尝试次数（带上IP，单个来源无法把某个账号，尤其是admin，锁在外面）
+       - 按账号限制所有IP合计的失败次数（只统计密码错误等失败，上限更高），分散到大量IP的暴力尝试同样会被限制
+    2. 并发上限：同时进行的上游登录请求不超过 LOGIN_MAX_CONCURRENCY 个，排队超时同样返回429
+
+部署在反向代理之后时，需将代理地址配置到 TRUSTED_PROXIES，否则所有请求的来源IP都是代理本身。
+
+限流状态只保存在当前进程内存中（部署为单实例），重启后清零。
+"""
+import asyncio
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Hashable, List, Optional, Union
+
+from app import logger
+from config import settings
+
+
+class RateLimitExceeded(Exception):
+    """超出限流，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = max(int(math.ceil(retry_after)), 1)
+
+
+class TokenBucketLimiter:
+    """
+    按key区分的令牌桶
+
+    每个key最多积攒 capacity 个令牌，每 period 秒补满；每次请求消耗一个令牌。
+    key数量超过 maxsize 时淘汰最久未使用的（被淘汰的key相当于令牌已补满）。
+    """
+
+    def __init__(self, capacity: int, period: float = 60.0, maxsize: int = 10000):
+        self.capacity = capacity
+        self.rate = capacity / period if period > 0 else 0
+        self.maxsize = maxsize
+        # key -> (剩余令牌数, 上次更新时间)
+        self._buckets: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable) -> float:
+        """
+        尝试消耗一个令牌
+
+        :return: 0表示允许，否则为需要等待的秒数
+        """
+        return self._take(key, True)
+
+    def peek(self, key: Hashable) -> float:
+        """
+        检查是否还有令牌，不消耗
+
+        :return: 0表示有令牌，否则为需要等待的秒数
+        """
+        return self._take(key, False)
+
+    def _take(self, key: Hashable, consume: bool) -> float:
+        if self.capacity <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(self.capacity), now))
+            tokens = min(float(self.capacity), tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                wait = 0.0
+                if consume:
+                    tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate if self.rate else float("inf")
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+_ip_limiter = TokenBucketLimiter(settings.LOGIN_RATE_PER_IP)
+_account_limiter = TokenBucketLimiter(settings.LOGIN_RATE_PER_ACCOUNT)
+_account_failure_limiter = TokenBucketLimiter(settings.LOGIN_FAILURES_PER_ACCOUNT, period=600.0)
+
+
+def _parse_trusted_proxies(spec: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    networks = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"TRUSTED_PROXIES 中的地址无效，已忽略: {item}")
+    return networks
+
+
+_trusted_proxies = _parse_trusted_proxies(settings.TRUSTED_PROXIES)
+
+
+def _is_trusted_proxy(ip: str) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxies)
+
+
+def get_client_ip(request) -> str:
+    """
+    获取客户端IP
+
+    直接连接方是 TRUSTED_PROXIES 中的代理时，从 X-Forwarded-For 右侧向左取第一个不是受信代理的地址，
+    没有该头时使用 X-Real-IP；否则使用直接连接方地址（转发头可被客户端伪造，不可信）。
+    """
+    peer = request.client.host if request.client else ""
+    if not _trusted_proxies or not _is_trusted_proxy(peer):
+        return peer
+
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not _is_trusted_proxy(hop):
+                return hop
+        if hops:
+            return hops[0]
+
+    return request.headers.get("x-real-ip", "").strip() or peer
+
+# 登录只在主事件循环中处理，延迟创建以绑定到该循环
+_login_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def check_login_rate(ip: str, account: str):
+    """
+    检查登录尝试频率
+
+    :param ip: 客户端IP（get_client_ip）
+    :param account: 登录账号
+    :raises RateLimitExceeded: IP或该IP下的账号超出每分钟的登录次数，或账号的失败次数（所有IP合计）已达上限
+    """
+    account = _account_key(account)
+
+    wait = _ip_limiter.acquire(ip or "unknown")
+    if wait:
+        raise RateLimitExceeded(f"登录尝试过于频繁，请{math.ceil(wait)}秒后再试", wait)
+
+    # 按IP+账号计数，攻击者只能耗尽自己IP下该账号的次数
+    wait = _account_limiter.acquire((ip or "unknown", account))
+    if wait:
+        raise RateLimitExceeded(f"该账号登录尝试过于频繁，请{math.ceil(wait)}秒后再试", wait)
+
+    # 所有IP合计的失败次数，只检查不消耗，失败时由 record_login_failure 计数
+    wait = _account_failure_limiter.peek(account)
+    if wait:
+        raise RateLimitExceeded(f"该账号登录失败次数过多，请{math.ceil(wait)}秒后再试", wait)
+
+
+def record_login_failure(account: str):
+    """记录一次登录失败（密码错误等），计入账号所有IP合计的失败次数"""
+    _account_failure_limiter.acquire(_account_key(account))
+
+
+def _account_key(account: str) -> str:
+    return (account or "").strip().lower()
+
+
+@asynccontextmanager
+async def login_slot():
+    """
+    占用一个上游登录并发名额，排队超过 LOGIN_QUEUE_TIMEOUT 秒时放弃
+
+    用法:
+        async with login_slot():
+            await upstream_request(...)
+
+    :raises RateLimitExceeded: 排队超时
+    """
+    global _login_semaphore
+    if settings.LOGIN_MAX_CONCURRENCY <= 0:
+        yield
+        return
+
+    if _login_semaphore is None:
+        _login_semaphore = asyncio.Semaphore(settings.LOGIN_MAX_CONCURRENCY)
+
+    try:
+        await asyncio.wait_for(_login_semaphore.acquire(), timeout=settings.LOGIN_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise RateLimitExceeded("当前登录人数较多，请稍后再试", settings.LOGIN_QUEUE_TIMEOUT)
+
+    try:
+        yield
+    finally:
+        _login_semaphore.release()
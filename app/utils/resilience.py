@@ -0,0 +1,145 @@
+"""
+上游调用的熔断与重试策略
+
+- 每个接口一个熔断器：连续失败达到阈值后熔断，熔断期间直接快速失败，冷却后放行一个探测请求
+- 重试使用带抖动的指数退避，并受总耗时预算约束，避免单个请求被拖住数分钟
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from config import settings
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被快速拒绝"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"上游接口 {endpoint} 暂时不可用（已熔断），{retry_after:.0f}秒后重试")
+
+
+class CircuitBreaker:
+    """
+    单个接口的熔断器
+
+    状态: closed（正常） -> open（熔断） -> half_open（放行一个探测请求） -> closed/open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        请求前检查，熔断中则抛出CircuitOpenError
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+            raise CircuitOpenError(self.endpoint, max(self.reset_timeout - elapsed, 0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """探测请求未得出结果（如被取消）时释放名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+class RetryPolicy:
+    """
+    重试策略
+
+    :param max_attempts: 最大尝试次数（含首次），1表示不重试
+    :param base_delay: 退避基础时间（秒）
+    :param max_delay: 单次退避上限（秒）
+    :param budget: 包含所有尝试和等待在内的总耗时上限（秒）
+    """
+
+    def __init__(self, max_attempts: int = 1, base_delay: float = 0.5, max_delay: float = 4.0,
+                 budget: Optional[float] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def backoff(self, attempt: int) -> float:
+        """
+        第attempt次失败后的等待时间（full jitter）
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+# 不重试：用于登录、打卡等非幂等接口
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+# 查询类接口的默认重试策略
+READ_RETRY = RetryPolicy(
+    max_attempts=settings.UPSTREAM_RETRY_ATTEMPTS,
+    base_delay=settings.UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=settings.UPSTREAM_RETRY_MAX_DELAY,
+    budget=settings.UPSTREAM_RETRY_BUDGET
+)
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """获取（或创建）接口对应的熔断器"""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                endpoint,
+                failure_threshold=settings.UPSTREAM_BREAKER_THRESHOLD,
+                reset_timeout=settings.UPSTREAM_BREAKER_RESET
+            )
+            _breakers[endpoint] = breaker
+        return breaker
+
+
+def breaker_states() -> Dict[str, dict]:
+    """所有熔断器的当前状态"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.endpoint: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,255 @@
+"""
+日志保留与归档
+
+签到、操作、登录日志在数据库中只保留最近 LOG_RETENTION_DAYS 天，更早的日志:
+    1. 按月追加写入 LOG_ARCHIVE_DIR 下的压缩文件（如 sign_logs-2024-01.jsonl.gz，每行一条JSON）
+    2. 按天汇总到统计表（sign_daily_stats / operation_daily_stats / login_daily_stats）
+    3. 从日志表中删除
+归档文件先落盘再删除数据库记录，中途失败最多导致归档文件中出现重复行，不会丢失日志；
+汇总与删除在同一个事务中完成，统计数据不会重复累加。
+
+历史统计从汇总表读取，最近的数据仍从日志表实时统计，两者合并后返回。
+每天由 crontab.py 中的APScheduler定时执行 run_log_retention。
+"""
+import datetime
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+from app import LOG_DB_FILE, SIGN_DB_FILE, logger
+from app.utils.db import connect
+from config import settings
+
+# (日志表, 数据库文件, 时间列, 汇总表, 汇总维度)
+RETENTION_TABLES = [
+    ("sign_logs", SIGN_DB_FILE, "sign_time", "sign_daily_stats", ("username", "sign_type", "status")),
+    ("operation_logs", LOG_DB_FILE, "operation_time", "operation_daily_stats", ("operation_type", "status")),
+    ("login_logs", LOG_DB_FILE, "login_time", "login_daily_stats", ("status",)),
+]
+
+
+def run_log_retention() -> Dict[str, int]:
+    """
+    归档并清理过期日志（同步，由定时任务在线程中执行）
+
+    :return: 各日志表归档的记录数
+    """
+    if settings.LOG_RETENTION_DAYS <= 0:
+        return {}
+
+    # 按整天截止，保证同一天的日志一次性汇总
+    today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = (today - datetime.timedelta(days=settings.LOG_RETENTION_DAYS)).timestamp()
+
+    summary = {}
+    for table, db_file, time_column, stats_table, dimensions in RETENTION_TABLES:
+        try:
+            summary[table] = _archive_table(table, db_file, time_column, stats_table, dimensions, cutoff)
+        except Exception as e:
+            logger.error(f"归档 {table} 失败: {str(e)}")
+
+    archived = {table: count for table, count in summary.items() if count}
+    if archived:
+        logger.info(f"日志归档完成: {archived}")
+    return summary
+
+
+def _archive_table(table: str, db_file: str, time_column: str, stats_table: str, dimensions: tuple, cutoff: float) -> int:
+    """分批归档一张日志表中早于cutoff的记录"""
+    batch_size = settings.LOG_RETENTION_BATCH
+    dimension_list = ", ".join(dimensions)
+    upsert_sql = f"""
+        INSERT INTO {stats_table} (day, {dimension_list}, count)
+        VALUES (?, {", ".join("?" for _ in dimensions)}, ?)
+        ON CONFLICT (day, {dimension_list}) DO UPDATE SET count = count + excluded.count
+    """
+    total = 0
+
+    while True:
+        conn = connect(db_file)
+        try:
+            result = conn.execute(
+                f"SELECT * FROM {table} WHERE {time_column} < ? ORDER BY {time_column}, id LIMIT ?",
+                (cutoff, batch_size)
+            )
+            columns = [description[0] for description in result.description]
+            rows = [dict(zip(columns, row)) for row in result.fetchall()]
+            if not rows:
+                return total
+
+            _write_archive(table, time_column, rows)
+
+            counts = Counter()
+            for row in rows:
+                day = datetime.date.fromtimestamp(row[time_column]).isoformat()
+                # 主键列中的NULL互不相等，统一转为空字符串才能正确累加
+                counts[(day,) + tuple(row[dimension] or "" for dimension in dimensions)] += 1
+
+            conn.executemany(upsert_sql, [key + (count,) for key, count in counts.items()])
+            conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row["id"],) for row in rows])
+            conn.commit()
+        finally:
+            conn.close()
+
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+
+def _write_archive(table: str, time_column: str, rows: list):
+    """按月追加写入压缩归档文件并落盘"""
+    os.makedirs(settings.LOG_ARCHIVE_DIR, exist_ok=True)
+
+    by_month = defaultdict(list)
+    for row in rows:
+        month = datetime.datetime.fromtimestamp(row[time_column]).strftime("%Y-%m")
+        by_month[month].append(row)
+
+    for month, month_rows in by_month.items():
+        path = os.path.join(settings.LOG_ARCHIVE_DIR, f"{table}-{month}.jsonl.gz")
+        # 每次追加一个新的gzip成员，gzip.open 读取时会自动连接
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+                for row in month_rows:
+                    archive.write((json.dumps(row, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def query_sign_stats(username: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                     sign_type: Optional[str] = None, status: Optional[str] = None) -> dict:
+    """
+    签到统计（同步，在数据库线程池中执行）
+
+    已归档的日期从 sign_daily_stats 读取，其余从 sign_logs 实时统计。
+
+    :param date_from: 开始日期 YYYY-MM-DD
+    :param date_to: 结束日期 YYYY-MM-DD（含当天）
+    :return: 总次数、成功率、今日次数、本月次数、日均次数
+    """
+    rows = _daily_status_counts(
+        SIGN_DB_FILE, "sign_logs", "sign_time", "sign_daily_stats", date_from, date_to,
+        {"sign_type": sign_type, "status": status}, username
+    )
+    return _summarize_counts(rows)
+
+
+def query_operation_stats(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                          operation_type: Optional[str] = None, status: Optional[str] = None) -> dict:
+    """
+    操作日志统计（同步，在数据库线程池中执行）
+
+    已归档的日期从 operation_daily_stats 读取，其余从 operation_logs 实时统计。
+    汇总表只保留操作类型和状态，因此不支持按用户名筛选。
+
+    :return: 总次数、成功率、今日次数、本月次数、日均次数
+    """
+    rows = _daily_status_counts(
+        LOG_DB_FILE, "operation_logs", "operation_time", "operation_daily_stats", date_from, date_to,
+        {"operation_type": operation_type, "status": status}
+    )
+    return _summarize_counts(rows)
+
+
+def query_login_stats(date_from: Optional[str] = None, date_to: Optional[str] = None, status: Optional[str] = None) -> dict:
+    """
+    登录日志统计（同步，在数据库线程池中执行）
+
+    已归档的日期从 login_daily_stats 读取，其余从 login_logs 实时统计。
+    汇总表只保留状态，因此不支持按用户名、用户ID筛选。
+
+    :return: 总次数、成功率、今日次数、本月次数、日均次数
+    """
+    rows = _daily_status_counts(
+        LOG_DB_FILE, "login_logs", "login_time", "login_daily_stats", date_from, date_to, {"status": status}
+    )
+    return _summarize_counts(rows)
+
+
+def _daily_status_counts(db_file: str, table: str, time_column: str, stats_table: str,
+                         date_from: Optional[str], date_to: Optional[str], filters: Dict[str, Optional[str]],
+                         username: Optional[str] = None) -> list:
+    """
+    按天、按状态合并汇总表和日志表中的记录数
+
+    :param filters: 等值筛选（汇总维度 -> 值），值为空或 "all" 时不筛选
+    :param username: 用户名模糊筛选，仅用于汇总维度中包含username的表
+    :return: [(day, status, count), ...]
+    """
+    stats_conditions, stats_params = "", []
+    log_conditions, log_params = "", []
+
+    if username and username.strip():
+        stats_conditions += " AND username LIKE ?"
+        log_conditions += " AND username LIKE ?"
+        stats_params.append(f"%{username.strip()}%")
+        log_params.append(f"%{username.strip()}%")
+    if date_from:
+        try:
+            log_params.append(datetime.datetime.strptime(date_from, "%Y-%m-%d").timestamp())
+            log_conditions += f" AND {time_column} >= ?"
+            stats_conditions += " AND day >= ?"
+            stats_params.append(date_from)
+        except ValueError:
+            pass
+    if date_to:
+        try:
+            log_params.append(datetime.datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59).timestamp())
+            log_conditions += f" AND {time_column} <= ?"
+            stats_conditions += " AND day <= ?"
+            stats_params.append(date_to)
+        except ValueError:
+            pass
+    for column, value in filters.items():
+        if value and value != "all":
+            stats_conditions += f" AND {column} = ?"
+            log_conditions += f" AND {column} = ?"
+            stats_params.append(value)
+            log_params.append(value)
+
+    conn = connect(db_file)
+    try:
+        return conn.execute(
+            f"""
+            SELECT day, status, SUM(count) FROM {stats_table} WHERE 1=1{stats_conditions} GROUP BY day, status
+            UNION ALL
+            SELECT date({time_column}, 'unixepoch', 'localtime') AS day, status, COUNT(*)
+            FROM {table} WHERE 1=1{log_conditions} GROUP BY day, status
+            """,
+            stats_params + log_params
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def _summarize_counts(rows: list) -> dict:
+    """由按天、按状态的记录数计算总次数、成功率、今日次数、本月次数和日均次数"""
+    today = datetime.date.today().isoformat()
+    total = success = today_count = month_count = 0
+    days = set()
+    for day, row_status, count in rows:
+        total += count
+        days.add(day)
+        if row_status == "成功":
+            success += count
+        if day == today:
+            today_count += count
+        if day[:7] == today[:7]:
+            month_count += count
+
+    # 日均按第一条到最后一条记录之间的天数计算（含首尾）
+    if days:
+        span = (datetime.date.fromisoformat(max(days)) - datetime.date.fromisoformat(min(days))).days + 1
+        avg_per_day = round(total / span, 2)
+    else:
+        avg_per_day = 0
+
+    return {
+        "total": total,
+        "success_rate": round(success / total * 100, 2) if total else 0,
+        "today": today_count,
+        "this_month": month_count,
+        "avg_per_day": avg_per_day,
+    }
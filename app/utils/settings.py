@@ -2,9 +2,9 @@
 设置辅助函数
 """
 import os
-import sqlite3
 
 from app import SET_DB_FILE
+from app.utils.db import connect
 
 
 def get_setting_from_db(key, default_value=None):
@@ -19,7 +19,7 @@ def get_setting_from_db(key, default_value=None):
             return default_value
             
         # 连接数据库
-        conn = sqlite3.connect(SET_DB_FILE)
+        conn = connect(SET_DB_FILE)
         cursor = conn.cursor()
         
         # 查询设置
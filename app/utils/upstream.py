@@ -0,0 +1,185 @@
+"""
+上游考勤API的共享HTTP客户端
+
+所有对考勤系统接口的请求都通过这里的连接池发出，避免每次请求都重新建立TCP/TLS连接。
+客户端在应用启动时创建、关闭时释放；定时任务在独立的事件循环中运行，会按事件循环各自持有一个客户端。
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from app import logger
+from app.utils import metrics
+from app.utils.host import build_api_url
+from app.utils.resilience import NO_RETRY, CircuitOpenError, RetryPolicy, get_breaker
+from config import settings
+
+# 每个事件循环对应一个客户端（httpx客户端不能跨事件循环使用）
+_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_clients_lock = threading.Lock()
+
+
+def _http2_available() -> bool:
+    """检查是否安装了HTTP/2依赖（httpx[http2]）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    """
+    根据配置创建带连接池的客户端
+    """
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(settings.UPSTREAM_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT)
+
+    http2 = settings.UPSTREAM_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("已开启UPSTREAM_HTTP2，但未安装h2依赖（pip install httpx[http2]），回退到HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def get_upstream_client() -> httpx.AsyncClient:
+    """
+    获取当前事件循环的共享客户端，不存在时自动创建
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None or client.is_closed:
+            client = _build_client()
+            _clients[loop] = client
+    return client
+
+
+async def init_upstream_client():
+    """
+    应用启动时预先创建客户端
+    """
+    get_upstream_client()
+    logger.info(
+        f"上游客户端已创建: 最大连接数 {settings.UPSTREAM_MAX_CONNECTIONS}, "
+        f"保活连接数 {settings.UPSTREAM_MAX_KEEPALIVE}, HTTP/2 {'开启' if settings.UPSTREAM_HTTP2 else '关闭'}"
+    )
+
+
+async def close_upstream_client():
+    """
+    关闭当前事件循环的客户端，释放连接池
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client: Optional[httpx.AsyncClient] = _clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+async def upstream_request(method: str, path: str, retry: RetryPolicy = NO_RETRY, **kwargs) -> httpx.Response:
+    """
+    向考勤API发送请求
+
+    每个接口路径对应一个熔断器，熔断期间直接抛出CircuitOpenError。
+    网络错误和5xx响应计为失败，并按重试策略退避重试；重试次数和总耗时都有上限。
+
+    :param method: 请求方法（GET/POST）
+    :param path: API路径，如 /AttendanceCard/GetYueTjList
+    :param retry: 重试策略，默认不重试（登录、打卡等非幂等接口）
+    :param kwargs: 透传给httpx的参数（headers、json、params、timeout等）
+    :return: httpx响应对象（重试用尽时返回最后一次的5xx响应）
+    """
+    return await _send(method, path, retry, False, **kwargs)
+
+
+@asynccontextmanager
+async def upstream_stream(method: str, path: str, retry: RetryPolicy = NO_RETRY, **kwargs) -> AsyncIterator[httpx.Response]:
+    """
+    以流式方式请求考勤API，响应体需在上下文中通过 aiter_bytes/aiter_text 读取
+
+    熔断和重试只作用于获取响应头阶段；退出上下文时关闭响应，提前结束读取也会释放连接。
+
+    用法:
+        async with upstream_stream("POST", "/AttendanceCard/GetAttCheckinoutList", json=data) as response:
+            async for chunk in response.aiter_text():
+                ...
+    """
+    response = await _send(method, path, retry, True, **kwargs)
+    try:
+        yield response
+    finally:
+        await response.aclose()
+
+
+async def _send(method: str, path: str, retry: RetryPolicy, stream: bool, **kwargs) -> httpx.Response:
+    """
+    带熔断和重试的请求发送
+    """
+    client = get_upstream_client()
+    breaker = get_breaker(path)
+    url = build_api_url(path)
+
+    timeout = kwargs.pop("timeout", settings.UPSTREAM_TIMEOUT)
+    deadline = time.monotonic() + retry.budget if retry.budget else None
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            metrics.record_request(path, 0, metrics.REJECTED)
+            raise
+
+        # 单次超时不超过剩余预算
+        attempt_timeout = timeout
+        if deadline is not None:
+            attempt_timeout = max(min(timeout, deadline - time.monotonic()), 0.1)
+
+        started = time.monotonic()
+        try:
+            request = client.build_request(method, url, timeout=attempt_timeout, **kwargs)
+            response = await client.send(request, stream=stream)
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            outcome = metrics.TIMEOUT if isinstance(e, httpx.TimeoutException) else metrics.NETWORK_ERROR
+            metrics.record_request(path, time.monotonic() - started, outcome)
+            error, response = e, None
+        except BaseException:
+            # 非网络错误（如请求被取消）不计入熔断统计，但要释放探测名额
+            breaker.release_probe()
+            raise
+        else:
+            # 流式请求只统计到收到响应头为止
+            metrics.record_request(path, time.monotonic() - started, metrics.outcome_for_status(response.status_code))
+            if response.status_code < 500:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            error = None
+
+        # 判断是否还能重试
+        delay = retry.backoff(attempt)
+        out_of_budget = deadline is not None and time.monotonic() + delay >= deadline
+        if attempt >= retry.max_attempts or out_of_budget:
+            if error is not None:
+                raise error
+            return response
+
+        if response is not None and stream:
+            # 流式响应未读取的连接需要先释放
+            await response.aclose()
+
+        metrics.record_retry(path)
+        logger.warning(f"上游请求 {path} 第{attempt}次失败（{error or response.status_code}），{delay:.2f}秒后重试")
+        await asyncio.sleep(delay)
@@ -0,0 +1,217 @@
+"""
+单位工作日/节假日日历
+
+节假日安排对同一单位（UNIT_CODE）的所有用户都相同，不需要每个用户各自下载整月考勤明细来判断。
+这里按单位、按月解析一次（每天刷新一次），结果保存在内存并持久化到set.db。
+上游不可用时按旧数据或周一至周五判断，该结果缓存 WORKDAY_FAILURE_TTL 秒，期间不再请求上游。
+"""
+import datetime
+import threading
+from typing import Dict, Optional, Tuple
+
+from app import SET_DB_FILE, USER_DB_FILE, logger
+from app.auth.utils import get_mobile_user_agent
+from app.utils.cache import TTLCache
+from app.utils.concurrency import SingleFlight
+from app.utils.db import connect, run_in_db
+from app.utils.resilience import NO_RETRY
+from config import settings
+
+# (unit_code, "YYYY-MM-DD") -> 是否工作日
+_days: Dict[Tuple[str, str], bool] = {}
+# (unit_code, year, month) -> 解析日期，当天解析过的月份直接使用内存结果
+_resolved_on: Dict[Tuple[str, int, int], datetime.date] = {}
+_lock = threading.Lock()
+_single_flight = SingleFlight()
+# (unit_code, "YYYY-MM-DD") -> 上游不可用时的兜底判断结果，短期缓存
+_fallback_cache = TTLCache(maxsize=64)
+
+
+def _unit_code() -> str:
+    return settings.UNIT_CODE or ""
+
+
+def _lookup(unit_code: str, day: datetime.date) -> Optional[bool]:
+    """从内存读取，只有当天解析过的月份才认为有效"""
+    with _lock:
+        if _resolved_on.get((unit_code, day.year, day.month)) != datetime.date.today():
+            return None
+        return _days.get((unit_code, day.isoformat()))
+
+
+def _stale_lookup(unit_code: str, day: datetime.date) -> Optional[bool]:
+    """读取内存或数据库中的旧数据，上游不可用时兜底"""
+    with _lock:
+        workday = _days.get((unit_code, day.isoformat()))
+    if workday is not None:
+        return workday
+
+    conn = connect(SET_DB_FILE)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT is_workday FROM workday_calendar WHERE unit_code = ? AND day = ?",
+            (unit_code, day.isoformat())
+        )
+        result = cursor.fetchone()
+        return bool(result[0]) if result else None
+    except Exception as e:
+        logger.error(f"读取工作日日历失败: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+
+def _remember(unit_code: str, year: int, month: int, days: Dict[str, bool], resolved_on: datetime.date):
+    with _lock:
+        for day_str, workday in days.items():
+            _days[(unit_code, day_str)] = workday
+        _resolved_on[(unit_code, year, month)] = resolved_on
+
+
+def _load_from_db(unit_code: str, year: int, month: int) -> bool:
+    """
+    从set.db加载今天已经解析过的月份
+
+    :return: 是否加载成功
+    """
+    today_start = datetime.datetime.combine(datetime.date.today(), datetime.time.min).timestamp()
+    conn = connect(SET_DB_FILE)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT day, is_workday FROM workday_calendar WHERE unit_code = ? AND day LIKE ? AND updated_at >= ?",
+            (unit_code, f"{year:04d}-{month:02d}-%", today_start)
+        )
+        rows = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"读取工作日日历失败: {str(e)}")
+        return False
+    finally:
+        conn.close()
+
+    if not rows:
+        return False
+
+    _remember(unit_code, year, month, {day: bool(workday) for day, workday in rows}, datetime.date.today())
+    return True
+
+
+def _save_to_db(unit_code: str, days: Dict[str, Tuple[bool, str]]):
+    """持久化一个月的解析结果"""
+    now = datetime.datetime.now().timestamp()
+    conn = connect(SET_DB_FILE)
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO workday_calendar (unit_code, day, is_workday, holiday_name, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(unit_code, day, 1 if workday else 0, name, now) for day, (workday, name) in days.items()]
+        )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"保存工作日日历失败: {str(e)}")
+    finally:
+        conn.close()
+
+
+def _probe_user_id() -> Optional[str]:
+    """
+    找一个本单位的已登录用户，用于查询节假日安排
+    """
+    conn = connect(USER_DB_FILE)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT user_id FROM users WHERE user_id != 'admin' AND deleted = 0 ORDER BY last_activity DESC LIMIT 1"
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+    except Exception as e:
+        logger.error(f"查询日历探测用户失败: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+
+async def _resolve_month(unit_code: str, year: int, month: int, headers: dict, user_id) -> bool:
+    """
+    从上游解析一个月的工作日安排
+
+    :return: 是否解析成功
+    """
+    # 延迟导入，避免与路由模块循环导入
+    from app.routes.statistics import GetYueTjList
+
+    if not user_id:
+        user_id = await run_in_db(_probe_user_id)
+    if not user_id:
+        logger.warning("没有可用于查询节假日安排的用户")
+        return False
+
+    # 后台判断不值得等待重试，失败后由调用方兜底并缓存
+    yue_tj_list = await GetYueTjList(
+        headers, user_id, str(year), str(month).zfill(2), retry=NO_RETRY, timeout=settings.WORKDAY_LOOKUP_TIMEOUT
+    )
+    if not yue_tj_list:
+        return False
+
+    # 与原逻辑一致：列表按日期顺序排列，第N项对应N号
+    days = {}
+    for index, item in enumerate(yue_tj_list):
+        try:
+            day_str = datetime.date(year, month, index + 1).isoformat()
+        except ValueError:
+            break
+        days[day_str] = (item.get("isholiday") == 0, item.get("jjr") or "")
+
+    _remember(unit_code, year, month, {day: workday for day, (workday, _) in days.items()}, datetime.date.today())
+    await run_in_db(_save_to_db, unit_code, days)
+    logger.info(f"工作日日历已更新: {unit_code} {year}-{str(month).zfill(2)}")
+    return True
+
+
+async def is_workday(date: Optional[datetime.date] = None, headers: Optional[dict] = None, user_id=None) -> bool:
+    """
+    判断某天是否为工作日
+
+    同一单位每月每天最多成功请求一次上游；上游不可用时使用旧数据，再不行按周一到周五判断，
+    兜底结果缓存 WORKDAY_FAILURE_TTL 秒，避免每次调用都重新请求失败的上游。
+
+    :param date: 日期，默认今天
+    :param headers: 需要请求上游时使用的请求头
+    :param user_id: 需要请求上游时使用的用户ID，默认取最近活跃的用户
+    :return: 是否工作日
+    """
+    day = date or datetime.date.today()
+    unit_code = _unit_code()
+
+    workday = _lookup(unit_code, day)
+    if workday is not None:
+        return workday
+
+    fallback_key = (unit_code, day.isoformat())
+    workday = _fallback_cache.get(fallback_key)
+    if workday is not None:
+        return workday
+
+    if await run_in_db(_load_from_db, unit_code, day.year, day.month):
+        workday = _lookup(unit_code, day)
+        if workday is not None:
+            return workday
+
+    headers = headers or {"User-Agent": get_mobile_user_agent()}
+    try:
+        await _single_flight.do((unit_code, day.year, day.month), _resolve_month, unit_code, day.year, day.month, headers, user_id)
+    except Exception as e:
+        logger.error(f"解析工作日日历失败: {str(e)}")
+
+    workday = _lookup(unit_code, day)
+    if workday is not None:
+        return workday
+
+    workday = await run_in_db(_stale_lookup, unit_code, day)
+    if workday is None:
+        # 兜底：周一至周五视为工作日
+        workday = day.weekday() < 5
+    _fallback_cache.set(fallback_key, workday, ttl=settings.WORKDAY_FAILURE_TTL)
+    return workday
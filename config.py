@@ -25,8 +25,12 @@ def get_setting_from_db(key, default=None):
         if not os.path.exists("data"):
             return default
         
-        # 数据库文件
+        # 数据库文件（single模式下所有表都在同一个文件中，首次启动迁移前仍从set.db读取）
         db_file = os.path.join("data", "set.db")
+        if os.getenv("DB_MODE", "split").lower() == "single":
+            single_db_file = os.getenv("DB_FILE", os.path.join("data", "workclock.db"))
+            if os.path.exists(single_db_file) or not os.path.exists(db_file):
+                db_file = single_db_file
         
         # 如果数据库文件不存在，返回默认值
         if not os.path.exists(db_file):
@@ -68,7 +72,81 @@ class Settings(BaseSettings):
     # 打卡配置 - 从数据库获取
     UNIT_CODE: Optional[str] = None
     REAL_ADDRESS: Optional[str] = None
-    
+
+    # 上游考勤API连接池配置（可通过环境变量覆盖）
+    UPSTREAM_MAX_CONNECTIONS: int = 100      # 最大并发连接数
+    UPSTREAM_MAX_KEEPALIVE: int = 20         # 保持活跃的空闲连接数
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保活时间（秒）
+    UPSTREAM_TIMEOUT: float = 10.0           # 默认请求超时（秒）
+    UPSTREAM_CONNECT_TIMEOUT: float = 5.0    # 建立连接超时（秒）
+    UPSTREAM_HTTP2: bool = False             # 是否启用HTTP/2（需安装 httpx[http2]）
+
+    # 上游重试与熔断配置
+    UPSTREAM_RETRY_ATTEMPTS: int = 3         # 查询类接口最大尝试次数（含首次）
+    UPSTREAM_RETRY_BASE_DELAY: float = 0.5   # 指数退避基础时间（秒）
+    UPSTREAM_RETRY_MAX_DELAY: float = 4.0    # 单次退避上限（秒）
+    UPSTREAM_RETRY_BUDGET: float = 20.0      # 单次调用（含全部重试）总耗时上限（秒）
+    UPSTREAM_BREAKER_THRESHOLD: int = 5      # 连续失败多少次后熔断
+    UPSTREAM_BREAKER_RESET: float = 30.0     # 熔断后多久放行探测请求（秒）
+
+    # 月度考勤明细（GetYueTjList）缓存配置
+    YUE_TJ_CACHE_SIZE: int = 2048            # 最多缓存的（用户, 年, 月）条目数
+    YUE_TJ_CURRENT_MONTH_TTL: float = 300.0  # 当月数据缓存时间（秒），历史月份永久缓存
+    WORKDAY_LOOKUP_TIMEOUT: float = 5.0      # 查询节假日安排的超时（秒），不重试
+    WORKDAY_FAILURE_TTL: float = 300.0       # 节假日安排查询失败后，按旧数据或周一至周五判断的结果缓存时间（秒）
+
+    # 数据库存储模式：split 按业务分为五个文件（默认）；single 所有表存放在同一个文件中，可直接跨表JOIN
+    # 切换到single后首次启动会自动把原有五个文件的数据迁移到 DB_FILE，原文件重命名为 *.migrated
+    DB_MODE: str = os.getenv("DB_MODE", "split").lower()
+    DB_FILE: str = os.getenv("DB_FILE", "data/workclock.db")  # single模式下的数据库文件
+
+    # SQLite连接池配置
+    DB_POOL_SIZE: int = 8                    # 每个数据库文件保留的空闲连接数
+    DB_BUSY_TIMEOUT: int = 5000              # 数据库被锁时的等待时间（毫秒）
+    DB_CACHE_SIZE_KB: int = 8192             # 每个连接的页缓存大小（KB）
+    DB_STATEMENT_CACHE: int = 128            # 每个连接缓存的预编译语句数
+    DB_EXECUTOR_WORKERS: int = 8             # 执行数据库操作的专用线程数
+
+    # 日志批量写入配置
+    LOG_QUEUE_SIZE: int = 10000              # 待写入日志队列上限，队列满时直接同步写入
+    LOG_BATCH_SIZE: int = 200                # 攒够多少条日志写入一次
+    LOG_FLUSH_INTERVAL: float = 1.0          # 日志最长等待多久写入（秒）
+    LOG_COUNT_CACHE_TTL: float = 30.0        # 日志查询页总记录数的缓存时间（秒）
+
+    # 登录会话缓存配置（open_id -> 用户信息）
+    SESSION_CACHE_SIZE: int = 10000          # 最多缓存的会话数
+    SESSION_CACHE_TTL: float = 300.0         # 有效会话的缓存时间（秒）
+    SESSION_NEGATIVE_TTL: float = 30.0       # 无效open_id的缓存时间（秒），避免伪造Cookie反复查库
+
+    # 登录会话配置（sessions表）
+    SESSION_TTL: int = 30 * 24 * 3600        # 登录会话有效期（秒）
+    SESSION_MAX_PER_USER: int = 5            # 每个用户最多同时登录的设备数，超出时最早的会话失效
+    SESSION_SWEEP_MINUTES: int = 60          # 清除过期会话的间隔（分钟）
+
+    # 会话模式：db 为随机open_id并查库校验；token 为普通用户签发COOKIE_SECRET签名的令牌，校验不查库
+    SESSION_MODE: str = os.getenv("SESSION_MODE", "db").lower()
+    SESSION_TOKEN_TTL: int = 7 * 24 * 3600   # 会话令牌有效期（秒）
+    ACTIVITY_FLUSH_INTERVAL: float = 30.0    # 用户最后活跃时间写入数据库的间隔（秒）
+
+    # 登录限流配置（0表示不限制），压测时可将 LOGIN_RATE_PER_IP 设为0
+    LOGIN_RATE_PER_IP: int = 20              # 每个IP每分钟最多登录尝试次数
+    LOGIN_RATE_PER_ACCOUNT: int = 5          # 同一IP下每个账号每分钟最多登录尝试次数
+    LOGIN_FAILURES_PER_ACCOUNT: int = 30     # 每个账号每10分钟最多登录失败次数（所有IP合计）
+    LOGIN_MAX_CONCURRENCY: int = 10          # 同时进行的上游登录请求数
+    LOGIN_QUEUE_TIMEOUT: float = 5.0         # 等待登录并发名额的最长时间（秒）
+    # 反向代理地址（逗号分隔，支持CIDR），来自这些地址的请求按 X-Forwarded-For / X-Real-IP 识别客户端IP
+    TRUSTED_PROXIES: str = os.getenv("TRUSTED_PROXIES", "")
+    ROSTER_CACHE_TTL: float = 300.0          # 特殊打卡登录使用的部门通讯录缓存时间（秒）
+
+    # 管理后台统计信息缓存时间（秒），用户增加和设置修改会立即刷新
+    ADMIN_STATS_TTL: float = 15.0
+
+    # 日志保留与归档配置
+    LOG_RETENTION_DAYS: int = 180            # 日志在数据库中保留的天数，更早的归档到压缩文件并汇总到每日统计表，0表示不清理
+    LOG_ARCHIVE_DIR: str = "data/archive"    # 归档文件目录
+    LOG_RETENTION_BATCH: int = 5000          # 每批归档的记录数
+    LOG_RETENTION_TIME: str = "03:30"        # 每天执行归档的时间
+
     # 日志配置
     LOG_LEVEL: Optional[str] = "INFO"  # 默认INFO级别
     
@@ -88,7 +166,7 @@ class Settings(BaseSettings):
     STATIC_DIR: str = "app/static"
     TEMPLATES_DIR: str = "app/templates"
     
-    # Cookie密钥，用于管理员验证
+    # Cookie密钥，用于签名会话令牌（SESSION_MODE=token 时应固定设置，否则重启后需重新登录）
     COOKIE_SECRET: str = os.getenv("COOKIE_SECRET", secrets.token_hex(16))
 
     # 定义打卡时间
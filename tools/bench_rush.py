@@ -0,0 +1,284 @@
+"""
+早高峰压测
+
+模拟 08:44-08:54 的打卡高峰：大量用户同时打开首页、手动打卡、查看月度统计和重新登录，
+同时可选地在本进程中并发执行定时打卡任务（与 APScheduler 一样在线程池中运行 sync_auto_sign，
+默认去掉打卡前10-40秒的随机等待，否则 cron 的延迟主要是这段等待，加 --sign-jitter 保留）。
+按路由统计吞吐量、p50/p95/p99 延迟和错误率，所有性能相关的改动都应以此为基准对比。
+
+准备:
+    1. python tools/mock_api.py --users 500          # 启动模拟考勤API（127.0.0.1:8001）
+    2. 初始化设置中API主机填写 127.0.0.1:8001，然后 python run.py
+
+用法:
+    python tools/bench_rush.py --users 200 --concurrency 100 --duration 60
+    python tools/bench_rush.py --mix index=6,sign=2,stats=3,login=1 --scheduled-jobs 9 --output bench_output.txt
+
+注意:
+    /sign 只在打卡时间段（06:00-09:59、17:00-23:59）内才会请求上游，其他时间只会返回"不在打卡时间段"，
+    压测打卡路径时请在对应时间段内运行（或使用 faketime 等工具调整服务器时间）。
+    所有虚拟用户都来自同一个IP，启动服务时需设置 LOGIN_RATE_PER_IP=0 关闭按IP的登录限流，
+    否则预热登录会被大量返回429。
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+
+ROUTES = {
+    "index": ("GET", "/"),
+    "sign": ("POST", "/sign"),
+    "stats": ("POST", "/stats/monthly"),
+    "login": ("POST", "/auth/login"),
+}
+
+
+class RouteStats:
+    """单个路由的延迟和错误统计"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.failures = 0
+        self.error_samples: Dict[str, int] = {}
+
+    def record(self, latency: float, error: Optional[str] = None, failed: bool = False):
+        self.latencies.append(latency)
+        if error:
+            self.errors += 1
+            self.error_samples[error] = self.error_samples.get(error, 0) + 1
+        elif failed:
+            self.failures += 1
+
+    def summary(self, elapsed: float) -> dict:
+        count = len(self.latencies)
+        ordered = sorted(self.latencies)
+        return {
+            "count": count,
+            "rps": round(count / elapsed, 2) if elapsed else 0,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0,
+            "error_rate": round(self.errors / count, 4) if count else 0,
+            "failure_rate": round(self.failures / count, 4) if count else 0,
+            "errors": self.error_samples,
+        }
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """最近秩法计算百分位（输入已排序）"""
+    if not ordered:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """解析路由权重，如 index=6,sign=2,stats=3,login=1"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise argparse.ArgumentTypeError(f"未知路由: {name}，可选 {', '.join(ROUTES)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    """一个模拟用户：持有自己的登录Cookie"""
+
+    def __init__(self, phone: str, password: str, user_id: Optional[int]):
+        self.phone = phone
+        self.password = password
+        self.user_id = user_id
+        self.open_id: Optional[str] = None
+
+
+async def call_route(client: httpx.AsyncClient, name: str, user: VirtualUser, stats: Dict[str, RouteStats]):
+    """发送一次请求并记录结果"""
+    method, path = ROUTES[name]
+    # 直接设置Cookie头，避免共享客户端的Cookie容器混用不同用户的登录状态
+    headers = {"Cookie": f"open_id={user.open_id}"} if user.open_id else None
+    kwargs = {}
+    if name == "sign":
+        kwargs["json"] = {"attendance": 0}
+    elif name == "stats":
+        kwargs["json"] = {"month": datetime.datetime.now().month}
+    elif name == "login":
+        kwargs["json"] = {"phone": user.phone, "password": user.password}
+
+    start = time.perf_counter()
+    error = None
+    failed = False
+    try:
+        response = await client.request(method, path, headers=headers, **kwargs)
+        latency = time.perf_counter() - start
+
+        if name == "login":
+            # 登录成功返回303并设置open_id
+            open_id = response.cookies.get("open_id")
+            if response.status_code == 303 and open_id:
+                user.open_id = open_id
+            else:
+                error = f"HTTP {response.status_code}"
+        elif response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+        elif name == "index":
+            # 重定向说明系统未初始化或会话无效
+            failed = response.status_code >= 300
+        elif name in ("sign", "stats"):
+            # 业务失败（如不在打卡时间段）单独统计，不计入错误率
+            failed = not response.json().get("success", False)
+    except Exception as e:
+        latency = time.perf_counter() - start
+        error = type(e).__name__
+
+    stats.setdefault(name, RouteStats()).record(latency, error, failed)
+
+
+async def fetch_accounts(mock_url: str, count: int, password: str) -> List[VirtualUser]:
+    """从模拟考勤API获取账号，不可用时按模拟服务的规则生成"""
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(f"{mock_url}/__mock__/users", params={"limit": count})
+            return [VirtualUser(item["phone"], item["password"], item["userid"]) for item in response.json()]
+    except Exception:
+        return [VirtualUser(f"138{index:08d}", password, 1000 + index) for index in range(1, count + 1)]
+
+
+def run_scheduled_jobs(user_ids: List[int], stats: Dict[str, RouteStats], workers: int, jitter: bool = False):
+    """
+    在线程池中执行定时打卡任务（与APScheduler默认的10线程线程池一致）
+
+    需在项目根目录运行，使用与服务相同的数据库和配置。
+    jitter 为 False 时不执行打卡前的随机等待，cron 延迟只反映实际的查询和打卡耗时。
+    """
+    sys.path.insert(0, os.getcwd())
+    from app.routes import crontab
+    from app.routes.crontab import sync_auto_sign
+
+    if not jitter:
+        crontab.SIGN_DELAY_RANGE = (0, 0)
+
+    def job(user_id):
+        start = time.perf_counter()
+        error = None
+        try:
+            sync_auto_sign(str(user_id))
+        except Exception as e:
+            error = type(e).__name__
+        stats.setdefault("cron", RouteStats()).record(time.perf_counter() - start, error)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(job, user_ids))
+
+
+async def run(args):
+    now = datetime.datetime.now().time()
+    if not (datetime.time(6) <= now <= datetime.time(9, 59) or datetime.time(17) <= now):
+        print("提示: 当前不在打卡时间段，/sign 不会请求上游，只能测到提前返回的路径")
+
+    rng = random.Random(args.seed)
+    users = await fetch_accounts(args.mock_url, args.users, args.password)
+    stats: Dict[str, RouteStats] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits,
+                                 follow_redirects=False) as client:
+        # 预热：所有用户登录，登录耗时单独统计
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def login(user):
+            async with semaphore:
+                await call_route(client, "login", user, stats)
+
+        print(f"登录 {len(users)} 个用户...")
+        login_started = time.perf_counter()
+        await asyncio.gather(*(login(user) for user in users))
+        login_elapsed = time.perf_counter() - login_started
+        login_stats = stats.pop("login", RouteStats())
+        logged_in = [user for user in users if user.open_id]
+        if not logged_in:
+            print("没有用户登录成功，请检查服务和模拟考勤API是否已启动")
+            return
+        print(f"登录成功 {len(logged_in)}/{len(users)}，开始压测 {args.duration} 秒，并发 {args.concurrency}")
+
+        names = [name for name, weight in args.mix.items() for _ in range(weight)]
+        deadline = time.perf_counter() + args.duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await call_route(client, rng.choice(names), rng.choice(logged_in), stats)
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+        if args.scheduled_jobs:
+            job_users = [user.user_id for user in logged_in[:args.scheduled_jobs]]
+            tasks.append(asyncio.create_task(
+                asyncio.to_thread(run_scheduled_jobs, job_users, stats, 10, args.sign_jitter)
+            ))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "warmup_login": login_stats.summary(login_elapsed),
+        "routes": {name: route.summary(elapsed) for name, route in sorted(stats.items())},
+    }
+    print_report(report, elapsed)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+def print_report(report: dict, elapsed: float):
+    header = f"{'路由':<10}{'请求数':>8}{'RPS':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'错误率':>8}{'失败率':>8}"
+    print(f"\n压测时长 {elapsed:.1f} 秒")
+    print(header)
+    rows = [("login*", report["warmup_login"])] + list(report["routes"].items())
+    for name, row in rows:
+        print(f"{name:<10}{row['count']:>8}{row['rps']:>9}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['p99_ms']:>10}{row['max_ms']:>10}{row['error_rate']:>8.2%}{row['failure_rate']:>8.2%}")
+    print("login* 为预热阶段的登录；失败率指接口返回 success=false（如不在打卡时间段）")
+    for name, row in report["routes"].items():
+        if row["errors"]:
+            print(f"{name} 错误: {row['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="早高峰压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="被测服务地址")
+    parser.add_argument("--mock-url", default="http://127.0.0.1:8001", help="模拟考勤API地址（用于获取账号）")
+    parser.add_argument("--users", type=int, default=100, help="模拟用户数量")
+    parser.add_argument("--password", default="123456", help="模拟账号密码")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发请求数")
+    parser.add_argument("--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单个请求超时（秒）")
+    parser.add_argument("--mix", type=parse_mix, default="index=6,sign=2,stats=3,login=1",
+                        help="路由权重，可选 index/sign/stats/login")
+    parser.add_argument("--scheduled-jobs", type=int, default=0,
+                        help="同时执行的定时打卡任务数（在本进程线程池中运行 sync_auto_sign）")
+    parser.add_argument("--sign-jitter", action="store_true",
+                        help="定时打卡保留打卡前10-40秒的随机等待（默认去掉，只测实际耗时）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，保证请求序列可复现")
+    parser.add_argument("--output", help="将结果以JSON格式保存到文件")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+本地模拟考勤API服务
+
+在没有真实考勤系统的环境下（开发、压测、性能分析）替代上游接口，默认监听 127.0.0.1:8001，
+即 build_api_url 在未配置API主机时使用的地址；初始化时将API主机设置为 127.0.0.1:8001 也可指向这里。
+
+实现的接口:
+    /Apps/wxLogin, /Apps/AppIndex, /Apps/getUserInfoList, /Apps/getUserInfo,
+    /AttendanceCard/GetYueTjList, /AttendanceCard/GetAttCheckinoutList,
+    /AttendanceCard/get_Attendance_Statistics, /AttendanceCard/SaveAttCheckinout
+
+用法:
+    python tools/mock_api.py --users 500 --latency lognormal:80:0.5 --error-rate 0.01
+    python tools/mock_api.py --endpoint-latency /AttendanceCard/GetAttCheckinoutList=uniform:200:800
+
+延迟分布格式（单位毫秒）:
+    fixed:50            固定50ms
+    uniform:20:200      20~200ms均匀分布
+    normal:100:30       均值100ms、标准差30ms的正态分布
+    lognormal:80:0.5    中位数80ms、sigma为0.5的对数正态分布（长尾，最接近真实情况）
+
+模拟账号: 手机号从 13800000001 起按用户序号递增，密码默认 123456；/__mock__/users 可列出账号。
+"""
+import argparse
+import asyncio
+import calendar
+import datetime
+import math
+import random
+import re
+import secrets
+import threading
+from typing import Callable, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# 与 app/routes/admin/privilege.py 中的部门保持一致
+DEPARTMENTS = {
+    "3": "院领导",
+    "7": "政治部",
+    "11": "办公室",
+    "10": "综合业务部",
+    "8": "第一检察部",
+    "9": "第二检察部",
+    "4": "第三检察部",
+    "5": "第四检察部",
+    "12": "第五检察部",
+    "15": "未成年人检察组",
+    "13": "检委办",
+}
+
+POSITIONS = ["检察官", "检察官助理", "书记员", "司法警察", "综合文秘"]
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+GIVEN_NAMES = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华"
+
+# 固定节假日（月, 日）-> 名称
+HOLIDAYS = {
+    (1, 1): "元旦",
+    (5, 1): "劳动节", (5, 2): "劳动节", (5, 3): "劳动节",
+    (10, 1): "国庆节", (10, 2): "国庆节", (10, 3): "国庆节", (10, 4): "国庆节",
+    (10, 5): "国庆节", (10, 6): "国庆节", (10, 7): "国庆节",
+}
+
+ADDRESS = "模拟单位办公楼"
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    解析延迟分布，返回按秒计的采样函数
+    """
+    name, *args = spec.split(":")
+    values = [float(arg) for arg in args]
+    if name == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if name == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if name == "normal" and len(values) == 2:
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0) / 1000
+    if name == "lognormal" and len(values) == 2:
+        mu = math.log(max(values[0], 0.001))
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    raise argparse.ArgumentTypeError(f"无法识别的延迟分布: {spec}")
+
+
+def is_workday(date: datetime.date) -> bool:
+    return date.weekday() < 5 and (date.month, date.day) not in HOLIDAYS
+
+
+def to_ms(moment: datetime.datetime) -> int:
+    return int(moment.timestamp() * 1000)
+
+
+class MockState:
+    """
+    模拟数据：用户、会话和打卡记录
+
+    用户的历史打卡记录在首次访问时按用户ID确定性生成，记录按时间倒序保存（与真实接口一致）。
+    """
+
+    def __init__(self, user_count: int, history_days: int, password: str, seed: int):
+        self.password = password
+        self.history_days = history_days
+        self.seed = seed
+        self.users: Dict[int, dict] = {}
+        self.accounts: Dict[str, int] = {}
+        self.sessions: Dict[str, int] = {}
+        self.records: Dict[int, List[dict]] = {}
+        self.next_aid = 1
+        self.lock = threading.Lock()
+
+        rng = random.Random(seed)
+        dep_ids = list(DEPARTMENTS)
+        for index in range(1, user_count + 1):
+            user_id = 1000 + index
+            dep_id = dep_ids[index % len(dep_ids)]
+            self.users[user_id] = {
+                "userid": user_id,
+                "username": rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_NAMES) for _ in range(rng.randint(1, 2))),
+                "depid": dep_id,
+                "dep": DEPARTMENTS[dep_id],
+                "zw": rng.choice(POSITIONS),
+                "phone": f"138{index:08d}",
+            }
+            self.accounts[self.users[user_id]["phone"]] = user_id
+
+    def get_records(self, user_id: int) -> List[dict]:
+        """获取用户打卡记录（倒序），不存在时生成历史记录"""
+        with self.lock:
+            records = self.records.get(user_id)
+            if records is None:
+                records = self._generate_history(user_id)
+                self.records[user_id] = records
+            return records
+
+    def _generate_history(self, user_id: int) -> List[dict]:
+        rng = random.Random(self.seed * 100003 + user_id)
+        today = datetime.date.today()
+        records = []
+        for offset in range(self.history_days, 0, -1):
+            date = today - datetime.timedelta(days=offset)
+            if not is_workday(date) or rng.random() < 0.03:
+                continue
+            # 少量迟到、早退和缺卡
+            morning = datetime.datetime.combine(date, datetime.time(8, 30)) + datetime.timedelta(minutes=rng.gauss(0, 12))
+            evening = datetime.datetime.combine(date, datetime.time(17, 20)) + datetime.timedelta(minutes=rng.gauss(0, 15))
+            if rng.random() > 0.02:
+                records.append(self._make_record(user_id, morning, 1))
+            if rng.random() > 0.02:
+                records.append(self._make_record(user_id, evening, 2))
+        records.reverse()
+        return records
+
+    def _make_record(self, user_id: int, moment: datetime.datetime, clock_type: int) -> dict:
+        aid = self.next_aid
+        self.next_aid += 1
+        return {
+            "Aid": aid,
+            "userID": user_id,
+            "userDepID": int(self.users[user_id]["depid"]) if user_id in self.users else 0,
+            "clockTime": f"/Date({to_ms(moment)})/",
+            "clockType": clock_type,
+            "realaddress": ADDRESS,
+            "administratorChangesRemark": ADDRESS,
+            "iSDelete": 0,
+        }
+
+    def add_record(self, user_id: int, moment: datetime.datetime, clock_type: int):
+        records = self.get_records(user_id)
+        with self.lock:
+            records.insert(0, self._make_record(user_id, moment, clock_type))
+
+    def month_records(self, user_id: int, year: int, month: int) -> Dict[datetime.date, Dict[int, List[datetime.datetime]]]:
+        """按日期和打卡类型整理某月的打卡时间"""
+        start = to_ms(datetime.datetime(year, month, 1))
+        end = to_ms(datetime.datetime(year + month // 12, month % 12 + 1, 1))
+        days: Dict[datetime.date, Dict[int, List[datetime.datetime]]] = {}
+        for record in self.get_records(user_id):
+            timestamp = int(record["clockTime"][6:-2])
+            if timestamp >= end:
+                continue
+            if timestamp < start:
+                break
+            moment = datetime.datetime.fromtimestamp(timestamp / 1000)
+            days.setdefault(moment.date(), {}).setdefault(record["clockType"], []).append(moment)
+        return days
+
+
+def parse_year_month(year: Optional[str], month: Optional[str]):
+    """解析 "2024年" / "04月" 格式的年月"""
+    now = datetime.datetime.now()
+    year_value = int(re.sub(r"\D", "", str(year or "")) or now.year)
+    month_value = int(re.sub(r"\D", "", str(month or "")) or now.month)
+    return year_value, month_value
+
+
+def create_app(state: MockState, latency: Callable[[random.Random], float],
+               endpoint_latency: Dict[str, Callable[[random.Random], float]],
+               error_rate: float, hang_rate: float, hang_seconds: float) -> FastAPI:
+    app = FastAPI(title="模拟考勤API")
+    rng = random.Random()
+
+    @app.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        """模拟延迟、错误和挂起"""
+        sampler = endpoint_latency.get(request.url.path, latency)
+        await asyncio.sleep(sampler(rng))
+
+        roll = rng.random()
+        if roll < hang_rate:
+            await asyncio.sleep(hang_seconds)
+        elif roll < hang_rate + error_rate:
+            return JSONResponse({"success": False, "message": "模拟服务器错误"}, status_code=500)
+        return await call_next(request)
+
+    def session_user(request: Request) -> Optional[dict]:
+        session_id = request.cookies.get("ASP.NET_SessionId")
+        user_id = state.sessions.get(session_id) if session_id else None
+        return state.users.get(user_id)
+
+    def lookup_user(value) -> Optional[dict]:
+        try:
+            return state.users.get(int(value))
+        except (TypeError, ValueError):
+            return None
+
+    @app.post("/Apps/wxLogin")
+    async def wx_login(request: Request):
+        data = await request.json()
+        user_id = state.accounts.get(str(data.get("UserCccount", "")))
+        if user_id is None or data.get("Password") != state.password:
+            return {"success": False, "message": "账号或密码错误"}
+
+        session_id = secrets.token_hex(12)
+        state.sessions[session_id] = user_id
+        response = JSONResponse({"success": True, "message": "登录成功"})
+        response.headers["Set-Cookie"] = f"ASP.NET_SessionId={session_id}; path=/; HttpOnly"
+        return response
+
+    @app.get("/Apps/AppIndex")
+    async def app_index(request: Request):
+        user = session_user(request)
+        if not user:
+            return {"success": False, "message": "登录已过期"}
+        return {
+            "success": True,
+            "data": {
+                "UserID": user["userid"],
+                "UserName": user["username"],
+                "DepID": user["depid"],
+                "Position": user["zw"],
+                "DepName": user["dep"],
+                "UnitCode": request.query_params.get("UnitCode", ""),
+            }
+        }
+
+    @app.post("/Apps/getUserInfoList")
+    async def get_user_info_list(request: Request):
+        data = await request.json()
+        dep_id = str(data.get("depid", ""))
+        return [
+            {"userid": user["userid"], "username": user["username"], "depid": user["depid"], "zw": user["zw"]}
+            for user in state.users.values() if user["depid"] == dep_id
+        ]
+
+    @app.post("/Apps/getUserInfo")
+    async def get_user_info(request: Request):
+        data = await request.json()
+        user = lookup_user(data.get("userid"))
+        if not user:
+            return {}
+        return {"userid": user["userid"], "xm": user["username"], "depid": user["depid"], "dep": user["dep"], "zw": user["zw"]}
+
+    @app.post("/AttendanceCard/GetAttCheckinoutList")
+    async def get_att_checkinout_list(request: Request):
+        data = await request.json()
+        user = lookup_user(data.get("userid"))
+        if not user:
+            return []
+        return state.get_records(user["userid"])
+
+    @app.api_route("/AttendanceCard/GetYueTjList", methods=["GET", "POST"])
+    async def get_yue_tj_list(request: Request):
+        params = request.query_params
+        user = lookup_user(params.get("userid"))
+        if not user:
+            return []
+
+        year, month = parse_year_month(params.get("year"), params.get("month"))
+        days = state.month_records(user["userid"], year, month)
+        today = datetime.date.today()
+
+        result = []
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            date = datetime.date(year, month, day)
+            clocks = days.get(date, {})
+            passed_workday = is_workday(date) and date < today
+            result.append({
+                "rq": date.strftime("%Y-%m-%d"),
+                "isholiday": 0 if is_workday(date) else 1,
+                "jjr": HOLIDAYS.get((month, day), ""),
+                "IsQj": 1 if passed_workday and not clocks else 0,
+                "SWSBDKCS": len(clocks.get(1, [])),
+                "XWXBDKCS": len(clocks.get(2, [])),
+                "IsSwSbbuka": 0,
+                "IsXwXbbuka": 0,
+            })
+        return result
+
+    @app.post("/AttendanceCard/get_Attendance_Statistics")
+    async def get_attendance_statistics(request: Request):
+        data = await request.json()
+        user = lookup_user(data.get("UserID"))
+        if not user:
+            return []
+
+        year, month = parse_year_month(data.get("Syear"), data.get("Smonth"))
+        days = state.month_records(user["userid"], year, month)
+        today = datetime.date.today()
+
+        leave = late = early = lack = 0
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            date = datetime.date(year, month, day)
+            if not is_workday(date) or date >= today:
+                continue
+            clocks = days.get(date)
+            if not clocks:
+                leave += 1
+                continue
+            morning, evening = clocks.get(1), clocks.get(2)
+            lack += (not morning) + (not evening)
+            if morning and min(morning).time() > datetime.time(9, 0):
+                late += 1
+            if evening and max(evening).time() < datetime.time(17, 0):
+                early += 1
+
+        stat = {"LeaveDays": leave, "LateNumber": late, "ZtNumber": early, "LackCarNumber": lack}
+        return [{"UserID": user["userid"], "Attend_Stat_List": [stat]}]
+
+    @app.post("/AttendanceCard/SaveAttCheckinout")
+    async def save_att_checkinout(request: Request):
+        data = await request.json()
+        model = data.get("model", {})
+        user = lookup_user(model.get("userID"))
+        if not user:
+            return {"success": False, "message": "用户不存在"}
+
+        now = datetime.datetime.now()
+        clock_type = 1 if now.hour < 12 else 2
+        state.add_record(user["userid"], now, clock_type)
+        return {"success": True, "message": f"{'上班' if clock_type == 1 else '下班'}打卡成功"}
+
+    @app.get("/__mock__/users")
+    async def list_users(limit: int = 20):
+        """列出模拟账号，方便登录和压测"""
+        return [
+            {"phone": user["phone"], "password": state.password, "userid": user["userid"],
+             "username": user["username"], "depid": user["depid"]}
+            for user in list(state.users.values())[:limit]
+        ]
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟考勤API服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--users", type=int, default=200, help="模拟用户数量")
+    parser.add_argument("--history-days", type=int, default=365, help="每个用户生成多少天的历史打卡记录")
+    parser.add_argument("--password", default="123456", help="所有模拟账号的密码")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，相同种子生成相同的数据")
+    parser.add_argument("--latency", type=parse_latency, default="lognormal:80:0.5", help="默认延迟分布")
+    parser.add_argument("--endpoint-latency", action="append", default=[], metavar="PATH=DIST",
+                        help="单个接口的延迟分布，可重复指定")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500错误的概率")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="请求挂起（模拟超时）的概率")
+    parser.add_argument("--hang-seconds", type=float, default=30.0, help="挂起请求的等待时间（秒）")
+    args = parser.parse_args()
+
+    endpoint_latency = {}
+    for item in args.endpoint_latency:
+        path, _, spec = item.partition("=")
+        endpoint_latency[path] = parse_latency(spec)
+
+    state = MockState(args.users, args.history_days, args.password, args.seed)
+    app = create_app(state, args.latency, endpoint_latency, args.error_rate, args.hang_rate, args.hang_seconds)
+
+    print(f"模拟考勤API: http://{args.host}:{args.port}，用户数 {args.users}，示例账号 13800000001 / {args.password}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()